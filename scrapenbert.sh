@@ -3,54 +3,98 @@
 helpFunction()
 {
     echo ""
-    echo "Usage: $0 -t type_of_snb_run"
+    echo "Usage: $0 -t type_of_snb_run [options passed to entry.py, see: cd src/py && python3 entry.py <type> --help]"
     echo "Types (the types of snb runs):"
-    echo "  Optional -t [individual-snb] Runs scrape-n-bert from config file, and run bert instance on each domain"
+    echo "  Optional -t [individual-snb] Runs scrape-n-bert from config file, and run bert instance on each domain (up to date stages are skipped, --force crawl,train,keybert re-runs them)"
     echo "  Optional -t [only-scrape] Runs spider on domains in config file"
+    echo "  Optional -t [re-extract] Applies the CSS_SELECTORS in config file to archived pages (ARCHIVE_RESPONSES=True) without recrawling"
     echo "  Optional -t [only-bert] Runs bertopic instance on each domain in config file without scraping"
+    echo "  Optional -t [shared-bert] Fits one bertopic model over every domain in config file, with per-domain outputs"
     echo "  Optional -t [combined-bert] Combines multiple scraped data files, and runs bertopic on top of the large file"
     echo "  Optional -t [only-keybert] Run KeyBERT to generate keywords based on any content without scraping or using BERTopic"
+    echo "  Optional -t [assign-topics] Assign the topics of a saved model to newly scraped pages without retraining"
+    echo "  Optional -t [visualize] Render the HTML visualizations of a saved topic model"
+    echo "  Optional -t [serve] Run a warm worker that keeps the models loaded and accepts jobs on http://127.0.0.1:8765"
+    echo "  Optional -t [submit] Send a bertopic_only, keybert_only or transform job to a running worker"
+    echo ""
+    echo "Examples:"
+    echo "  $0 -t only-scrape -c /full/path/config.ini"
+    echo "  $0 -t only-bert -i /full/path/learn_g2_com.jl -o /full/path/output -s \"crm software\""
+    echo "  $0 -t individual-snb -c /full/path/config.ini --profile-stage bertopic --report /full/path/report.json"
+    echo "  $0 -t visualize -m /full/path/output/ml_data/bertopic_only_TOPIC_MODEL.bin -o /full/path/output/visualizations"
 }
 
-while getopts "t:" opt
-do
-    case "$opt" in
-        t ) TYPE="$OPTARG" ;;
-        h ) helpFunction ;;
-        ? ) helpFunction ;;
-        * ) helpFunction ;;
-    esac
-done
+# -t has to come first, everything after the type is passed on to entry.py
+if [ "$1" = "-t" ]
+then
+    TYPE="$2"
+    shift 2
+fi
 
 case "$TYPE" in
     "individual-snb") 
         echo "Running Scrape-n-bert in type: $TYPE\n"
         cd src/py
-        python3 entry.py individual-snb
+        python3 entry.py individual-snb "$@"
         ;;
 
     "only-scrape")
         echo "Running Scrape-n-bert in type: $TYPE\n"
         cd src/py
-        python3 entry.py only-scrape 
+        python3 entry.py only-scrape "$@"
+        ;;
+
+    "re-extract")
+        echo "Running Scrape-n-bert in type: $TYPE\n"
+        cd src/py
+        python3 entry.py re-extract "$@"
         ;;
 
     "only-bert")
         echo "Running Scrape-n-bert in type: $TYPE\n"
         cd src/py
-        python3 entry.py only-bert
+        python3 entry.py only-bert "$@"
+        ;;
+
+    "shared-bert")
+        echo "Running Scrape-n-bert in type: $TYPE\n"
+        cd src/py
+        python3 entry.py shared-bert "$@"
         ;;
 
     "combined-bert")
         echo "Running Scrape-n-bert in type: $TYPE\n"
         cd src/py
-        python3 entry.py combined-bert
+        python3 entry.py combined-bert "$@"
         ;;
 
     "only-keybert")
         echo "Running Scrape-n-bert in type: $TYPE\n"
         cd src/py
-        python3 entry.py only-keybert
+        python3 entry.py only-keybert "$@"
+        ;;
+
+    "assign-topics")
+        echo "Running Scrape-n-bert in type: $TYPE\n"
+        cd src/py
+        python3 entry.py assign-topics "$@"
+        ;;
+
+    "visualize")
+        echo "Running Scrape-n-bert in type: $TYPE\n"
+        cd src/py
+        python3 entry.py visualize "$@"
+        ;;
+
+    "serve")
+        echo "Running Scrape-n-bert in type: $TYPE\n"
+        cd src/py
+        python3 entry.py serve "$@"
+        ;;
+
+    "submit")
+        cd src/py
+        python3 entry.py submit "$@"
         ;;
 
     *)
@@ -0,0 +1,251 @@
+"""
+Offline benchmark of the scrape-n-bert stages against a synthetic local website.
+
+    python3 -m benchmark.main --pages 500 --output bench.json
+    python3 -m benchmark.main --pages 500 --output bench.json --compare baseline.json
+
+Every stage runs in its own process, so its peak RSS is measured on its own and the twisted
+reactor of the crawl stage can be started. Results are written as JSON.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+# Allow `python3 benchmark/main.py` from src/py as well as `python3 -m benchmark.main`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmark.synthetic_site import CSS_SELECTOR, SyntheticSite
+from stage_metrics.main import peak_rss_mb
+
+STAGES = ["crawl", "embed", "topic", "keybert"]
+
+# Higher is better for these metrics, lower is better for everything else
+HIGHER_IS_BETTER = {"items_per_second"}
+
+
+def crawl_stage(work_directory, base_url):
+    import scrapy_wrapper.main  # puts the scrapy project on sys.path
+    from scrapy.crawler import CrawlerProcess
+    from scrapy.utils.project import get_project_settings
+    from recursive_spider.spiders.MainSpider import MainSpider
+
+    settings = get_project_settings()
+    settings.set("DOWNLOAD_DELAY", 0, priority="cmdline")
+    settings.set("ADAPTIVE_THROTTLE_MIN_DELAY", 0, priority="cmdline")
+    settings.set("ROBOTSTXT_OBEY", False, priority="cmdline")
+    settings.set("LOG_LEVEL", "WARNING", priority="cmdline")
+    settings.set("FEEDS", {os.path.join(work_directory, "crawl.jl"): {"format": "jsonlines", "overwrite": True}}, priority="cmdline")
+
+    process = CrawlerProcess(settings)
+    crawler = process.create_crawler(MainSpider)
+    process.crawl(crawler, url=base_url, css_selector=CSS_SELECTOR)
+    process.start()
+
+    return crawler.stats.get_value("response_received_count", 0)
+
+
+def embed_stage(work_directory, base_url):
+    from corpus_reader.main import CorpusReader
+    from embedding_cache.main import EmbeddingCache
+
+    docs = list(CorpusReader(os.path.join(work_directory, "crawl.jl")).documents())
+    EmbeddingCache(os.path.join(work_directory, "embedding_cache")).embed(docs)
+
+    return len(docs)
+
+
+def topic_stage(work_directory, base_url):
+    import bertopic_wrapper.main as bert
+    from embedding_cache.main import EmbeddingCache
+
+    # Embeddings come from the cache filled by the embed stage, so this times the topic pipeline only
+    cache = EmbeddingCache(os.path.join(work_directory, "embedding_cache"))
+    bt = bert.BertopicTraining(os.path.join(work_directory, "crawl.jl"), work_directory, "benchmark", "crm software", cache)
+    bt.trainModel()
+
+    with open(os.path.join(work_directory, "rep_docs.json"), "w", encoding="utf-8") as f:
+        json.dump({str(topic_id): docs for topic_id, docs in bt.get_rep_docs().items()}, f)
+
+    return len(bt.data)
+
+
+def keybert_stage(work_directory, base_url):
+    import keybert_wrapper.main as kb
+    from embedding_cache.main import EmbeddingCache
+
+    with open(os.path.join(work_directory, "rep_docs.json"), encoding="utf-8") as f:
+        rep_docs = json.load(f)
+
+    kw = kb.KeybertWrapper(rep_docs, EmbeddingCache(os.path.join(work_directory, "embedding_cache")))
+    kw.find_keywords_batched()
+
+    return sum(len(docs) for docs in rep_docs.values())
+
+
+STAGE_FUNCTIONS = {
+    "crawl": crawl_stage,
+    "embed": embed_stage,
+    "topic": topic_stage,
+    "keybert": keybert_stage,
+}
+
+
+def stage_worker(stage, work_directory, base_url, results):
+    usage_before = resource.getrusage(resource.RUSAGE_SELF)
+    start = time.perf_counter()
+
+    items = STAGE_FUNCTIONS[stage](work_directory, base_url)
+
+    wall = time.perf_counter() - start
+    usage_after = resource.getrusage(resource.RUSAGE_SELF)
+    cpu = (usage_after.ru_utime - usage_before.ru_utime) + (usage_after.ru_stime - usage_before.ru_stime)
+
+    results.put({
+        "wall_seconds": round(wall, 3),
+        "cpu_seconds": round(cpu, 3),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "items": items,
+        "items_per_second": round(items / wall, 2) if wall > 0 else None,
+    })
+
+
+def run_stage(stage, work_directory, base_url):
+    """
+    Runs one stage in a fresh process and returns its measurements
+    """
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=stage_worker, args=(stage, work_directory, base_url, results))
+    process.start()
+    process.join()
+
+    if process.exitcode != 0:
+        return {"error": "stage exited with code " + str(process.exitcode)}
+    return results.get()
+
+
+def run_benchmark(site, stages=STAGES, work_directory=None):
+    """
+    Serves site locally and runs the requested stages against it, in order.
+    -----------------------------------------------------------------
+    Args:
+        site: the SyntheticSite to crawl
+        stages: stage names to run (every stage needs the ones before it)
+        work_directory: where scraped data, caches and models are written (a temporary folder by default)
+
+    Returns:
+        dict: machine-readable results, see write_results
+    """
+    work_directory = work_directory or tempfile.mkdtemp(prefix="snb_benchmark_")
+    server, base_url = site.serve()
+
+    results = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {"platform": platform.platform(), "python": platform.python_version(), "cpu_count": os.cpu_count()},
+        "site": {
+            "page_count": site.page_count,
+            "fan_out": site.fan_out,
+            "duplicate_ratio": site.duplicate_ratio,
+            "paragraphs_per_page": site.paragraphs_per_page,
+            "css_depth": site.css_depth,
+            "bytes_total": site.bytes_total,
+        },
+        "stages": {},
+    }
+
+    try:
+        for stage in stages:
+            print("[LOG]: Running benchmark stage: " + stage)
+            results["stages"][stage] = run_stage(stage, work_directory, base_url)
+            print("[LOG]: " + stage + " -> " + json.dumps(results["stages"][stage]))
+    finally:
+        server.shutdown()
+
+    return results
+
+
+def compare_results(baseline, current, tolerance=0.1):
+    """
+    Compares two benchmark results stage by stage.
+    -----------------------------------------------------------------
+    Args:
+        baseline: results of the reference run
+        current: results of the run being checked
+        tolerance: relative change allowed before a metric counts as a regression (0.1 = 10%)
+
+    Returns:
+        list: (stage, metric, baseline value, current value, relative change, is_regression) tuples
+    """
+    comparison = []
+
+    for stage, current_metrics in current["stages"].items():
+        baseline_metrics = baseline.get("stages", {}).get(stage)
+        if not baseline_metrics:
+            continue
+
+        for metric in ["wall_seconds", "cpu_seconds", "peak_rss_mb", "items_per_second"]:
+            before = baseline_metrics.get(metric)
+            after = current_metrics.get(metric)
+            if not before or after is None:
+                continue
+
+            change = (after - before) / before
+            regression = change < -tolerance if metric in HIGHER_IS_BETTER else change > tolerance
+            comparison.append((stage, metric, before, after, round(change, 3), regression))
+
+    return comparison
+
+
+def write_results(results, output_path):
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark scrape-n-bert against a synthetic local website")
+    parser.add_argument("--pages", type=int, default=500, help="number of article pages on the synthetic site")
+    parser.add_argument("--fan-out", type=int, default=8, help="links from every page to other pages")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.1, help="share of pages that are near-copies of another page")
+    parser.add_argument("--paragraphs", type=int, default=8, help="paragraphs per article page")
+    parser.add_argument("--css-depth", type=int, default=3, help="nesting depth of the non-article markup")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--stages", default=",".join(STAGES), help="comma separated stages to run: " + ",".join(STAGES))
+    parser.add_argument("--work-directory", help="folder for scraped data, caches and models (temporary by default)")
+    parser.add_argument("--output", default="benchmark_results.json", help="where to write the JSON results")
+    parser.add_argument("--compare", help="JSON results of a previous run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="relative change counted as a regression")
+    args = parser.parse_args(argv)
+
+    stages = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+    unknown = [stage for stage in stages if stage not in STAGE_FUNCTIONS]
+    if unknown:
+        parser.error("unknown stages: " + ", ".join(unknown))
+
+    site = SyntheticSite(args.pages, args.fan_out, args.duplicate_ratio, args.paragraphs, args.css_depth, args.seed)
+    results = run_benchmark(site, stages, args.work_directory)
+    write_results(results, args.output)
+    print("[LOG]: Benchmark results written to " + args.output)
+
+    if not args.compare:
+        return 0
+
+    with open(args.compare, encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    regressions = 0
+    for stage, metric, before, after, change, regression in compare_results(baseline, results, args.tolerance):
+        regressions += regression
+        print(("[REGRESSION] " if regression else "             ") + stage + " " + metric + ": "
+              + str(before) + " -> " + str(after) + " (" + format(change * 100, "+.1f") + "%)")
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CSS_SELECTOR = "#post_body > p"
+
+# A handful of topic vocabularies so the topic and keyword stages have real structure to find
+TOPIC_WORDS = [
+    ["crm", "software", "sales", "pipeline", "customer", "lead", "contact", "deal", "forecast", "account", "salesforce", "hubspot", "quota", "prospect", "relationship"],
+    ["business", "analytics", "data", "dashboard", "report", "metric", "insight", "warehouse", "query", "visualization", "kpi", "trend", "intelligence", "model", "statistics"],
+    ["marketing", "campaign", "email", "seo", "content", "audience", "brand", "social", "advertising", "conversion", "funnel", "engagement", "newsletter", "influencer", "keyword"],
+    ["security", "password", "encryption", "firewall", "threat", "malware", "vulnerability", "compliance", "access", "identity", "breach", "endpoint", "phishing", "audit", "patch"],
+    ["hiring", "recruiting", "employee", "payroll", "onboarding", "benefits", "talent", "interview", "candidate", "performance", "review", "culture", "manager", "training", "retention"],
+    ["accounting", "invoice", "budget", "expense", "tax", "revenue", "ledger", "billing", "payment", "cash", "profit", "finance", "audit", "subscription", "pricing"],
+]
+FILLER_WORDS = ["the", "a", "and", "to", "of", "for", "with", "your", "team", "can", "help", "best", "how", "why", "new", "more", "tools", "guide", "use", "make"]
+
+
+class SyntheticSite:
+    """
+    Deterministic fake website used by the benchmarks: page_count article pages, each linking to
+    fan_out random pages (plus the next page so every page is reachable), with duplicate_ratio of the
+    pages being near-copies of an earlier page. Article text sits directly in #post_body, next to
+    navigation, a sidebar nested css_depth divs deep and a footer that the css selector must skip.
+    """
+    def __init__(self, page_count=500, fan_out=8, duplicate_ratio=0.1, paragraphs_per_page=8, css_depth=3, seed=0):
+        self.page_count = page_count
+        self.fan_out = fan_out
+        self.duplicate_ratio = duplicate_ratio
+        self.paragraphs_per_page = paragraphs_per_page
+        self.css_depth = css_depth
+        self.random = random.Random(seed)
+        self.pages = {}
+        self.bytes_total = 0
+
+        self.__generate()
+
+    def __paragraph(self, topic):
+        words = []
+        for _ in range(self.random.randint(25, 60)):
+            source = TOPIC_WORDS[topic] if self.random.random() < 0.6 else FILLER_WORDS
+            words.append(self.random.choice(source))
+        return " ".join(words).capitalize() + "."
+
+    def __generate(self):
+        paragraphs_by_page = []
+
+        for i in range(self.page_count):
+            if i > 0 and self.random.random() < self.duplicate_ratio:
+                # Near-duplicate: copy an earlier page and only change its last paragraph
+                paragraphs = list(paragraphs_by_page[self.random.randrange(i)])
+                paragraphs[-1] = self.__paragraph(self.random.randrange(len(TOPIC_WORDS)))
+            else:
+                topic = self.random.randrange(len(TOPIC_WORDS))
+                paragraphs = [self.__paragraph(topic) for _ in range(self.paragraphs_per_page)]
+            paragraphs_by_page.append(paragraphs)
+
+            links = {(i + 1) % self.page_count}
+            links.update(self.random.randrange(self.page_count) for _ in range(self.fan_out))
+            self.pages["/page/" + str(i) + ".html"] = self.__render("Page " + str(i), paragraphs, sorted(links))
+
+        self.pages["/"] = self.__render("Home", [], list(range(min(self.fan_out, self.page_count))))
+        self.bytes_total = sum(len(body) for body in self.pages.values())
+
+    def __render(self, title, paragraphs, links):
+        nav = "".join('<li><a href="/page/' + str(link) + '.html">Article ' + str(link) + '</a></li>' for link in links)
+        body = "".join("<p>" + paragraph + "</p>" for paragraph in paragraphs)
+        wrapped = "".join("<p>" + paragraph + "</p>" for paragraph in paragraphs[:1])
+        for depth in range(self.css_depth):
+            wrapped = '<div class="wrapper-' + str(depth) + '"><span class="meta">Posted in news</span>' + wrapped + '</div>'
+
+        return ("<!DOCTYPE html><html><head><title>" + title + "</title></head><body>"
+                + '<nav><ul>' + nav + '</ul></nav>'
+                + '<div id="post_body">' + body + '</div>'
+                + '<div class="sidebar">' + wrapped + '</div>'
+                + '<footer><p>Copyright synthetic site</p></footer>'
+                + "</body></html>").encode("utf-8")
+
+    def serve(self, host="127.0.0.1", port=0):
+        """
+        Serves the site from a background thread.
+        -----------------------------------------------------------------
+        Returns:
+            (server, base_url): call server.shutdown() to stop it
+        """
+        pages = self.pages
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = pages.get(self.path.split("?")[0])
+                if body is None:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        return server, "http://" + host + ":" + str(server.server_address[1]) + "/"
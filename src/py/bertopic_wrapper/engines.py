@@ -0,0 +1,165 @@
+import time
+import numpy as np
+
+ENGINES = ["default", "fast"]
+REDUCTIONS = ["pca", "svd"]
+CLUSTERINGS = ["kmeans", "hdbscan"]
+
+class TimedComponent:
+    """
+    Wraps a BERTopic dimensionality reduction or clustering model and records how long each of its
+    fit / transform / predict calls took. Every other attribute (labels_, n_components...) is read
+    from the wrapped model, so BERTopic uses it like the model itself.
+    """
+    TIMED_METHODS = ["fit", "transform", "fit_transform", "predict", "fit_predict", "partial_fit"]
+
+    def __init__(self, name, component):
+        self.name = name
+        self.component = component
+        self.timings = {}
+
+    def __getattr__(self, attribute):
+        # Guard against recursion while unpickling, before component is set
+        if attribute == "component":
+            raise AttributeError(attribute)
+
+        value = getattr(self.component, attribute)
+        if attribute not in self.TIMED_METHODS:
+            return value
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            result = value(*args, **kwargs)
+            self.timings[attribute] = self.timings.get(attribute, 0) + time.perf_counter() - start
+            # Chained fit calls return the component, hand back the wrapper instead
+            return self if result is self.component else result
+
+        return timed
+
+
+class SubsampledHDBSCAN:
+    """
+    Runs HDBSCAN on a random sample of at most sample_size points and assigns every other point to
+    the cluster it would have joined, with hdbscan.approximate_predict. Keeps HDBSCAN's density
+    based topics (and its outlier topic -1) at a cost that no longer grows quadratically with the corpus.
+    """
+    def __init__(self, sample_size=20000, min_cluster_size=10, random_state=0):
+        self.sample_size = sample_size
+        self.min_cluster_size = min_cluster_size
+        self.random_state = random_state
+        self.model = None
+        self.labels_ = None
+
+    def fit(self, X, y=None):
+        import hdbscan
+
+        X = np.asarray(X)
+        sample = np.arange(len(X))
+        if len(X) > self.sample_size:
+            sample = np.random.default_rng(self.random_state).choice(len(X), self.sample_size, replace=False)
+
+        self.model = hdbscan.HDBSCAN(min_cluster_size=self.min_cluster_size, metric="euclidean",
+                                     cluster_selection_method="eom", prediction_data=True)
+        self.model.fit(X[sample])
+
+        labels = np.empty(len(X), dtype=int)
+        labels[sample] = self.model.labels_
+        rest = np.setdiff1d(np.arange(len(X)), sample, assume_unique=True)
+        if len(rest):
+            labels[rest] = self.predict(X[rest])
+
+        self.labels_ = labels
+        return self
+
+    def predict(self, X):
+        import hdbscan
+
+        labels, _ = hdbscan.approximate_predict(self.model, np.asarray(X))
+        return labels
+
+
+def build_fast_components(reduction="pca", clustering="kmeans", n_components=5, n_clusters=50, sample_size=20000, min_cluster_size=10):
+    """
+    Builds the CPU friendly replacements of BERTopic's UMAP + HDBSCAN pipeline.
+    -----------------------------------------------------------------
+    Args:
+        reduction: 'pca' (randomized PCA) or 'svd' (TruncatedSVD, no centering)
+        clustering: 'kmeans' (MiniBatchKMeans with n_clusters topics) or 'hdbscan' (HDBSCAN on a sample of sample_size documents)
+        n_components: dimensions the embeddings are reduced to
+        n_clusters: number of topics found by kmeans
+        sample_size: documents HDBSCAN is fitted on
+        min_cluster_size: smallest HDBSCAN topic
+
+    Raises:
+        ValueError: unknown reduction or clustering
+
+    Returns:
+        (umap_model, hdbscan_model): both wrapped in TimedComponent
+    """
+    from sklearn.decomposition import PCA, TruncatedSVD
+    from sklearn.cluster import MiniBatchKMeans
+
+    if reduction == "pca":
+        reduction_model = PCA(n_components=n_components, svd_solver="randomized", random_state=0)
+    elif reduction == "svd":
+        reduction_model = TruncatedSVD(n_components=n_components, random_state=0)
+    else:
+        raise ValueError("[ERROR]: Unknown FAST_REDUCTION " + str(reduction) + ", expected one of " + ", ".join(REDUCTIONS))
+
+    if clustering == "kmeans":
+        cluster_model = MiniBatchKMeans(n_clusters=n_clusters, batch_size=4096, n_init=3, random_state=0)
+    elif clustering == "hdbscan":
+        cluster_model = SubsampledHDBSCAN(sample_size, min_cluster_size)
+    else:
+        raise ValueError("[ERROR]: Unknown FAST_CLUSTERING " + str(clustering) + ", expected one of " + ", ".join(CLUSTERINGS))
+
+    return TimedComponent("reduction_model", reduction_model), TimedComponent("clustering_model", cluster_model)
+
+
+def build_default_components(min_topic_size=10):
+    """
+    Builds BERTopic's default UMAP + HDBSCAN pipeline, with the same parameters BERTopic uses,
+    as TimedUMAP and TimedHDBSCAN so its reduction and clustering are timed like the fast engine's.
+    -----------------------------------------------------------------
+    Args:
+        min_topic_size: smallest HDBSCAN topic (BERTopic's min_topic_size)
+
+    Returns:
+        (umap_model, hdbscan_model)
+    """
+    from bertopic_wrapper.timed_models import TimedHDBSCAN, TimedUMAP
+
+    umap_model = TimedUMAP(n_neighbors=15, n_components=5, min_dist=0.0, metric="cosine", low_memory=False)
+    hdbscan_model = TimedHDBSCAN(min_cluster_size=min_topic_size, metric="euclidean",
+                                 cluster_selection_method="eom", prediction_data=True)
+    return umap_model, hdbscan_model
+
+
+def timed_components(topic_model):
+    """
+    Returns [(step, component)] for the reduction and clustering models of topic_model that recorded timings
+    (TimedComponent, TimedUMAP, TimedHDBSCAN)
+    """
+    return [(step, component) for step, component in [("reduction", topic_model.umap_model), ("clustering", topic_model.hdbscan_model)]
+            if isinstance(getattr(component, "timings", None), dict)]
+
+
+def component_timings(topic_model):
+    """
+    Returns {component: {method: seconds}} for the timed components of a topic model
+    """
+    return {component.name: {method: round(seconds, 3) for method, seconds in component.timings.items()}
+            for _, component in timed_components(topic_model)}
+
+
+def step_timings(topic_model, fit_transform_seconds):
+    """
+    Splits the seconds of fit_transform into reduction, clustering and everything else (topic extraction,
+    and embedding when embeddings were not precomputed), from the timed components of the topic model.
+    Returns {} when neither component is timed (a topic model not built by BertopicTraining).
+    """
+    steps = {step: round(sum(component.timings.values()), 3) for step, component in timed_components(topic_model)}
+
+    if steps:
+        steps["other"] = round(max(0.0, fit_transform_seconds - sum(steps.values())), 3)
+    return steps
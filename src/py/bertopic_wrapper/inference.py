@@ -0,0 +1,81 @@
+import os
+import time
+from corpus_reader.main import CorpusReader
+import bertopic_wrapper.results as results
+
+DEFAULT_BATCH_SIZE = 10000
+
+
+def load_topic_model(model_path, embedding_cache=None):
+    """
+    Loads a _TOPIC_MODEL.bin written by BertopicTraining, sharing the embedding cache's model when given
+    """
+    from bertopic import BERTopic
+
+    if not os.path.isfile(model_path):
+        raise ValueError("[ERROR]: Could not find given file -> " + model_path)
+
+    embedding_model = embedding_cache.embedding_model if embedding_cache is not None else None
+    return BERTopic.load(model_path, embedding_model=embedding_model)
+
+
+class TopicAssigner:
+    """
+    Assigns the topics of an already trained model to new documents with BERTopic.transform,
+    without refitting anything. Documents are embedded in batches of batch_size through the
+    embedding cache, so pages that were embedded before are not encoded again. New documents are
+    only added to the cache when cache_new is set, otherwise every assignment run would grow it
+    and rewrite its index once per batch.
+    """
+    def __init__(self, topic_model, embedding_cache=None, batch_size=DEFAULT_BATCH_SIZE, cache_new=False):
+        self.topic_model = topic_model
+        self.embedding_cache = embedding_cache
+        self.batch_size = batch_size
+        self.cache_new = cache_new
+
+    def assign_documents(self, docs):
+        """
+        Returns:
+            (topics, probabilities): one int and one float (or None when the model has no probabilities) per document
+        """
+        if not docs:
+            return [], []
+
+        embeddings = self.embedding_cache.embed(docs, store=self.cache_new) if self.embedding_cache is not None else None
+        topics, probs = self.topic_model.transform(docs, embeddings)
+
+        assignments = results.document_topics_frame([None] * len(docs), topics, probs)
+        return assignments["topic"].tolist(), assignments["probability"].tolist()
+
+    def assign_files(self, in_file_paths, out_file_path):
+        """
+        Streams every record of in_file_paths through the model and writes url / topic / probability
+        rows to a Parquet file, one row group per batch, so memory stays bounded by batch_size.
+        -----------------------------------------------------------------
+        Args:
+            in_file_paths: .jl files (.jl.gz and .jl.zst are read too)
+            out_file_path: the .parquet file the assignments are written to
+
+        Returns:
+            int: number of documents assigned
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = pa.schema([("url", pa.string()), ("topic", pa.int64()), ("probability", pa.float64())])
+        corpus = CorpusReader(in_file_paths, deduplicate=False)
+        assigned = 0
+        start = time.perf_counter()
+
+        with pq.ParquetWriter(out_file_path, schema) as writer:
+            for chunk in corpus.chunks(self.batch_size):
+                topics, probabilities = self.assign_documents([record["content"] for record in chunk])
+                frame = results.document_topics_frame([record["url"] for record in chunk], topics, None)
+                frame["probability"] = probabilities
+                writer.write_table(pa.Table.from_pandas(frame, schema=schema, preserve_index=False))
+
+                assigned += len(chunk)
+                print("[LOG]: Assigned topics to " + str(assigned) + " documents ("
+                      + format(assigned / (time.perf_counter() - start), ".1f") + " docs/s)")
+
+        return assigned
@@ -1,47 +1,229 @@
+import collections
 import os
 import sys
+import time
 import pandas as pd
 from bertopic import BERTopic
-from sklearn.feature_extraction.text import CountVectorizer
+from corpus_reader.main import CorpusReader
+import bertopic_wrapper.results as results
+from bertopic_wrapper.query import TopicQuery, parse_search_terms
+from bertopic_wrapper import vectorizers
+from bertopic_wrapper.visualize import TopicVisualizer
+from bertopic_wrapper import engines
 
 class BertopicTraining():
-    def __init__(self, absolute_in_file_path, out_directory_path, out_filename, search_term):
+    def __init__(self, absolute_in_file_path, out_directory_path, out_filename, search_term, embedding_cache=None):
         self.out_directory_path = out_directory_path
         self.out_filename = out_filename
+        # One or more search terms, as a list or a comma separated string
         self.search_term = search_term
-        self.topic_model = BERTopic()
+        self.search_terms = parse_search_terms(search_term)
+        self.query = None
+        self.embedding_cache = embedding_cache
+        self.embeddings = None
+        self.probs = None
+        # Seconds spent in each step of the last training run
+        self.timings = {}
+
+        # BERTopic's own UMAP + HDBSCAN, timed so training reports how long reduction and clustering took
+        umap_model, hdbscan_model = engines.build_default_components()
+        if self.embedding_cache is not None:
+            # Share the cache's sentence-transformer so search terms are embedded with the same model
+            self.topic_model = BERTopic(embedding_model=self.embedding_cache.embedding_model,
+                                        umap_model=umap_model, hdbscan_model=hdbscan_model)
+        else:
+            self.topic_model = BERTopic(umap_model=umap_model, hdbscan_model=hdbscan_model)
         
-        # Create data frame and store as object
-        # df = pd.read_csv(out_dir + "/" + out_file + ".csv")
-        df = pd.read_json(os.path.abspath(absolute_in_file_path), lines=True, encoding="utf-8-sig")
-        self.data = df["content"]
+        # Documents are only read when training starts, so online training never holds the whole corpus
+        self.in_file_paths = [absolute_in_file_path] if isinstance(absolute_in_file_path, str) else list(absolute_in_file_path)
+        self.data = None
+        self.urls = None
+
+    def load_documents(self):
+        """
+        Streams the scraped records (one or many .jl files) and keeps only the page text and url
+        """
+        corpus = CorpusReader([os.path.abspath(path) for path in self.in_file_paths])
+        self.data = []
+        self.urls = []
+        for record in corpus:
+            self.data.append(record["content"])
+            self.urls.append(record["url"])
+
+        print("[LOG]: Loaded " + str(len(self.data)) + " documents (" + str(corpus.duplicates_dropped) + " duplicates dropped)")
+
+    def train(self, mode="batch", chunk_size=1000, n_clusters=50, resume=False,
+              ngram_range=vectorizers.DEFAULT_NGRAM_RANGE, min_df=vectorizers.DEFAULT_MIN_DF, max_features=vectorizers.DEFAULT_MAX_FEATURES,
+              render_visualizations=False, engine="default", fast_reduction="pca", fast_clustering="kmeans",
+              fast_n_clusters=50, fast_sample_size=20000):
+        """
+        Trains the model in the given mode ('batch' fits the whole corpus at once,
+        'online' fits it in chunks of chunk_size documents).
+        -----------------------------------------------------------------
+        Args:
+            mode: 'batch' or 'online'
+            chunk_size: documents per chunk in online mode
+            n_clusters: number of topics in online mode
+            resume: in online mode, keep updating the model previously saved for this output folder
+            ngram_range: n-gram range of the topic terms in batch mode
+            min_df: documents a topic term must appear in, in batch mode
+            max_features: size limit of the topic term vocabulary in batch mode
+            render_visualizations: also write the HTML visualizations (they can be rendered later from the saved model)
+            engine: in batch mode, 'default' (UMAP + HDBSCAN) or 'fast' (see use_fast_engine)
+            fast_reduction, fast_clustering, fast_n_clusters, fast_sample_size: settings of the fast engine
+        """
+        if engine not in engines.ENGINES:
+            raise ValueError("[ERROR]: Unknown TOPIC_ENGINE " + str(engine) + ", expected one of " + ", ".join(engines.ENGINES))
+
+        if mode != "online":
+            if engine == "fast":
+                self.use_fast_engine(fast_reduction, fast_clustering, fast_n_clusters, fast_sample_size)
+            self.trainModel(ngram_range, min_df, max_features, render_visualizations)
+            return
+
+        resume_model_path = self.get_topic_model_path()
+        if not resume or not os.path.isfile(resume_model_path):
+            resume_model_path = None
 
-        print(self.data)
+        self.trainModelOnline(chunk_size, n_clusters, resume_model_path, render_visualizations)
 
-    def trainModel(self):
+    def use_fast_engine(self, reduction="pca", clustering="kmeans", n_clusters=50, sample_size=20000):
+        """
+        Replaces UMAP + HDBSCAN, which scale poorly on CPU, with a linear reduction and a scalable clustering
+        (see engines.build_fast_components). The fit time of each component is reported after training.
+        """
+        umap_model, hdbscan_model = engines.build_fast_components(reduction, clustering, n_clusters=n_clusters, sample_size=sample_size)
+        embedding_model = self.embedding_cache.embedding_model if self.embedding_cache is not None else None
+        self.topic_model = BERTopic(embedding_model=embedding_model, umap_model=umap_model, hdbscan_model=hdbscan_model)
+        print("[LOG]: Using the fast topic engine (" + reduction + " + " + clustering + ")")
+
+    def trainModel(self, ngram_range=vectorizers.DEFAULT_NGRAM_RANGE, min_df=vectorizers.DEFAULT_MIN_DF, max_features=vectorizers.DEFAULT_MAX_FEATURES,
+                   render_visualizations=False):
         topics = None
         probs = None
 
+        if self.data is None:
+            self.load_documents()
+
+        self.timings = {}
+        start = time.perf_counter()
+        if self.embedding_cache is not None:
+            self.embeddings = self.embedding_cache.embed(self.data)
+            self.timings["embedding"] = round(time.perf_counter() - start, 3)
+        self.timings["documents"] = len(self.data)
+
+        start = time.perf_counter()
         try:
-            topics, probs = self.topic_model.fit_transform(self.data)
+            topics, probs = self.topic_model.fit_transform(self.data, self.embeddings)
+            self.probs = probs
         except RuntimeError as e:
-            print("\n=== Out of GPU memory in order for cuda to work properly ===\n")
+            if "out of memory" in str(e).lower():
+                print("[ERROR]: Ran out of GPU memory while fitting " + self.out_filename + ", try TOPIC_ENGINE=fast or a smaller corpus")
+            raise
+        self.timings["fit_transform"] = round(time.perf_counter() - start, 3)
+        self.timings.update(engines.step_timings(self.topic_model, self.timings["fit_transform"]))
 
-        vectorizer_model = CountVectorizer(stop_words="english", ngram_range=(1, 5))
+        # A bounded vocabulary keeps the c-TF-IDF matrix from growing with every 1-5-gram of the corpus
+        start = time.perf_counter()
+        vectorizer_model = vectorizers.bounded_count_vectorizer(self.data, ngram_range, min_df, max_features)
         self.topic_model.update_topics(self.data, topics, vectorizer_model=vectorizer_model)
-    
+        self.timings["ctfidf"] = round(time.perf_counter() - start, 3)
+        self.timings.update(engines.component_timings(self.topic_model))
+
+        self.query = TopicQuery(self.topic_model)
         self.write_training_data_to_disk(self.topic_model,
-                                     self.topic_model.get_topic_info(), 
-                                     self.topic_model.find_topics(self.search_term),
-                                     self.topic_model.get_topics(),
-                                     self.topic_model.get_representative_docs(), 
-                                     self.topic_model.get_topic_freq())
+                                     self.query.topic_info,
+                                     self.query.find_topics(self.search_terms),
+                                     self.query.topics,
+                                     self.query.representative_docs,
+                                     self.query.topic_freq)
+
+        if render_visualizations:
+            self.write_visualization_data_to_disk(self.topic_model)
 
-        self.write_visualization_data_to_disk(self.topic_model)
+        print(self.query.topic_info)
 
-        print(self.topic_model.get_topic_info())
+    def trainModelOnline(self, chunk_size=1000, n_clusters=50, resume_model_path=None, render_visualizations=False):
+        """
+        Trains the topic model on fixed size chunks of the corpus with partial_fit, so peak memory
+        depends on chunk_size instead of the corpus size. Uses IncrementalPCA, MiniBatchKMeans and
+        an OnlineCountVectorizer, which all support incremental updates.
+        -----------------------------------------------------------------
+        Args:
+            chunk_size: number of documents embedded and fitted at once (must be >= n_clusters)
+            n_clusters: number of topics MiniBatchKMeans looks for
+            resume_model_path: a _TOPIC_MODEL.bin saved by a previous online run to keep updating
+            render_visualizations: also write the HTML visualizations
+
+        Raises:
+            ValueError: chunk_size is smaller than n_clusters, or the resumed model can not be updated incrementally
+        """
+        from sklearn.decomposition import IncrementalPCA
+        from sklearn.cluster import MiniBatchKMeans
+        from bertopic.vectorizers import OnlineCountVectorizer
+
+        if chunk_size < n_clusters:
+            raise ValueError("[ERROR]: ONLINE_CHUNK_SIZE (" + str(chunk_size) + ") must be at least ONLINE_N_CLUSTERS (" + str(n_clusters) + ")")
+
+        embedding_model = self.embedding_cache.embedding_model if self.embedding_cache is not None else None
+
+        if resume_model_path is not None:
+            print("[LOG]: Resuming online training from " + resume_model_path)
+            self.topic_model = BERTopic.load(resume_model_path, embedding_model=embedding_model)
+
+            if not hasattr(self.topic_model.umap_model, "partial_fit") or not hasattr(self.topic_model.hdbscan_model, "partial_fit"):
+                raise ValueError("[ERROR]: " + resume_model_path + " was not trained online and can not be updated incrementally")
+        else:
+            self.topic_model = BERTopic(embedding_model=embedding_model,
+                                        umap_model=IncrementalPCA(n_components=5),
+                                        hdbscan_model=MiniBatchKMeans(n_clusters=n_clusters, random_state=0),
+                                        vectorizer_model=OnlineCountVectorizer(stop_words="english", decay=.01))
+
+        self.timings = {"embedding": 0, "partial_fit": 0}
+        min_chunk_size = self.topic_model.umap_model.n_components
+        corpus = CorpusReader([os.path.abspath(path) for path in self.in_file_paths])
+        topics = []
+
+        for chunk in corpus.chunks(chunk_size):
+            if len(chunk) < min_chunk_size:
+                print("[WARNING]: Skipping last " + str(len(chunk)) + " documents, IncrementalPCA needs at least " + str(min_chunk_size))
+                continue
+
+            docs = [record["content"] for record in chunk]
+            start = time.perf_counter()
+            embeddings = self.embedding_cache.embed(docs) if self.embedding_cache is not None else None
+            self.timings["embedding"] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            self.topic_model.partial_fit(docs, embeddings)
+            self.timings["partial_fit"] += time.perf_counter() - start
+            topics.extend(self.topic_model.topics_)
+            print("[LOG]: Online training processed " + str(len(topics)) + " documents")
+
+        # partial_fit only keeps the topics of the last chunk, restore the assignments of the whole run
+        self.topic_model.topics_ = topics
+        self.topic_model.topic_sizes_ = collections.Counter(topics)
+        self.timings = {step: round(seconds, 3) for step, seconds in self.timings.items()}
+        self.timings["documents"] = len(topics)
+
+        self.query = TopicQuery(self.topic_model)
+        self.write_training_data_to_disk(self.topic_model,
+                                     self.query.topic_info,
+                                     self.query.find_topics(self.search_terms),
+                                     self.query.topics,
+                                     self.query.representative_docs,
+                                     self.query.topic_freq)
+
+        if render_visualizations:
+            self.write_visualization_data_to_disk(self.topic_model)
+
+        print(self.query.topic_info)
+
+    def get_topic_model_path(self):
+        return os.path.join("/" + self.out_directory_path + "/ml_data", self.out_filename + "_TOPIC_MODEL" + ".bin")
 
     def write_training_data_to_disk(self, topic_model, topicInfo, findTopics, allTopicInfo, repDoc, topicFrequency):
+        start = time.perf_counter()
         try:
             self.ml_data_path = "/" + self.out_directory_path + "/ml_data"
         
@@ -50,35 +232,24 @@ class BertopicTraining():
             except FileExistsError as e:
                 print("[WARNING]: ml_data folder already exists, writing to previous folder")
 
-            topic_info_dir = os.path.join(self.ml_data_path, self.out_filename + "_TOPIC_INFO" + ".csv")
-            all_topic_info_dir = os.path.join(self.ml_data_path, self.out_filename + "_ALL_TOPIC_INFO" + ".csv")
-            find_topics_dir = os.path.join(self.ml_data_path, self.out_filename + "_FOUND_TOPICS" + ".csv")
-            rep_doc_dir = os.path.join(self.ml_data_path, self.out_filename + "_REPERSENTITIVE_DOCS" + ".csv")
-            topic_frequency_dir = os.path.join(self.ml_data_path, self.out_filename + "_TOPIC_FREQUENCY" + ".csv")
-            topic_model_dir = os.path.join(self.ml_data_path, self.out_filename + "_TOPIC_MODEL" + ".bin")
+            topic_info_dir = os.path.join(self.ml_data_path, self.out_filename + "_TOPIC_INFO" + ".parquet")
+            topic_terms_dir = os.path.join(self.ml_data_path, self.out_filename + "_TOPIC_TERMS" + ".parquet")
+            find_topics_dir = os.path.join(self.ml_data_path, self.out_filename + "_FOUND_TOPICS" + ".parquet")
+            rep_doc_dir = os.path.join(self.ml_data_path, self.out_filename + "_REPRESENTATIVE_DOCS" + ".jsonl")
+            topic_frequency_dir = os.path.join(self.ml_data_path, self.out_filename + "_TOPIC_FREQUENCY" + ".parquet")
+            document_topics_dir = os.path.join(self.ml_data_path, self.out_filename + "_DOCUMENT_TOPICS" + ".parquet")
+            topic_model_dir = self.get_topic_model_path()
             formatted_found_topics_dir = os.path.join(self.ml_data_path, self.out_filename + "_FORMATTED_FOUND_TOPICS.csv")
             formatted_all_topics_dir = os.path.join(self.ml_data_path, self.out_filename + "_FORMATTED_ALL_TOPICS.csv")
 
+            topicInfo.to_parquet(topic_info_dir, index=False)
+            topicFrequency.to_parquet(topic_frequency_dir, index=False)
+            results.topic_terms_frame(allTopicInfo).to_parquet(topic_terms_dir, index=False)
+            results.found_topics_frame(findTopics).to_parquet(find_topics_dir, index=False)
+            results.write_representative_docs(repDoc, rep_doc_dir)
 
-            TIF = open(topic_info_dir, "w")
-            TIF.write(topicInfo.to_string())
-            TIF.close()
-
-            AIF = open(all_topic_info_dir, "w")
-            AIF.write(str(allTopicInfo))
-            AIF.close()
-
-            FTF = open(find_topics_dir, "w")
-            FTF.write(str(findTopics))
-            FTF.close()
-
-            RDF = open(rep_doc_dir, "w")
-            print(repDoc, file=RDF)
-            RDF.close()
-
-            TFF = open(topic_frequency_dir, "w")
-            TFF.write(topicFrequency.to_string())
-            TFF.close()
+            if self.data is not None and len(topic_model.topics_) == len(self.data):
+                results.document_topics_frame(self.urls, topic_model.topics_, self.probs).to_parquet(document_topics_dir, index=False)
 
             self.format_found_topics(formatted_found_topics_dir)
             
@@ -90,54 +261,53 @@ class BertopicTraining():
             print("Error: " + str(e))
             print("!=== This probably has to do with bertopic not being provided enough data ===!")
 
-    def write_visualization_data_to_disk(self, topic_model):
-        try:
-            path = self.out_directory_path + "/visualizations/"
-
-            try:
-                os.mkdir(path)
-            except FileExistsError:
-                print("[WARNING]: Visualizations folder already exists, writing to previously created folder.")
-
-            vt = topic_model.visualize_topics()
-            vt.write_html(path + "topics_visual.html")
+        self.timings["write_outputs"] = round(time.perf_counter() - start, 3)
 
-            vhi = topic_model.visualize_hierarchy()
-            vhi.write_html(path + "hierarchy_visual.html")
+    def write_visualization_data_to_disk(self, topic_model):
+        path = self.out_directory_path + "/visualizations/"
 
-            vb = topic_model.visualize_barchart()
-            vb.write_html(path + "barchart_visual.html")
+        if os.path.isdir(path):
+            print("[WARNING]: Visualizations folder already exists, writing to previously created folder.")
 
-            vhe = topic_model.visualize_heatmap()
-            vhe.write_html(path + "heatmap_visual.html")
-        except ValueError as e: 
-            print("Error: " + str(e))
-            print("!=== This probably has to do with bertopic not being provided enough data ===!")
+        visualizer = TopicVisualizer(topic_model, os.path.join(path, ".cache"))
+        timings = visualizer.render(path)
+        print("[LOG]: Rendered visualizations " + str(timings))
 
     def format_found_topics(self, out_filename):
-        found_topics = []
+        found_by_term = self.query.find_topics(self.search_terms, top_n=15)
+        frames = []
 
-        index = self.topic_model.find_topics(self.search_term, top_n=15)[0]
-        salience = self.topic_model.find_topics(self.search_term, top_n=15)[1]
+        for search_term, (index, salience) in found_by_term.items():
+            found_topics = [self.query.topic(x) for x in index]
 
-        for x in index:
-            found_topics.append(self.topic_model.get_topic(x))
+            df = pd.DataFrame(data=[salience, found_topics], columns=index, index=["Salience", "Terms"])
+            frames.append(df.explode(index))
 
-        data = [salience, found_topics]
-        df = pd.DataFrame(data=data, columns=index, index = ["Salience", "Terms"])
-        df = df.explode(index)
-        df.to_csv(out_filename)
+        if frames:
+            pd.concat(frames, keys=list(found_by_term.keys())).to_csv(out_filename)
 
     def format_all_topics(self, out_filename):
-        topic_name = self.topic_model.get_topic_info()['Name']
-        topic_number = self.topic_model.get_topic_info()['Topic']
-        topics_by_topic_number = []
-
-        for x in topic_number:
-            topics_by_topic_number.append(self.topic_model.get_topic(x))
+        topic_name = self.query.topic_info['Name']
+        topic_number = self.query.topic_info['Topic']
+        topics_by_topic_number = [self.query.topic(x) for x in topic_number]
 
         df = pd.DataFrame(data=topics_by_topic_number, index=topic_name)
         df.to_csv(out_filename)
 
     def get_rep_docs(self):
-        return self.topic_model.get_representative_docs()
\ No newline at end of file
+        return self.query.representative_docs if self.query is not None else self.topic_model.get_representative_docs()
+
+    def get_rep_doc_embeddings(self):
+        """
+        Returns {topic_id: (n_docs, dim) array} with the embeddings fit_transform used for each topic's
+        representative docs, in the same order as get_rep_docs(), or None if embeddings were not precomputed.
+        """
+        if self.embeddings is None:
+            return None
+
+        row_by_doc = {}
+        for row, doc in enumerate(self.data):
+            row_by_doc.setdefault(doc, row)
+
+        return {topic_id: self.embeddings[[row_by_doc[doc] for doc in docs]]
+                for topic_id, docs in self.get_rep_docs().items()}
\ No newline at end of file
@@ -0,0 +1,102 @@
+import functools
+import numpy as np
+
+
+def parse_search_terms(search_terms):
+    """
+    Accepts a list of terms or a comma separated string (BERT_SEARCH_TERM=crm software, sales pipeline)
+    and returns the non-empty terms in order, without duplicates
+    """
+    if isinstance(search_terms, str):
+        search_terms = search_terms.split(",")
+
+    return list(dict.fromkeys(term.strip() for term in search_terms if term and term.strip()))
+
+
+class TopicQuery:
+    """
+    Read-only view over a fitted BERTopic model that computes topic info, topic terms and search term
+    similarities once and serves every later call from memory. Search terms are embedded in one batch
+    and scored against all topic embeddings with a single matrix multiply.
+
+    Build a new TopicQuery whenever the model is refitted or its topics are updated.
+    """
+    def __init__(self, topic_model):
+        self.topic_model = topic_model
+        self.similarity_by_term = {}
+
+    @functools.cached_property
+    def topic_info(self):
+        return self.topic_model.get_topic_info()
+
+    @functools.cached_property
+    def topic_freq(self):
+        return self.topic_model.get_topic_freq()
+
+    @functools.cached_property
+    def topics(self):
+        """
+        {topic: [(term, weight), ...]} for every topic, including the outlier topic -1
+        """
+        return self.topic_model.get_topics()
+
+    @functools.cached_property
+    def representative_docs(self):
+        return self.topic_model.get_representative_docs()
+
+    @functools.cached_property
+    def topic_ids(self):
+        # topic_embeddings_ rows follow the sorted topic ids, as in BERTopic.find_topics
+        return np.array(sorted(self.topic_model.topic_representations_.keys()))
+
+    @functools.cached_property
+    def normalized_topic_embeddings(self):
+        if self.topic_model.topic_embeddings_ is None:
+            raise ValueError("[ERROR]: The topic model has no topic embeddings to compare search terms with")
+
+        embeddings = np.asarray(self.topic_model.topic_embeddings_, dtype=np.float32)
+        return embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+
+    def topic(self, topic_id):
+        return self.topics.get(topic_id, False)
+
+    def similarities(self, search_terms):
+        """
+        Returns a (len(search_terms), n_topics) array of cosine similarities, only embedding terms
+        that were not scored before
+        """
+        search_terms = parse_search_terms(search_terms)
+        missing = [term for term in search_terms if term not in self.similarity_by_term]
+
+        if missing:
+            term_embeddings = np.asarray(self.topic_model.embedding_model.embed_words(missing, verbose=False), dtype=np.float32)
+            term_embeddings /= np.maximum(np.linalg.norm(term_embeddings, axis=1, keepdims=True), 1e-12)
+
+            for term, row in zip(missing, term_embeddings @ self.normalized_topic_embeddings.T):
+                self.similarity_by_term[term] = row
+
+        if not search_terms:
+            return np.empty((0, len(self.topic_ids)), dtype=np.float32)
+        return np.vstack([self.similarity_by_term[term] for term in search_terms])
+
+    def find_topics(self, search_terms, top_n=5):
+        """
+        Same result as calling BERTopic.find_topics for every term, in one pass.
+        -----------------------------------------------------------------
+        Args:
+            search_terms: list of terms or a comma separated string
+            top_n: number of most similar topics returned per term
+
+        Returns:
+            dict: {search_term: (topics, similarities)}, most similar topic first
+        """
+        search_terms = parse_search_terms(search_terms)
+        similarities = self.similarities(search_terms)
+        top_n = min(top_n, len(self.topic_ids))
+
+        found_topics = {}
+        for term, row in zip(search_terms, similarities):
+            best = np.argsort(row)[::-1][:top_n]
+            found_topics[term] = ([int(topic) for topic in self.topic_ids[best]], [float(similarity) for similarity in row[best]])
+
+        return found_topics
@@ -0,0 +1,124 @@
+"""
+Structured outputs of a BERTopic run. Tables are written as Parquet and read back memory-mapped,
+representative docs and KeyBERT keywords as JSON lines (one topic per line), so dashboards and later
+stages never have to parse repr() dumps.
+"""
+import json
+import os
+import pandas as pd
+
+
+def topic_terms_frame(topics):
+    """
+    Flattens get_topics() ({topic: [(term, weight), ...]}) into topic / rank / term / weight rows
+    """
+    rows = [(topic, rank, term, float(weight))
+            for topic, terms in topics.items()
+            for rank, (term, weight) in enumerate(terms)]
+    return pd.DataFrame(rows, columns=["topic", "rank", "term", "weight"])
+
+
+def found_topics_frame(found_topics_by_term):
+    """
+    Flattens {search_term: (topics, similarities)} as returned by find_topics into
+    search_term / rank / topic / similarity rows
+    """
+    rows = [(search_term, rank, int(topic), float(similarity))
+            for search_term, (topics, similarities) in found_topics_by_term.items()
+            for rank, (topic, similarity) in enumerate(zip(topics, similarities))]
+    return pd.DataFrame(rows, columns=["search_term", "rank", "topic", "similarity"])
+
+
+def document_topics_frame(urls, topics, probs=None):
+    """
+    One row per document with its url, assigned topic and the probability of that topic (when known)
+    """
+    probability = None
+    if probs is not None:
+        probability = [float(p.max()) if getattr(p, "ndim", 0) else float(p) for p in probs]
+
+    return pd.DataFrame({"url": urls, "topic": [int(topic) for topic in topics], "probability": probability})
+
+
+def write_representative_docs(rep_docs, path):
+    with open(path, "w", encoding="utf-8") as f:
+        for topic, docs in rep_docs.items():
+            f.write(json.dumps({"topic": topic, "docs": docs}) + "\n")
+
+
+def read_representative_docs(path):
+    rep_docs = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                rep_docs[record["topic"]] = record["docs"]
+    return rep_docs
+
+
+def write_keywords(keywords, path):
+    """
+    Writes {topic: [(phrase, score), ...]} as one JSON line per topic
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        for topic, phrases in keywords.items():
+            f.write(json.dumps({"topic": topic, "keywords": [[phrase, float(score)] for phrase, score in phrases]}) + "\n")
+
+
+def read_keywords(path):
+    keywords = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                keywords[record["topic"]] = [tuple(keyword) for keyword in record["keywords"]]
+    return keywords
+
+
+class TopicResults:
+    """
+    Loads the outputs a BertopicTraining run wrote to an ml_data folder.
+    Parquet files are memory-mapped, so opening even large results takes milliseconds.
+    """
+    TABLES = {
+        "topic_info": "_TOPIC_INFO.parquet",
+        "topic_frequency": "_TOPIC_FREQUENCY.parquet",
+        "topic_terms": "_TOPIC_TERMS.parquet",
+        "found_topics": "_FOUND_TOPICS.parquet",
+        "document_topics": "_DOCUMENT_TOPICS.parquet",
+    }
+
+    def __init__(self, ml_data_path, name="individual_domain"):
+        self.ml_data_path = ml_data_path
+        self.name = name
+
+    def path(self, suffix):
+        return os.path.join(self.ml_data_path, self.name + suffix)
+
+    def table(self, table_name, columns=None):
+        """
+        Returns one of TABLES as a pyarrow Table, reading only the requested columns
+        """
+        import pyarrow.parquet as pq
+        return pq.read_table(self.path(self.TABLES[table_name]), columns=columns, memory_map=True)
+
+    def frame(self, table_name, columns=None):
+        return self.table(table_name, columns).to_pandas()
+
+    def topic_info(self):
+        return self.frame("topic_info")
+
+    def topic_frequency(self):
+        return self.frame("topic_frequency")
+
+    def topic_terms(self):
+        return self.frame("topic_terms")
+
+    def found_topics(self):
+        return self.frame("found_topics")
+
+    def document_topics(self):
+        return self.frame("document_topics")
+
+    def representative_docs(self):
+        return read_representative_docs(self.path("_REPRESENTATIVE_DOCS.jsonl"))
@@ -0,0 +1,149 @@
+import collections
+import contextlib
+import multiprocessing
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Nothing heavy is imported at module level. The BLAS thread caps are read by numpy/torch when they are first
+# loaded, which in a spawned worker can happen while the parent's main module is re-imported, before any
+# initializer runs, so the caps are put in the environment the workers are started with (thread_limited_environment).
+
+THREAD_LIMIT_ENV_VARS = ["OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "NUMEXPR_NUM_THREADS", "VECLIB_MAXIMUM_THREADS"]
+
+TrainingTask = collections.namedtuple("TrainingTask", ["section", "in_file_path", "out_directory_path", "out_filename", "search_term"])
+
+# Set once per worker process by init_worker
+worker_embedding_cache = None
+worker_training_settings = None
+
+
+def init_worker(threads_per_worker, cache_directory, model_name, training_settings):
+    """
+    Runs once in every worker (whose environment already holds the thread caps): caps torch's intra-op pool
+    and loads the embedding model it will reuse for every domain
+    """
+    global worker_embedding_cache, worker_training_settings
+
+    import torch
+    torch.set_num_threads(threads_per_worker)
+
+    from embedding_cache.main import EmbeddingCache
+    worker_embedding_cache = EmbeddingCache(cache_directory, model_name)
+    worker_embedding_cache.warm_up()
+    worker_training_settings = training_settings
+
+
+@contextlib.contextmanager
+def thread_limited_environment(threads):
+    """
+    Sets the BLAS/OpenMP thread caps in os.environ while the block runs, so processes spawned inside it
+    start with them, then restores the parent's values
+    """
+    limits = {env_var: str(threads) for env_var in THREAD_LIMIT_ENV_VARS}
+    limits["TOKENIZERS_PARALLELISM"] = "false"
+    previous = {env_var: os.environ.get(env_var) for env_var in limits}
+
+    os.environ.update(limits)
+    try:
+        yield
+    finally:
+        for env_var, value in previous.items():
+            if value is None:
+                os.environ.pop(env_var, None)
+            else:
+                os.environ[env_var] = value
+
+
+def train_domain(task, embedding_cache=None, training_settings=None):
+    """
+    Trains and writes the topic model of one domain, returning what the KeyBERT stage needs from it
+    and the metrics of the training (see stage_metrics.main.StageTimer)
+    """
+    from bertopic_wrapper.main import BertopicTraining
+    from stage_metrics.main import StageTimer
+
+    embedding_cache = embedding_cache or worker_embedding_cache
+    training_settings = training_settings or worker_training_settings
+
+    with StageTimer("bertopic:" + task.section) as timer:
+        bt = BertopicTraining(task.in_file_path, task.out_directory_path, task.out_filename, task.search_term, embedding_cache)
+        bt.train(**training_settings)
+        timer.items = bt.timings.get("documents")
+        timer.details = bt.timings
+
+    return task.section, bt.get_rep_docs(), bt.get_rep_doc_embeddings(), timer.metrics
+
+
+class TrainingScheduler:
+    """
+    Trains one BERTopic model per domain in a pool of worker processes. Every worker loads the
+    embedding model once, shares the on-disk embedding cache with the other workers and is limited
+    to threads_per_worker BLAS/torch threads, so the pool does not oversubscribe the cores.
+    """
+    def __init__(self, embedding_cache, training_settings, workers=1, threads_per_worker=None):
+        self.embedding_cache = embedding_cache
+        self.training_settings = training_settings
+        self.workers = max(1, workers)
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // self.workers)
+        # section -> training metrics of the last run
+        self.metrics = {}
+        # section -> traceback of the domains that failed to train in the last run
+        self.failed = {}
+
+    def run(self, tasks):
+        """
+        Trains every task and writes its outputs to the task's out_directory_path.
+        -----------------------------------------------------------------
+        Args:
+            tasks: list of TrainingTask
+
+        Returns:
+            dict: section -> (representative docs, representative doc embeddings), in the order of tasks.
+                  Domains that failed to train are left out, their tracebacks are in self.failed
+        """
+        self.metrics = {}
+        self.failed = {}
+
+        if self.workers == 1 or len(tasks) <= 1:
+            finished = {}
+            for task in tasks:
+                try:
+                    section, rep_docs, rep_doc_embeddings, metrics = train_domain(task, self.embedding_cache, self.training_settings)
+                    finished[section] = (rep_docs, rep_doc_embeddings)
+                    self.metrics[section] = metrics
+                except Exception as e:
+                    self.__record_failure(task.section, e)
+            return finished
+
+        print("[LOG]: Training " + str(len(tasks)) + " domains with " + str(self.workers)
+              + " workers, " + str(self.threads_per_worker) + " threads each")
+
+        finished = {}
+        # spawn instead of fork: the parent may already have torch loaded, which does not survive a fork
+        # Workers are spawned lazily while tasks are submitted, keep the caps in place until the pool is done
+        with thread_limited_environment(self.threads_per_worker), \
+             ProcessPoolExecutor(max_workers=min(self.workers, len(tasks)),
+                                 mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=init_worker,
+                                 initargs=(self.threads_per_worker,
+                                           os.path.dirname(self.embedding_cache.directory),
+                                           self.embedding_cache.model_name,
+                                           self.training_settings)) as pool:
+            futures = {pool.submit(train_domain, task): task for task in tasks}
+
+            for future in as_completed(futures):
+                try:
+                    section, rep_docs, rep_doc_embeddings, metrics = future.result()
+                    finished[section] = (rep_docs, rep_doc_embeddings)
+                    self.metrics[section] = metrics
+                    print("[LOG]: Finished training " + section)
+                except Exception as e:
+                    self.__record_failure(futures[future].section, e)
+
+        return {task.section: finished[task.section] for task in tasks if task.section in finished}
+
+    def __record_failure(self, section, error):
+        # An exception raised in a worker carries the worker's traceback as its cause, so it is part of the output
+        self.failed[section] = "".join(traceback.format_exception(type(error), error, error.__traceback__))
+        print("[ERROR]: Training " + section + " failed:\n" + self.failed[section])
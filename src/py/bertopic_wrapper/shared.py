@@ -0,0 +1,135 @@
+import collections
+import os
+import numpy as np
+import pandas as pd
+from corpus_reader.main import CorpusReader
+import bertopic_wrapper.results as results
+from bertopic_wrapper.main import BertopicTraining
+
+
+class SharedBertopicTraining(BertopicTraining):
+    """
+    Fits one BERTopic model over the documents of every domain, each document tagged with the domain
+    it was scraped from, instead of one model per domain. The outputs of every domain are then sliced
+    out of the shared model: per-domain topic terms come from topics_per_class (c-TF-IDF over the
+    domain's documents only), frequencies and document topics from the domain's share of topics_, and
+    representative docs from the domain's documents closest to each topic embedding. Topic ids mean
+    the same thing in every domain, so domains can be compared directly.
+    """
+    def __init__(self, in_file_paths_by_domain, out_directory_path, out_filename, search_term, embedding_cache=None):
+        super().__init__(list(in_file_paths_by_domain.values()), out_directory_path, out_filename, search_term, embedding_cache)
+        self.in_file_paths_by_domain = dict(in_file_paths_by_domain)
+        self.domains = None
+        self.topics_per_class = None
+
+    def load_documents(self):
+        """
+        Reads every domain's records, dropping duplicates within a domain only so that every domain
+        keeps all of its pages
+        """
+        self.data = []
+        self.urls = []
+        self.domains = []
+
+        for domain, path in self.in_file_paths_by_domain.items():
+            if not os.path.isfile(path):
+                print("[WARNING]: No scraped data for " + domain + " at " + path + ", skipping")
+                continue
+
+            corpus = CorpusReader(os.path.abspath(path))
+            for record in corpus:
+                self.data.append(record["content"])
+                self.urls.append(record["url"])
+                self.domains.append(domain)
+
+            print("[LOG]: Loaded " + str(corpus.records_read - corpus.duplicates_dropped) + " documents of " + domain)
+
+    def train(self, **training_settings):
+        """
+        Trains the shared model, see BertopicTraining.train. Online mode does not keep track of the
+        domain of each document, so the shared model is always fitted in batch mode.
+        """
+        if training_settings.get("mode", "batch") == "online":
+            print("[WARNING]: The shared topic model is trained in batch mode, TRAINING_MODE=online is ignored")
+        training_settings["mode"] = "batch"
+
+        super().train(**training_settings)
+
+        self.topics_per_class = self.topic_model.topics_per_class(self.data, classes=self.domains)
+        self.topics_per_class.to_parquet(os.path.join(self.ml_data_path, self.out_filename + "_TOPICS_PER_CLASS.parquet"), index=False)
+
+    def write_domain_outputs(self, out_directories_by_domain, out_filename="shared_model", n_docs=3):
+        """
+        Writes the topic info, frequencies, found topics, document topics and representative docs of every
+        domain to <domain directory>/ml_data, all derived from the shared model without refitting.
+        -----------------------------------------------------------------
+        Args:
+            out_directories_by_domain: {domain: output directory of that domain}
+            out_filename: prefix of the written files
+            n_docs: representative docs kept per topic and domain
+
+        Returns:
+            dict: domain -> (representative docs, representative doc embeddings or None)
+        """
+        domains = np.asarray(self.domains)
+        topics = np.asarray(self.topic_model.topics_)
+        topic_names = self.query.topic_info.set_index("Topic")["Name"]
+        found_topics = results.found_topics_frame(self.query.find_topics(self.search_terms, top_n=15))
+        domain_outputs = {}
+
+        for domain, out_directory in out_directories_by_domain.items():
+            indices = np.flatnonzero(domains == domain)
+            if not len(indices):
+                continue
+
+            ml_data_path = os.path.join(out_directory, "ml_data")
+            os.makedirs(ml_data_path, exist_ok=True)
+
+            def path(suffix):
+                return os.path.join(ml_data_path, out_filename + suffix)
+
+            counts = collections.Counter(topics[indices].tolist())
+            topic_frequency = pd.DataFrame(sorted(counts.items(), key=lambda count: count[1], reverse=True), columns=["Topic", "Count"])
+
+            domain_terms = self.topics_per_class[self.topics_per_class["Class"] == domain][["Topic", "Words"]]
+            topic_info = topic_frequency.merge(domain_terms, on="Topic", how="left")
+            topic_info["Name"] = topic_info["Topic"].map(topic_names)
+
+            rep_docs, rep_doc_embeddings = self.domain_representative_docs(indices, n_docs)
+            probs = None if self.probs is None else np.asarray(self.probs)[indices]
+
+            topic_info.to_parquet(path("_TOPIC_INFO.parquet"), index=False)
+            topic_frequency.to_parquet(path("_TOPIC_FREQUENCY.parquet"), index=False)
+            # Found topics of the shared model, limited to the topics this domain has documents in
+            found_topics[found_topics["topic"].isin(counts.keys())].to_parquet(path("_FOUND_TOPICS.parquet"), index=False)
+            results.document_topics_frame([self.urls[i] for i in indices], topics[indices], probs).to_parquet(path("_DOCUMENT_TOPICS.parquet"), index=False)
+            results.write_representative_docs(rep_docs, path("_REPRESENTATIVE_DOCS.jsonl"))
+
+            domain_outputs[domain] = (rep_docs, rep_doc_embeddings)
+            print("[LOG]: Wrote shared model outputs of " + domain + " (" + str(len(indices)) + " documents, " + str(len(counts)) + " topics)")
+
+        return domain_outputs
+
+    def domain_representative_docs(self, indices, n_docs=3):
+        """
+        For every topic of a domain, the n_docs documents of that domain closest to the topic embedding
+        (the first n_docs of the topic when embeddings were not precomputed)
+        """
+        topics = np.asarray(self.topic_model.topics_)[indices]
+        topic_rows = {topic: row for row, topic in enumerate(self.query.topic_ids)}
+        rep_docs = {}
+        rep_doc_embeddings = {} if self.embeddings is not None else None
+
+        for topic in sorted(set(topics.tolist())):
+            members = indices[topics == topic]
+
+            if self.embeddings is not None and self.topic_model.topic_embeddings_ is not None:
+                similarities = self.embeddings[members] @ self.query.normalized_topic_embeddings[topic_rows[topic]]
+                members = members[np.argsort(-similarities)]
+
+            best = members[:n_docs]
+            rep_docs[topic] = [self.data[i] for i in best]
+            if rep_doc_embeddings is not None:
+                rep_doc_embeddings[topic] = self.embeddings[best]
+
+        return rep_docs, rep_doc_embeddings
@@ -0,0 +1,47 @@
+"""
+BERTopic's default UMAP and HDBSCAN models, subclassed so they record how long their fit / transform
+calls take. Unlike engines.TimedComponent they still are UMAP and HDBSCAN instances, which BERTopic
+checks for before computing HDBSCAN topic probabilities. They live in their own module so a saved
+topic model can be unpickled wherever bertopic_wrapper is importable.
+"""
+import functools
+import time
+import hdbscan
+from umap import UMAP
+
+
+def timed(method):
+    """
+    Adds the seconds of every call of method to self.timings[method name]. Calls made from inside
+    another timed call (fit_transform calling fit) are counted once, by the outer call.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.__dict__.get("_timing_call"):
+            return method(self, *args, **kwargs)
+
+        self._timing_call = True
+        start = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self._timing_call = False
+            timings = self.__dict__.setdefault("timings", {})
+            timings[method.__name__] = timings.get(method.__name__, 0) + time.perf_counter() - start
+
+    return wrapper
+
+
+class TimedUMAP(UMAP):
+    name = "reduction_model"
+
+    fit = timed(UMAP.fit)
+    fit_transform = timed(UMAP.fit_transform)
+    transform = timed(UMAP.transform)
+
+
+class TimedHDBSCAN(hdbscan.HDBSCAN):
+    name = "clustering_model"
+
+    fit = timed(hdbscan.HDBSCAN.fit)
+    fit_predict = timed(hdbscan.HDBSCAN.fit_predict)
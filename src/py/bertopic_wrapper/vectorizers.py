@@ -0,0 +1,73 @@
+import collections
+from sklearn.feature_extraction.text import CountVectorizer
+
+DEFAULT_NGRAM_RANGE = (1, 5)
+DEFAULT_MIN_DF = 2
+DEFAULT_MAX_FEATURES = 100000
+
+# The document frequency table is pruned once it holds this many times max_features n-grams
+PRUNE_FACTOR = 10
+
+
+def parse_ngram_range(ngram_range):
+    """
+    Accepts (1, 5), "1,5" or "1-5"
+    """
+    if isinstance(ngram_range, str):
+        ngram_range = ngram_range.replace("-", ",").split(",")
+
+    low, high = (int(value) for value in ngram_range)
+    if low < 1 or high < low:
+        raise ValueError("[ERROR]: Invalid n-gram range " + str(ngram_range))
+    return low, high
+
+
+def bounded_vocabulary(documents, ngram_range=DEFAULT_NGRAM_RANGE, min_df=DEFAULT_MIN_DF, max_features=DEFAULT_MAX_FEATURES, stop_words="english"):
+    """
+    Counts in how many documents every n-gram appears, one document at a time, and keeps the
+    max_features most frequent ones seen in at least min_df documents. Whenever the table grows past
+    PRUNE_FACTOR * max_features entries, the rarest n-grams are dropped, so memory depends on
+    max_features instead of the size of the corpus.
+    -----------------------------------------------------------------
+    Args:
+        documents: the documents, read once
+        ngram_range: (min_n, max_n) of the extracted n-grams
+        min_df: minimum number of documents an n-gram must appear in
+        max_features: maximum size of the vocabulary
+
+    Returns:
+        list: the vocabulary, most frequent n-gram first
+    """
+    analyzer = CountVectorizer(stop_words=stop_words, ngram_range=parse_ngram_range(ngram_range)).build_analyzer()
+    prune_at = max(max_features * PRUNE_FACTOR, 1)
+
+    document_frequency = collections.Counter()
+    floor = 0
+
+    for document in documents:
+        document_frequency.update(set(analyzer(document)))
+
+        if len(document_frequency) > prune_at:
+            # Drop everything at or below a rising floor until the table is back to half its limit
+            while len(document_frequency) > prune_at // 2:
+                floor += 1
+                for term in [term for term, count in document_frequency.items() if count <= floor]:
+                    del document_frequency[term]
+
+    return [term for term, count in document_frequency.most_common(max_features) if count >= min_df]
+
+
+def bounded_count_vectorizer(documents, ngram_range=DEFAULT_NGRAM_RANGE, min_df=DEFAULT_MIN_DF, max_features=DEFAULT_MAX_FEATURES):
+    """
+    A CountVectorizer for BERTopic.update_topics with a fixed vocabulary from bounded_vocabulary,
+    so building the c-TF-IDF matrix never materialises the full n-gram vocabulary of the corpus
+    """
+    ngram_range = parse_ngram_range(ngram_range)
+    vocabulary = bounded_vocabulary(documents, ngram_range, min_df, max_features)
+
+    if not vocabulary:
+        print("[WARNING]: No n-gram appears in " + str(min_df) + " documents, keeping the " + str(max_features) + " most frequent ones")
+        vocabulary = bounded_vocabulary(documents, ngram_range, 1, max_features)
+
+    print("[LOG]: c-TF-IDF vocabulary of " + str(len(vocabulary)) + " n-grams " + str(ngram_range))
+    return CountVectorizer(stop_words="english", ngram_range=ngram_range, vocabulary=vocabulary)
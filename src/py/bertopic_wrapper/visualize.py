@@ -0,0 +1,114 @@
+import functools
+import hashlib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
+
+FIGURES = ["topics", "hierarchy", "barchart", "heatmap"]
+
+DEFAULT_LINKAGE_METHOD = "ward"
+
+
+class LinkageCache:
+    """
+    Caches the hierarchical clustering of the topics, the expensive part of visualize_hierarchy.
+    Results are kept in memory and, when a cache_directory is given, in .npy files keyed by a hash of
+    the distance matrix, so re-rendering a saved model with other parameters reuses the linkage.
+    """
+    def __init__(self, cache_directory=None, method=DEFAULT_LINKAGE_METHOD):
+        self.cache_directory = cache_directory
+        self.method = method
+        self.linkages = {}
+
+        if self.cache_directory is not None:
+            os.makedirs(self.cache_directory, exist_ok=True)
+
+    def __call__(self, distance_matrix):
+        """
+        Used as the linkage_function of BERTopic.visualize_hierarchy
+        """
+        import scipy.cluster.hierarchy as sch
+
+        distance_matrix = np.ascontiguousarray(distance_matrix)
+        key = self.method + "_" + hashlib.sha1(distance_matrix.tobytes() + str(distance_matrix.shape).encode()).hexdigest()
+
+        if key in self.linkages:
+            return self.linkages[key]
+
+        path = os.path.join(self.cache_directory, "linkage_" + key + ".npy") if self.cache_directory is not None else None
+        if path is not None and os.path.isfile(path):
+            self.linkages[key] = np.load(path)
+            return self.linkages[key]
+
+        linkage = sch.linkage(distance_matrix, self.method, optimal_ordering=True)
+        self.linkages[key] = linkage
+        if path is not None:
+            np.save(path, linkage)
+        return linkage
+
+
+class TopicVisualizer:
+    """
+    Renders the BERTopic figures of a fitted model as HTML, each figure on its own thread.
+    """
+    def __init__(self, topic_model, cache_directory=None, linkage_method=DEFAULT_LINKAGE_METHOD):
+        self.topic_model = topic_model
+        self.linkage_function = LinkageCache(cache_directory, linkage_method)
+
+        self.renderers = {
+            "topics": self.topic_model.visualize_topics,
+            "hierarchy": functools.partial(self.topic_model.visualize_hierarchy, linkage_function=self.linkage_function),
+            "barchart": self.topic_model.visualize_barchart,
+            "heatmap": self.topic_model.visualize_heatmap,
+        }
+
+    def render(self, output_directory, figures=FIGURES, workers=len(FIGURES), **figure_options):
+        """
+        Writes <figure>_visual.html for every requested figure.
+        -----------------------------------------------------------------
+        Args:
+            output_directory: folder the HTML files are written to
+            figures: names of the figures to render, see FIGURES
+            workers: figures rendered at the same time
+            figure_options: {figure: {keyword arguments of BERTopic.visualize_<figure>}}
+
+        Returns:
+            dict: figure -> seconds it took to render, for the figures that rendered
+        """
+        unknown = [figure for figure in figures if figure not in self.renderers]
+        if unknown:
+            raise ValueError("[ERROR]: Unknown visualizations " + ", ".join(unknown) + ", expected some of " + ", ".join(FIGURES))
+
+        os.makedirs(output_directory, exist_ok=True)
+        timings = {}
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            futures = {pool.submit(self.__render_figure, figure, output_directory, figure_options.get(figure, {})): figure
+                       for figure in figures}
+
+            for future in as_completed(futures):
+                figure = futures[future]
+                try:
+                    timings[figure] = future.result()
+                except ValueError as e:
+                    print("Error: " + str(e))
+                    print("!=== " + figure + " probably has to do with bertopic not being provided enough data ===!")
+
+        return timings
+
+    def __render_figure(self, figure, output_directory, options):
+        start = time.perf_counter()
+        self.renderers[figure](**options).write_html(os.path.join(output_directory, figure + "_visual.html"))
+        return round(time.perf_counter() - start, 3)
+
+
+def render_saved_model(model_path, output_directory, figures=FIGURES, workers=len(FIGURES), **figure_options):
+    """
+    Loads a _TOPIC_MODEL.bin and renders its visualizations, caching the linkage next to the HTML files
+    """
+    from bertopic import BERTopic
+
+    topic_model = BERTopic.load(model_path)
+    visualizer = TopicVisualizer(topic_model, os.path.join(output_directory, ".cache"))
+    return visualizer.render(output_directory, figures, workers, **figure_options)
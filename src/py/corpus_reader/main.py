@@ -0,0 +1,103 @@
+import gzip
+import hashlib
+import io
+import json
+
+DEFAULT_FIELDS = ("content", "url")
+
+
+def open_corpus_file(path):
+    """
+    Opens a .jl file for reading as text, transparently decompressing .gz and .zst files.
+    """
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8-sig")
+
+    if path.endswith(".zst"):
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("[ERROR]: Reading " + path + " requires the zstandard package (pip install zstandard)")
+
+        raw = open(path, "rb")
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(raw, closefd=True), encoding="utf-8-sig")
+
+    return open(path, "r", encoding="utf-8-sig")
+
+
+class CorpusReader:
+    """
+    Streams scraped records out of any number of .jl files (optionally gzip/zstd compressed)
+    without merging them into one file or loading them all at once. Records with empty content
+    are skipped, and records whose content was already seen are dropped when deduplicate is True.
+    Lines that are not a JSON object (like the truncated last line of a killed crawl) are skipped and counted.
+    """
+    def __init__(self, paths, fields=DEFAULT_FIELDS, deduplicate=True):
+        self.paths = [paths] if isinstance(paths, str) else list(paths)
+        self.fields = fields
+        self.deduplicate = deduplicate
+        self.records_read = 0
+        self.duplicates_dropped = 0
+        self.malformed_lines = 0
+
+    def __iter__(self):
+        # Only a 16 byte digest per unique document is kept in memory
+        seen = set()
+        self.records_read = 0
+        self.duplicates_dropped = 0
+        self.malformed_lines = 0
+
+        for path in self.paths:
+            malformed_lines = self.malformed_lines
+            with open_corpus_file(path) as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        record = None
+                    if not isinstance(record, dict):
+                        self.malformed_lines += 1
+                        continue
+
+                    content = record.get("content")
+                    if not content:
+                        continue
+
+                    self.records_read += 1
+
+                    if self.deduplicate:
+                        digest = hashlib.blake2b(content.encode("utf-8"), digest_size=16).digest()
+                        if digest in seen:
+                            self.duplicates_dropped += 1
+                            continue
+                        seen.add(digest)
+
+                    yield {field: record.get(field) for field in self.fields}
+
+            if self.malformed_lines > malformed_lines:
+                print("[WARNING]: Skipped " + str(self.malformed_lines - malformed_lines) + " malformed lines in " + path)
+
+    def documents(self):
+        """
+        Yields only the content of every record
+        """
+        for record in self:
+            yield record["content"]
+
+    def chunks(self, chunk_size):
+        """
+        Yields lists of at most chunk_size records
+        """
+        chunk = []
+        for record in self:
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+
+        if chunk:
+            yield chunk
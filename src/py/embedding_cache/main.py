@@ -0,0 +1,154 @@
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import numpy as np
+
+DEFAULT_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+
+
+class EmbeddingCache:
+    """
+    On-disk store of document embeddings, keyed by a hash of the document text and the model name.
+    Vectors live in a memory-mapped float32 matrix (embeddings.f32) and index.json maps each key to its row,
+    so only documents that were never embedded before are sent to the encoder.
+    Appends are guarded by a file lock, so several training processes can share one cache.
+    """
+    def __init__(self, cache_directory, model_name=DEFAULT_EMBEDDING_MODEL, batch_size=64):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.directory = os.path.join(cache_directory, model_name.replace("/", "_"))
+        self.index_path = os.path.join(self.directory, "index.json")
+        self.lock_path = os.path.join(self.directory, ".lock")
+        self.matrix_path = os.path.join(self.directory, "embeddings.f32")
+
+        self._embedding_model = None
+        self.dimension = None
+        self.index = {}
+        self.matrix = None
+
+        os.makedirs(self.directory, exist_ok=True)
+        self.__load_index()
+
+    @property
+    def embedding_model(self):
+        """
+        The sentence-transformer used to fill the cache, loaded on first use so BERTopic and KeyBERT can share it.
+        """
+        if self._embedding_model is None:
+            from sentence_transformers import SentenceTransformer
+            self._embedding_model = SentenceTransformer(self.model_name)
+        return self._embedding_model
+
+    def warm_up(self):
+        """
+        Loads the embedding model now instead of on the first embed() call
+        """
+        return self.embedding_model
+
+    def key(self, doc):
+        return hashlib.sha1((self.model_name + "\0" + doc).encode("utf-8")).hexdigest()
+
+    def embed(self, docs, verbose=False, store=True):
+        """
+        Returns embeddings for docs, encoding only the documents that are not in the cache yet.
+        -----------------------------------------------------------------
+        Args:
+            docs: list of document strings
+            verbose: show the sentence-transformer progress bar while encoding new documents
+            store: add the newly encoded documents to the cache, when False they are only returned
+
+        Returns:
+            numpy.ndarray: (len(docs), dimension) float32 matrix in the same order as docs
+        """
+        keys = [self.key(doc) for doc in docs]
+
+        missing = {}
+        for key, doc in zip(keys, docs):
+            if key not in self.index and key not in missing:
+                missing[key] = doc
+
+        print("[LOG]: Embedding cache hits: " + str(len(docs) - len(missing)) + ", new documents: " + str(len(missing)))
+
+        if missing:
+            vectors = self.embedding_model.encode(list(missing.values()),
+                                                  batch_size=self.batch_size,
+                                                  show_progress_bar=verbose,
+                                                  convert_to_numpy=True)
+            if not store:
+                new_vectors = dict(zip(missing, np.asarray(vectors, dtype=np.float32)))
+                return np.stack([new_vectors[key] if key in new_vectors else self.matrix[self.index[key]] for key in keys])
+            self.__append(list(missing.keys()), vectors)
+
+        if not keys:
+            return np.empty((0, self.dimension or 0), dtype=np.float32)
+
+        rows = np.fromiter((self.index[key] for key in keys), dtype=np.int64, count=len(keys))
+        return np.asarray(self.matrix[rows])
+
+    def __append(self, keys, vectors):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+
+        with self.__locked():
+            # Another process may have added rows since this cache was opened
+            self.__load_index()
+
+            new_rows = [row for row, key in enumerate(keys) if key not in self.index]
+            if not new_rows:
+                return
+            keys = [keys[row] for row in new_rows]
+            vectors = vectors[new_rows]
+
+            if self.dimension is None:
+                self.dimension = int(vectors.shape[1])
+            elif vectors.shape[1] != self.dimension:
+                raise ValueError("[ERROR]: Embedding dimension " + str(vectors.shape[1])
+                                 + " does not match cache dimension " + str(self.dimension))
+
+            start = len(self.index)
+            with open(self.matrix_path, "ab") as f:
+                # Drop rows left behind by a run that stopped before its index was written
+                f.truncate(start * self.dimension * vectors.itemsize)
+                f.write(vectors.tobytes())
+
+            for offset, key in enumerate(keys):
+                self.index[key] = start + offset
+
+            self.__write_index()
+            self.__open_matrix()
+
+    @contextlib.contextmanager
+    def __locked(self):
+        with open(self.lock_path, "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def __load_index(self):
+        if not os.path.isfile(self.index_path):
+            return
+
+        with open(self.index_path, "r", encoding="utf-8") as f:
+            stored = json.load(f)
+
+        if stored.get("model_name") != self.model_name:
+            raise ValueError("[ERROR]: Embedding cache at " + self.directory + " belongs to " + str(stored.get("model_name")))
+
+        self.dimension = stored["dimension"]
+        self.index = stored["keys"]
+        self.__open_matrix()
+
+    def __write_index(self):
+        # Write to a temporary file first so an interrupted run never leaves a half written index
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"model_name": self.model_name, "dimension": self.dimension, "keys": self.index}, f)
+        os.replace(tmp_path, self.index_path)
+
+    def __open_matrix(self):
+        if self.index:
+            self.matrix = np.memmap(self.matrix_path, dtype=np.float32, mode="r",
+                                    shape=(len(self.index), self.dimension))
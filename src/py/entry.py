@@ -1,20 +1,29 @@
+import argparse
 import configparser
-import shutil
-import bertopic_wrapper.main as bert
-import keybert_wrapper.main as kb
 import os
+import functools
 import glob
 import json
 import sys
-import pandas as pd
-import ast
+import time
+from stage_metrics.main import RunReport
+
+# The scrapy and modelling stacks (scrapy, BERTopic, KeyBERT, sentence-transformers, torch...) are imported
+# inside the functions that use them, so a run only pays for the stages it actually executes.
 
 
 class EntryPoint:
     """ 
     This class is the main entry point for running scrape-n-bert in its various options.
     """
-    def __init__(self, config_path=""):
+    def __init__(self, config_path="", report=None):
+        self.config = None
+        self.embedding_cache = None
+        # domain -> (representative docs, representative doc embeddings) of the topic models trained in this run
+        self.training_results = {}
+        # Wall time, CPU time, peak memory and items/sec of every stage of this run
+        self.report = report if report is not None else RunReport("entry")
+
         # Check if config_path exists
         if config_path == "":
             print("[LOG]: Running without config file")
@@ -29,23 +38,73 @@ class EntryPoint:
 
     
     # Currently working
-    def scrape_and_run_bertopic_per_domain(self):
+    def scrape_and_run_bertopic_per_domain(self, force=()):
         """
         This function uses scrapy to scrape desired data from a .ini (must be formatted correctly),
         and then feeds it into a bertopic instance to generate data for each individual domain provided.
+
+        Every domain goes through the stages crawl:<domain> -> train:<domain> -> keybert:<domain>
+        (a single train:shared stage after every crawl with TOPIC_MODEL_SCOPE=shared). Each completed stage
+        is recorded in <output>/.snb_checkpoints.json with a hash of its config and input files, and is
+        skipped on the next run while those are unchanged, so an interrupted run resumes where it stopped.
         -----------------------------------------------------------------
+        Args:
+            force: stage names ("crawl", "train", "keybert") or stage keys ("train:learn.g2.com") to re-run anyway
         """
-        # Get general settings from config file
-        output_file_directory = self.config['General Settings']['OUTPUT_FILE_DIRECTORY']
+        from stage_graph.main import CHECKPOINT_FILE_NAME, CheckpointStore, Stage, StageGraph
 
-        # Run scrapey spider over domains listed in config file
-        self.__config_scrape_loop(output_file_directory)
-
-        # Run bertopic over .jl files created
-        self.__bert_training_loop(output_file_directory)
-
-        #Pull BERTopic representative documents and iterate through them with KeyBERT
-        self.__keybert_loop(output_file_directory)
+        # Get general settings from config file
+        settings = self.config['General Settings']
+        output_file_directory = settings['OUTPUT_FILE_DIRECTORY']
+        domain_paths = self.__get_domain_paths(output_file_directory)
+        shared = self.__uses_shared_topic_model()
+        out_file_name = "shared_model" if shared else "individual_domain"
+
+        graph = StageGraph(CheckpointStore(os.path.join(output_file_directory, CHECKPOINT_FILE_NAME)),
+                           {"crawl": self.__run_crawl_stages, "train": self.__run_training_stages},
+                           force)
+        training_config = {
+            "training_settings": self.__get_training_settings(),
+            "search_term": settings['BERT_SEARCH_TERM'],
+            "embedding_model": settings.get('EMBEDDING_MODEL', ''),
+            "topic_model_scope": settings.get('TOPIC_MODEL_SCOPE', 'per_domain'),
+        }
+
+        for section, (in_file_path, out_directory_path) in domain_paths.items():
+            rep_docs_path = os.path.join(out_directory_path, "ml_data", out_file_name + "_REPRESENTATIVE_DOCS.jsonl")
+
+            # Scrape the domain, all pending domains are crawled together in one reactor
+            graph.add(Stage("crawl:" + section, outputs=[in_file_path], config=self.__get_crawl_config(section), batch="crawl"))
+
+            # Run bertopic over the .jl file, one model per domain or one model shared by every domain
+            if not shared:
+                graph.add(Stage("train:" + section, inputs=[in_file_path], outputs=[rep_docs_path],
+                                config=training_config, after=["crawl:" + section], batch="train"))
+
+            # Pull the domain's BERTopic representative documents and iterate through them with KeyBERT
+            graph.add(Stage("keybert:" + section,
+                            run=functools.partial(self.__extract_domain_keywords, section, rep_docs_path, out_directory_path),
+                            inputs=[rep_docs_path],
+                            outputs=[os.path.join(out_directory_path, "keybert_keywords_results.jsonl")],
+                            config={"embedding_model": training_config["embedding_model"]},
+                            after=["train:shared" if shared else "train:" + section]))
+
+        if shared:
+            graph.add(Stage("train:shared",
+                            run=functools.partial(self.__shared_bert_training, output_file_directory),
+                            inputs=[paths[0] for paths in domain_paths.values()],
+                            outputs=[os.path.join(paths[1], "ml_data", out_file_name + "_REPRESENTATIVE_DOCS.jsonl") for paths in domain_paths.values()],
+                            config=training_config,
+                            after=["crawl:" + section for section in domain_paths]))
+
+        status = graph.run()
+
+        for state in ["skipped", "completed", "failed", "blocked"]:
+            keys = [key for key, stage_state in status.items() if stage_state == state]
+            if keys:
+                print("[LOG]: " + str(len(keys)) + " stages " + state + ": " + ", ".join(keys))
+
+        self.report.stage_states = status
 
     # --- WIP ---
     def scrape_only(self):
@@ -67,6 +126,69 @@ class EntryPoint:
         # Run scrapey spider over domains listed in config file
         self.__config_scrape_loop(output_file_directory)
 
+    def shared_bertopic_only(self):
+        """
+        Fits one topic model over the already scraped data of every domain in the config file,
+        and writes every domain's topics, derived from that model, to the domain's folder.
+        -----------------------------------------------------------------
+        """
+        output_file_directory = self.config['General Settings']['OUTPUT_FILE_DIRECTORY']
+
+        self.__shared_bert_training(output_file_directory)
+        self.__keybert_loop(output_file_directory)
+
+    def reextract_from_archive(self, archive_directory, css_selector, output_path, workers=None):
+        """
+        Re-runs a css selector over a response archive written by a crawl with ARCHIVE_RESPONSES,
+        writing a new .jl file without downloading anything.
+        -----------------------------------------------------------------
+        Args:
+            archive_directory: folder of the response archive (<domain>_archive next to the scraped .jl by default)
+            css_selector: selector of the page text, as in CSS_SELECTORS
+            output_path: the .jl file to write
+            workers: number of worker processes (every core by default)
+        """
+        import scrapy_wrapper.main  # puts the scrapy project on sys.path
+        from recursive_spider.reextract import reextract
+
+        with self.report.stage("re-extract") as stage:
+            result = reextract(archive_directory, css_selector, output_path, workers)
+            stage.items = result["items"]
+            stage.details = result
+
+    def reextract_config_domains(self, workers=None):
+        """
+        Re-extracts every domain in the config file from its response archive with the domain's current
+        CSS_SELECTORS, overwriting the domain's scraped .jl file like a new crawl would.
+        -----------------------------------------------------------------
+        Args:
+            workers: number of worker processes (every core by default)
+        """
+        import scrapy_wrapper.main as spider
+        from recursive_spider.reextract import reextract
+        from recursive_spider.spiders.MainSpider import determine_domain
+
+        output_file_directory = self.config['General Settings']['OUTPUT_FILE_DIRECTORY']
+        crawler = spider.MultiDomainCrawler(self.config)
+
+        with self.report.stage("re-extract") as stage:
+            stage.items = 0
+            for section in self.config.sections():
+                if section != "General Settings":
+                    output_path = os.path.abspath(output_file_directory + "/" + self.__create_domain_folder_name(section)
+                                                  + "/" + self.__create_scrapy_content_file_name(section))
+                    archive_directory = crawler.section_archive_directory(section, output_path)
+
+                    if not os.path.isdir(archive_directory):
+                        print("[WARNING]: No response archive for " + section + " at " + archive_directory + ", skipping")
+                        continue
+
+                    # A shared archive folder holds other domains' pages too, only this domain's go into its .jl
+                    result = reextract(archive_directory, crawler.section_css_selector(section), output_path,
+                                       workers, crawler.section_flag(section, "FAST_EXTRACTOR"), determine_domain(section))
+                    stage.items += result["items"]
+                    stage.details[section] = result
+
     # Currently working
     def bertopic_only(self, input_file_path, output_directory, search_term):
         """
@@ -80,6 +202,8 @@ class EntryPoint:
         Raises:
             placeHolder 
         """
+        import bertopic_wrapper.main as bert
+
         # Check input_file_path is real
         try:
             self.__check_if_file_exists(input_file_path)
@@ -96,80 +220,233 @@ class EntryPoint:
         domain_folder_path = self.__create_folder_for_domain(output_directory, scraped_data_name)
         print(domain_folder_path)
 
-        bt = bert.BertopicTraining(input_file_path, domain_folder_path, "bertopic_only", search_term)
-        bt.trainModel()
+        with self.report.stage("bertopic") as stage:
+            bt = bert.BertopicTraining(input_file_path, domain_folder_path, "bertopic_only", search_term, self.__get_embedding_cache(output_directory))
+            bt.train(**self.__get_training_settings())
+            stage.items = bt.timings.get("documents")
+            stage.details = bt.timings
         
     def keybert_only(self, input_file_path, output_directory, name_of_file):
-        kw = kb.KeybertWrapper(input_file_path)
-        keywords = []
-        complete_output_path = os.path.join(output_directory, name_of_file)
-        with open(input_file_path) as f:
-            contents = f.read()
-        content_dict_or_other = ast.literal_eval(contents)
-        if type(content_dict_or_other) == "dict":
-            content_dict = content_dict_or_other
-            for key, value in content_dict.items():
-                keywords.append(str(key) + ": " + str(kw.run_keybert(value)))
+        """
+        Extracts keywords from a single input file and writes them to <name_of_file>.jsonl.
+        -----------------------------------------------------------------
+        Args:
+            input_file_path: a _REPRESENTATIVE_DOCS.jsonl file, a .json file of {key: [documents]},
+                             or any other file, which is read as one plain text document
+            output_directory: the directory the keywords are written to
+            name_of_file: name of the output file, without extension
+        """
+        import keybert_wrapper.main as kb
+        import bertopic_wrapper.results as results
+
+        if input_file_path.endswith(".jsonl"):
+            docs = results.read_representative_docs(input_file_path)
+        elif input_file_path.endswith(".json"):
+            with open(input_file_path, encoding="utf-8") as f:
+                docs = json.load(f)
+        else:
+            with open(input_file_path, encoding="utf-8") as f:
+                docs = {name_of_file: [f.read()]}
+
+        with self.report.stage("keybert") as stage:
+            kw = kb.KeybertWrapper(docs, self.__get_embedding_cache(output_directory))
+            keywords = kw.find_keywords_batched()
+            kw.write_keywords_to_disk(keywords, output_directory, name_of_file)
+            stage.items = sum(1 if isinstance(topic_docs, str) else len(topic_docs) for topic_docs in docs.values())
+
+    def assign_topics(self, model_path, input_path, output_directory, name_of_file, batch_size, cache_embeddings=False):
+        """
+        Assigns the topics of a saved model to newly scraped pages, without retraining.
+        -----------------------------------------------------------------
+        Args:
+            model_path: a _TOPIC_MODEL.bin written by a previous run
+            input_path: a .jl file, or a folder of .jl files
+            output_directory: folder <name_of_file>_DOCUMENT_TOPICS.parquet is written to
+            name_of_file: name of the output file
+            batch_size: documents embedded and assigned at once
+            cache_embeddings: add the embeddings of documents the cache does not know yet to it
+
+        Raises:
+            ValueError: Could not find given file or directory
+        """
+        from bertopic_wrapper.inference import TopicAssigner, load_topic_model
+
+        if os.path.isdir(input_path):
+            in_file_paths = self.__get_all_jl_files_in_directory(input_path)
+        elif os.path.isfile(input_path):
+            in_file_paths = [input_path]
         else:
-            other_content = content_dict_or_other
-            keywords = kw.run_keybert(str(other_content))
+            raise ValueError("[ERROR]: Could not find given file or directory -> " + input_path)
 
-        output = open(complete_output_path + ".txt", "a+")
-        output.write(str(keywords))
-        output.close()
+        os.makedirs(output_directory, exist_ok=True)
+        out_file_path = os.path.join(output_directory, name_of_file + "_DOCUMENT_TOPICS.parquet")
+
+        with self.report.stage("assign-topics") as stage:
+            embedding_cache = self.__get_embedding_cache(output_directory)
+            assigner = TopicAssigner(load_topic_model(model_path, embedding_cache), embedding_cache, batch_size,
+                                     cache_embeddings)
+            assigned = assigner.assign_files(in_file_paths, out_file_path)
+            stage.items = assigned
+        print("[LOG]: Wrote topics of " + str(assigned) + " documents to " + out_file_path)
+
+    def visualize(self, model_path, output_directory, figures, workers):
+        """
+        Renders the HTML visualizations of a saved topic model, separately from training.
+        -----------------------------------------------------------------
+        Args:
+            model_path: a _TOPIC_MODEL.bin written by a previous run
+            output_directory: folder the HTML files are written to
+            figures: names of the figures to render (topics, hierarchy, barchart, heatmap)
+            workers: figures rendered at the same time
+
+        Raises:
+            ValueError: Could not find given file
+        """
+        import bertopic_wrapper.visualize as visualize
+
+        if not os.path.isfile(model_path):
+            raise ValueError("[ERROR]: Could not find given file -> " + model_path)
+
+        with self.report.stage("visualize") as stage:
+            timings = visualize.render_saved_model(model_path, output_directory, figures, workers)
+            stage.items = len(timings)
+            stage.details = timings
+        print("[LOG]: Rendered visualizations " + str(timings))
+
+    def run_worker_daemon(self, host, port, cache_directory):
+        """
+        Starts a long running local worker that keeps the embedding and KeyBERT models loaded
+        and runs bertopic_only, keybert_only and transform jobs sent to its HTTP API.
+        -----------------------------------------------------------------
+        Args:
+            host: interface to listen on (localhost by default)
+            port: port to listen on
+            cache_directory: directory for the embedding cache when the config does not set EMBEDDING_CACHE_DIRECTORY
+        """
+        import worker_daemon.main as daemon
+
+        daemon.serve(self.__get_embedding_cache(cache_directory), host, port)
 
     # --- WIP ----
     def compile_scrape_data_and_run_bertopic(self, input_data_directory, output_directory, output_filename):
         """
-        This function compiles several .jl files from the input_data_path and then 
-        feeds it into a bertopic instance, and returns bertopic topic files
+        This function streams several .jl files from the input_data_path into 
+        a bertopic instance, and returns bertopic topic files. The files are not merged on disk,
+        and pages with the exact same content are only used once.
         -----------------------------------------------------------------
         Args: 
-            input_data_path: Path to folder containing .jl files to compile
+            input_data_path: Path to folder containing .jl files to compile (.jl.gz and .jl.zst are read too)
             output_directory: the directory you want bertopic files to be written to
 
         Raises: 
-            placeHolder
+            ValueError: Could not find given directory
         """
-        result = []
+        import bertopic_wrapper.main as bert
+
         jl_path_list = self.__get_all_jl_files_in_directory(input_data_directory)
         print(jl_path_list)
 
-        combined_file_path = output_directory + "/" + output_filename + '_merged_file.jl'
-        print(combined_file_path)
+        with self.report.stage("bertopic") as stage:
+            bt = bert.BertopicTraining(jl_path_list, output_directory, "merged_data", "", self.__get_embedding_cache(output_directory))
+            bt.train(**self.__get_training_settings())
+            stage.items = bt.timings.get("documents")
+            stage.details = bt.timings
+
+    def __keybert_loop(self, output_file_directory):
+        """
+        Extracts the keywords of every trained domain's representative docs into that domain's folder.
+        -----------------------------------------------------------------
+        Args:
+            output_file_directory: The root directory that the data will be written to.
+        """
+        if not self.training_results:
+            print("[WARNING]: No trained topic models to extract keywords from")
+            return
+
+        domain_paths = self.__get_domain_paths(output_file_directory)
+        for section in self.training_results:
+            self.__extract_domain_keywords(section, None, domain_paths[section][1])
+
+    def __extract_domain_keywords(self, section, rep_docs_path, out_directory_path):
+        """
+        Runs KeyBERT over one domain's representative docs and writes <domain folder>/keybert_keywords_results.jsonl.
+        -----------------------------------------------------------------
+        Args:
+            section: the domain
+            rep_docs_path: _REPRESENTATIVE_DOCS.jsonl read when the domain was not trained in this run
+            out_directory_path: the domain's output folder
+        """
+        import keybert_wrapper.main as kb
+        import bertopic_wrapper.results as results
+
+        # Docs trained in this run come with their embeddings, others are read back from disk
+        if section in self.training_results:
+            rep_docs, rep_doc_embeddings = self.training_results[section]
+        else:
+            rep_docs, rep_doc_embeddings = results.read_representative_docs(rep_docs_path), None
 
-        outfile = open(combined_file_path, "w", encoding="utf-8-sig")
-        for f in jl_path_list:
-            with open(f, 'r', encoding='utf-8-sig') as infile:
-                for line in infile.readlines():
-                    outfile.write(line)
-        outfile.close()
+        with self.report.stage("keybert") as stage:
+            kw = kb.KeybertWrapper(rep_docs, self.__get_embedding_cache(os.path.dirname(out_directory_path)))
+            keywords = kw.find_keywords_batched(rep_doc_embeddings)
 
-        bt = bert.BertopicTraining("/home/granthopkins/workspace/scrape-n-bert-v4/data/test_merged_file.jl", output_directory, "merged_data", "")
-        bt.trainModel()
+            kw.write_keywords_to_disk(keywords, out_directory_path)
+            stage.items = sum(len(docs) for docs in rep_docs.values())
+            stage.details = {"domain": section}
 
-    def __keybert_loop(self, output_file_directory):
-        rep_docs = self.bt.get_rep_docs()
+    def __run_crawl_stages(self, stages):
+        """
+        Batch runner of the crawl:<domain> stages: crawls every pending domain in one scrapy process.
+        ----------------------------------------------------------------
+        Returns:
+            list: keys of the stages whose crawl ran to the end (not interrupted)
+        """
+        sections = [stage.key.split(":", 1)[1] for stage in stages]
+        stats = self.__config_scrape_loop(self.config['General Settings']['OUTPUT_FILE_DIRECTORY'], sections)
 
-        kw = kb.KeybertWrapper(rep_docs)
-        keywords = kw.find_keywords()
+        # A crawl stopped by a signal reports "shutdown", closespider limits still count as finished
+        return ["crawl:" + section for section, domain_stats in stats.items()
+                if domain_stats.get("finish_reason") not in (None, "shutdown")]
 
-        kw.write_keywords_to_disk(keywords, output_file_directory)
+    def __run_training_stages(self, stages):
+        """
+        Batch runner of the train:<domain> stages: trains every pending domain with the TrainingScheduler.
+        ----------------------------------------------------------------
+        Returns:
+            list: keys of the stages whose domain was trained
+        """
+        sections = [stage.key.split(":", 1)[1] for stage in stages]
+        trained = self.__bert_training_loop(self.config['General Settings']['OUTPUT_FILE_DIRECTORY'], sections)
+        return ["train:" + section for section in trained]
 
-    def __config_scrape_loop(self, output_file_directory):
+    def __get_crawl_config(self, section):
+        """
+        Settings a domain's scraped data depends on: its own section and the general scrapy options
+        """
+        import scrapy_wrapper.main as spider
+
+        general_keys = list(spider.SECTION_SETTINGS) + ["DISK_FRONTIER", "BLOOM_DUPEFILTER", "MAX_CONCURRENT_REQUESTS"]
+        general = {key: self.config['General Settings'][key] for key in general_keys if key in self.config['General Settings']}
+        return {"section": dict(self.config[section]), "general": general}
+
+    def __config_scrape_loop(self, output_file_directory, sections=None):
         """
         This function scrapes every domain listed in a .ini file, 
-        with the configuration provided.
+        with the configuration provided. All domains are crawled concurrently
+        inside a single scrapy process.
         -----------------------------------------------------------------
         Args: 
             output_file_directory: the root directory that the data will be written to.
+            sections: the domains to scrape (every domain in the config file by default)
 
-        Raises: 
-            placeHolder
+        Returns:
+            dict: domain -> scrapy stats for that domain's crawl
         """
-        sections = self.config.sections()
+        import scrapy_wrapper.main as spider
+
+        if sections is None:
+            sections = self.config.sections()
+        output_paths = {}
 
-        # For each domain, run the run.sh file in order to scrape.
         for section in sections:
             if section != "General Settings":
                 print(str(section))
@@ -184,33 +461,102 @@ class EntryPoint:
                 # Create domain name folder and scraped data sub-folder for specified domain
                 self.__create_folder_for_domain(output_file_directory, section_folder_name)
 
-                self.__run_scrape_shell_command(section_file_name, str(section), self.config[section]["CSS_SELECTORS"], self.config[section]["DEPTH_LIMIT"], self.config[section]["CLOSESPIDER_PAGECOUNT"])
-                
-                # Get absolute path to created scrape data file and path to output_directory
-                data_file_abs_path = os.path.abspath("recursive_spider/" + section_file_name)
+                # The spider writes its items straight into the domain folder
+                output_paths[str(section)] = os.path.abspath(scraped_data_folder_path)
+
+        # Run one spider per domain inside a single reactor
+        with self.report.stage("crawl") as stage:
+            stats = spider.MultiDomainCrawler(self.config).crawl(output_paths)
+            stage.items = sum(domain_stats.get("item_scraped_count", 0) for domain_stats in stats.values())
+            stage.details = stats
 
-                # Move scraped data to scraped_data in output directory
-                self.__move_file_to_folder(data_file_abs_path, scraped_data_folder_path)
-                # os.replace("./recursive_spider/recursive_spider/" + section_file_name, section_folder_path)
+        return stats
 
-    def __bert_training_loop(self, output_file_directory):
+    def __bert_training_loop(self, output_file_directory, sections=None):
         """
         This function runs a bertopic instance from a .ini (must be formatted correctly),
-        and then returns bertopic topic data.
+        and then returns bertopic topic data. Domains are trained in TRAINING_WORKERS processes
+        at the same time, each using at most THREADS_PER_WORKER threads.
         -----------------------------------------------------------------
         Args:
             output_file_directory: The root directory that the data will be written to.
+            sections: the domains to train (every domain in the config file by default)
+
+        Returns:
+            dict: domain -> (representative docs, representative doc embeddings) of the domains that trained
         """
 
+        import bertopic_wrapper.scheduler as scheduler
+
         # Pull data from config file
         search_term_from_config = self.config['General Settings']['BERT_SEARCH_TERM']
-        sections = self.config.sections()
+        tasks = []
 
-        # For each domain, run the run.sh file in order to scrape.
-        for section in sections:
+        for section, (in_file_path, out_directory_path) in self.__get_domain_paths(output_file_directory).items():
+            if sections is not None and section not in sections:
+                continue
+
+            self.out_file_name = "individual_domain"
+            self.out_directory_path = out_directory_path
+
+            tasks.append(scheduler.TrainingTask(section, in_file_path, self.out_directory_path, self.out_file_name, search_term_from_config))
+
+        training_scheduler = scheduler.TrainingScheduler(self.__get_embedding_cache(output_file_directory),
+                                                         self.__get_training_settings(),
+                                                         self.config['General Settings'].getint('TRAINING_WORKERS', fallback=1),
+                                                         self.config['General Settings'].getint('THREADS_PER_WORKER', fallback=0))
+        with self.report.stage("bertopic") as stage:
+            trained = training_scheduler.run(tasks)
+            stage.items = sum(metrics["items"] or 0 for metrics in training_scheduler.metrics.values())
+            stage.details = dict(training_scheduler.metrics)
+            if training_scheduler.failed:
+                stage.details["failed"] = sorted(training_scheduler.failed)
+                print("[ERROR]: Could not train " + ", ".join(sorted(training_scheduler.failed)) + " (tracebacks above)")
+
+        self.training_results.update(trained)
+        return trained
+
+    def __shared_bert_training(self, output_file_directory):
+        """
+        Fits one BERTopic model over every domain (written to <output>/shared_model) and derives the
+        per-domain outputs from it, instead of fitting one model per domain.
+        -----------------------------------------------------------------
+        Args:
+            output_file_directory: The root directory that the data will be written to.
+        """
+        from bertopic_wrapper.shared import SharedBertopicTraining
+
+        domain_paths = self.__get_domain_paths(output_file_directory)
+        shared_directory = self.__create_folder_for_domain(output_file_directory + "/", "shared_model")
+        self.__create_ml_data_folder(shared_directory)
+
+        with self.report.stage("bertopic") as stage:
+            bt = SharedBertopicTraining({section: paths[0] for section, paths in domain_paths.items()},
+                                        shared_directory, "shared_domains",
+                                        self.config['General Settings']['BERT_SEARCH_TERM'],
+                                        self.__get_embedding_cache(output_file_directory))
+            bt.train(**self.__get_training_settings())
+            self.training_results = bt.write_domain_outputs({section: paths[1] for section, paths in domain_paths.items()})
+            stage.items = bt.timings.get("documents")
+            stage.details = bt.timings
+
+    def __uses_shared_topic_model(self):
+        return self.config['General Settings'].get('TOPIC_MODEL_SCOPE', 'per_domain') == "shared"
+
+    def __get_domain_paths(self, output_file_directory):
+        """
+        Creates the ml_data and visualization folders of every domain in the config file.
+        ----------------------------------------------------------------
+        Returns:
+            dict: domain -> (path of its scraped .jl file, its output folder)
+        """
+        domain_paths = {}
+
+        for section in self.config.sections():
             if section != "General Settings":
-                # Create ml_data and visualization folder
+                # Create the domain folder (it does not exist before the first crawl), then its ml_data and visualization folders
                 formatted_folder_name = self.__create_domain_folder_name(section)
+                os.makedirs(output_file_directory + "/" + formatted_folder_name, exist_ok=True)
                 self.__create_visualization_folder(output_file_directory + "/" + formatted_folder_name) # Create visualization folder
                 self.__create_ml_data_folder(output_file_directory + "/" + formatted_folder_name) # Create ML data folder
 
@@ -218,30 +564,62 @@ class EntryPoint:
                 in_file_name = self.__create_scrapy_content_file_name(section)
                 in_file_path = output_file_directory + "/" + formatted_folder_name + "/" + in_file_name
 
-                self.out_file_name = "individual_domain"
-                self.out_directory_path = output_file_directory + "/" + formatted_folder_name
+                domain_paths[section] = (in_file_path, output_file_directory + "/" + formatted_folder_name)
 
-                self.bt = bert.BertopicTraining(in_file_path, self.out_directory_path, self.out_file_name, search_term_from_config)
-                self.bt.trainModel()
+        return domain_paths
 
-    def __run_scrape_shell_command(self, output_file_name, domain, css_selector, depth_limit, close_spider_page_count):
+    def __get_training_settings(self):
         """
-        This is a function that runs a shell file with the provided parameters as CLI args.
+        Reads how topic models are trained from the config file
+        ('batch' fits the whole corpus at once, 'online' fits it in chunks of ONLINE_CHUNK_SIZE documents).
         ----------------------------------------------------------------
-        Args: 
-            output_file_name: the output file name without an extension
-            domain: the base domain (without the https://) to scrape from
-            css_selector: the css selector used to pull content from
-            depth_limit: the depth limit, or the number of subdomains in the url to scrape before blocking past that point
-            close_spider_page_count: the total amount of pages scraped before closing the spider
-        
-        Raises:
-            placeHolder
+        Returns:
+            dict: keyword arguments for BertopicTraining.train
+        """
+        if self.config is None:
+            return {"mode": "batch"}
+
+        settings = self.config['General Settings']
+        return {
+            "mode": settings.get('TRAINING_MODE', 'batch'),
+            "chunk_size": settings.getint('ONLINE_CHUNK_SIZE', fallback=1000),
+            "n_clusters": settings.getint('ONLINE_N_CLUSTERS', fallback=50),
+            "resume": settings.getboolean('ONLINE_RESUME', fallback=False),
+            "ngram_range": settings.get('TOPIC_NGRAM_RANGE', '1,5'),
+            "min_df": settings.getint('TOPIC_MIN_DF', fallback=2),
+            "max_features": settings.getint('TOPIC_MAX_FEATURES', fallback=100000),
+            "render_visualizations": settings.getboolean('RENDER_VISUALIZATIONS', fallback=False),
+            "engine": settings.get('TOPIC_ENGINE', 'default'),
+            "fast_reduction": settings.get('FAST_REDUCTION', 'pca'),
+            "fast_clustering": settings.get('FAST_CLUSTERING', 'kmeans'),
+            "fast_n_clusters": settings.getint('FAST_N_CLUSTERS', fallback=50),
+            "fast_sample_size": settings.getint('FAST_HDBSCAN_SAMPLE_SIZE', fallback=20000),
+        }
+
+    def __get_embedding_cache(self, output_directory):
         """
-        shell_command = "sh ../shell/run_spider.sh " + "-o " + output_file_name + " " + "-d " + domain + " " + "-c " +  css_selector + " " + "-l " +  depth_limit + " " + "-p " + close_spider_page_count
-        os.system(shell_command)
+        Returns the embedding cache shared by every BERTopic and KeyBERT run of this EntryPoint,
+        creating it on first use.
+        ----------------------------------------------------------------
+        Args:
+            output_directory: directory the cache is created in when the config does not set EMBEDDING_CACHE_DIRECTORY
 
-        return shell_command
+        Returns:
+            EmbeddingCache: the shared embedding cache
+        """
+        import embedding_cache.main as ec
+
+        if self.embedding_cache is None:
+            cache_directory = os.path.join(output_directory, "embedding_cache")
+            model_name = ec.DEFAULT_EMBEDDING_MODEL
+
+            if self.config is not None and self.config.has_section("General Settings"):
+                cache_directory = self.config['General Settings'].get('EMBEDDING_CACHE_DIRECTORY', cache_directory)
+                model_name = self.config['General Settings'].get('EMBEDDING_MODEL', model_name)
+
+            self.embedding_cache = ec.EmbeddingCache(cache_directory, model_name)
+
+        return self.embedding_cache
 
     def __check_if_file_exists(self, path):
         if os.path.isfile(path):
@@ -257,7 +635,7 @@ class EntryPoint:
 
     def __get_all_jl_files_in_directory(self, directory):
         """
-        This is a function that returns a list of all .jl files in the given directory
+        This is a function that returns a list of all .jl files (compressed or not) in the given directory
         ----------------------------------------------------------------
         Args: 
             directory: Full path to folder that contains the .jl files
@@ -266,8 +644,11 @@ class EntryPoint:
             ValueError: Could not find given directory
         """
         if os.path.isdir(directory):
-            target_pattern = directory + "/" + "*.jl"
-            return glob.glob(target_pattern)
+            jl_files = []
+            for extension in ["*.jl", "*.jl.gz", "*.jl.zst"]:
+                jl_files += glob.glob(os.path.join(directory, extension))
+            # The changed pages of an incremental crawl are already part of the domain's own .jl
+            return sorted(jl_file for jl_file in jl_files if not jl_file.endswith("_changes.jl"))
         else:
             raise ValueError("Could not find given directory")
 
@@ -362,53 +743,190 @@ class EntryPoint:
         folder_name = domain.replace('.', '_').replace('/', '_')
         return str(folder_name)
 
-    def __move_file_to_folder(self, in_file_path, out_file_path):
-        """
-        Moves one file to a specified folder.
-        ----------------------------------------------------------------
-        Args: 
-            in_file_path: Path to target file
-            dest_folder_path: Path to desired destination folder.
-        
-        Raise:
 
-        """
-        try:
-            shutil.move(in_file_path, out_file_path)
-        except ValueError as e:
-            print("[ERROR]: " + str(e))
+PROFILED_STAGES = ["crawl", "bertopic", "keybert", "assign-topics", "visualize", "re-extract"]
+
+
+def build_parser():
+    """
+    Builds the command line interface, one sub-command per type of scrape-n-bert run
+    """
+    parser = argparse.ArgumentParser(prog="entry.py", description="Scrape domains with scrapy and model their content with BERTopic and KeyBERT")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    # Options of every command that runs stages
+    metrics = argparse.ArgumentParser(add_help=False)
+    metrics.add_argument("--report", default="", help="where to write the JSON run report (default: reports/ in the output folder)")
+    metrics.add_argument("--profile-stage", choices=PROFILED_STAGES, help="run this stage under cProfile and write its .prof stats next to the report (profile bertopic with TRAINING_WORKERS=1)")
+
+    individual_snb = subparsers.add_parser("individual-snb", help="Scrape every domain in the config file, then run BERTopic and KeyBERT on each", parents=[metrics])
+    individual_snb.add_argument("-c", "--config", required=True, help="full path to the .ini config file")
+    individual_snb.add_argument("--force", default="", help="comma separated stages (crawl, train, keybert) or stage keys (train:learn.g2.com) to re-run even if up to date")
+
+    only_scrape = subparsers.add_parser("only-scrape", help="Scrape every domain in the config file", parents=[metrics])
+    only_scrape.add_argument("-c", "--config", required=True, help="full path to the .ini config file")
+
+    re_extract = subparsers.add_parser("re-extract", help="Apply css selectors to archived pages (ARCHIVE_RESPONSES=True) without recrawling", parents=[metrics])
+    re_extract.add_argument("-c", "--config", default="", help="re-extract every domain of this config file with its CSS_SELECTORS")
+    re_extract.add_argument("-a", "--archive", help="response archive folder, to re-extract a single archive")
+    re_extract.add_argument("-s", "--css-selector", help="css selector to apply to the single archive")
+    re_extract.add_argument("-o", "--output", help=".jl file the single archive's items are written to")
+    re_extract.add_argument("-w", "--workers", type=int, help="worker processes (default: every core)")
+
+    shared_bert = subparsers.add_parser("shared-bert", help="Fit one BERTopic model over every scraped domain in the config file, with per-domain outputs", parents=[metrics])
+    shared_bert.add_argument("-c", "--config", required=True, help="full path to the .ini config file")
+
+    only_bert = subparsers.add_parser("only-bert", help="Run BERTopic on one scraped .jl file", parents=[metrics])
+    only_bert.add_argument("-i", "--input", required=True, help=".jl file full path")
+    only_bert.add_argument("-o", "--output", required=True, help="output folder full path")
+    only_bert.add_argument("-s", "--search-term", default="", help="search terms to find related topics for, separated by commas")
+    only_bert.add_argument("-c", "--config", default="", help="optional config file for embedding and training settings")
+
+    combined_bert = subparsers.add_parser("combined-bert", help="Run BERTopic on every .jl file of a folder combined", parents=[metrics])
+    combined_bert.add_argument("-i", "--input", required=True, help="folder with the .jl files to combine")
+    combined_bert.add_argument("-o", "--output", required=True, help="output folder full path")
+    combined_bert.add_argument("-n", "--name", default="test", help="name of the combined data set")
+    combined_bert.add_argument("-c", "--config", default="", help="optional config file for embedding and training settings")
+
+    only_keybert = subparsers.add_parser("only-keybert", help="Run KeyBERT on any content without scraping or BERTopic", parents=[metrics])
+    only_keybert.add_argument("-i", "--input", required=True, help="full file path for keyword extraction")
+    only_keybert.add_argument("-o", "--output", required=True, help="folder the extracted keywords are saved to")
+    only_keybert.add_argument("-n", "--name", required=True, help="name of the keywords file")
+    only_keybert.add_argument("-c", "--config", default="", help="optional config file for embedding settings")
+
+    assign_topics = subparsers.add_parser("assign-topics", help="Assign the topics of a saved model to new .jl files without retraining", parents=[metrics])
+    assign_topics.add_argument("-m", "--model", required=True, help="_TOPIC_MODEL.bin full path")
+    assign_topics.add_argument("-i", "--input", required=True, help=".jl file or folder of .jl files")
+    assign_topics.add_argument("-o", "--output", required=True, help="folder the assignments are written to")
+    assign_topics.add_argument("-n", "--name", default="assigned", help="name of the assignments file")
+    assign_topics.add_argument("-b", "--batch-size", type=int, default=10000, help="documents embedded and assigned at once")
+    assign_topics.add_argument("-c", "--config", default="", help="optional config file for embedding settings")
+    assign_topics.add_argument("--cache-embeddings", action="store_true", help="keep the embeddings of new documents in the embedding cache")
+
+    visualize = subparsers.add_parser("visualize", help="Render the HTML visualizations of a saved topic model", parents=[metrics])
+    visualize.add_argument("-m", "--model", required=True, help="_TOPIC_MODEL.bin full path")
+    visualize.add_argument("-o", "--output", required=True, help="folder the HTML files are written to")
+    visualize.add_argument("-f", "--figures", default="topics,hierarchy,barchart,heatmap", help="comma separated figures to render")
+    visualize.add_argument("-w", "--workers", type=int, default=4, help="figures rendered at the same time")
+
+    serve = subparsers.add_parser("serve", help="Run a warm worker that keeps the models loaded and accepts jobs over HTTP")
+    serve.add_argument("--host", default="127.0.0.1", help="interface to listen on")
+    serve.add_argument("--port", type=int, default=8765, help="port to listen on")
+    serve.add_argument("-o", "--output", default=".", help="folder for the embedding cache if the config does not set one")
+    serve.add_argument("-c", "--config", default="", help="optional config file for embedding settings")
+
+    submit = subparsers.add_parser("submit", help="Send a job to a running worker and print its events")
+    submit.add_argument("type", choices=["keybert_only", "bertopic_only", "transform"], help="type of job")
+    submit.add_argument("params", help="job arguments as JSON, or @file.json")
+    submit.add_argument("--host", default="127.0.0.1", help="host of the worker")
+    submit.add_argument("--port", type=int, default=8765, help="port of the worker")
+
+    return parser
+
+
+def submit_to_worker(args):
+    import worker_daemon.main as daemon
+
+    if args.params.startswith("@"):
+        with open(args.params[1:], encoding="utf-8") as f:
+            job = json.load(f)
+    else:
+        job = json.loads(args.params)
+    job["type"] = args.type
+
+    failed = False
+    try:
+        for event in daemon.submit_job(job, args.host, args.port):
+            print(json.dumps(event))
+            failed = failed or "error" in event
+    except ConnectionRefusedError:
+        print("[ERROR]: No worker running on " + args.host + ":" + str(args.port) + " (start one with: entry.py serve)")
+        return 1
+
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if args.command == "re-extract" and not args.config and not (args.archive and args.css_selector and args.output):
+        parser.error("re-extract needs either -c/--config, or -a/--archive with -s/--css-selector and -o/--output")
+
+    if args.command == "submit":
+        return submit_to_worker(args)
+
+    # visualize works from a saved model only and takes no config file
+    config_path = getattr(args, "config", "")
+    if config_path and not os.path.isfile(config_path):
+        print("[ERROR]: Could not find given file -> " + config_path)
+        return 1
+
+    if args.command == "serve":
+        EntryPoint(config_path).run_worker_daemon(args.host, args.port, args.output)
+        return 0
+
+    report_path = args.report or default_report_path(args)
+    report = RunReport(args.command, args.profile_stage, os.path.dirname(os.path.abspath(report_path)))
+    entry_point = EntryPoint(config_path, report)
+
+    try:
+        run_command(entry_point, args)
+    finally:
+        report.write(report_path)
+
+    return 0
+
+
+def default_report_path(args):
+    """
+    reports/<command>_<time>.json in the output folder of the command, or of the config file
+    """
+    output_directory = getattr(args, "output", None)
+
+    config_path = getattr(args, "config", "")
+    if not output_directory and config_path:
+        config = configparser.ConfigParser()
+        config.read(config_path)
+        output_directory = config.get('General Settings', 'OUTPUT_FILE_DIRECTORY', fallback=None)
+
+    return os.path.join(output_directory or ".", "reports", args.command + "_" + time.strftime("%Y%m%d_%H%M%S") + ".json")
+
+
+def run_command(entry_point, args):
+    if args.command == "individual-snb":
+        force = [stage.strip() for stage in args.force.split(",") if stage.strip()]
+        entry_point.scrape_and_run_bertopic_per_domain(force)
+
+    elif args.command == "only-scrape":
+        entry_point.scrape_only()
+
+    elif args.command == "re-extract":
+        if args.archive:
+            entry_point.reextract_from_archive(args.archive, args.css_selector, args.output, args.workers)
+        else:
+            entry_point.reextract_config_domains(args.workers)
+
+    elif args.command == "shared-bert":
+        entry_point.shared_bertopic_only()
+
+    elif args.command == "only-bert":
+        entry_point.bertopic_only(args.input, args.output, args.search_term)
+
+    elif args.command == "combined-bert":
+        entry_point.compile_scrape_data_and_run_bertopic(args.input, args.output, args.name)
+
+    elif args.command == "only-keybert":
+        entry_point.keybert_only(args.input, args.output, args.name)
+
+    elif args.command == "assign-topics":
+        entry_point.assign_topics(args.model, args.input, args.output, args.name, args.batch_size, args.cache_embeddings)
+
+    elif args.command == "visualize":
+        figures = [figure.strip() for figure in args.figures.split(",") if figure.strip()]
+        entry_point.visualize(args.model, args.output, figures, args.workers)
+
 
 # Detect the arg passed from the main shell script, and run related EntryPoint function
 if __name__ == "__main__":
-    cli_arg = sys.argv[1]
-
-    
-    if cli_arg == "individual-snb":
-        config_path = input("Full path to config: ")
-        EntryPoint = EntryPoint(config_path)
-        EntryPoint.scrape_and_run_bertopic_per_domain()
-    
-    elif cli_arg == "only-scrape":
-        config_path = input("Full path to config: ")
-        EntryPoint = EntryPoint(config_path)
-        EntryPoint.scrape_only()
-    
-    elif cli_arg == "only-bert":
-        EntryPoint = EntryPoint()
-        scraped_data_path = input(".jl file full path: ")
-        output_file_directory = input("Output folder full path: ")
-        search_term = input("Specify search term: ")
-        EntryPoint.bertopic_only(scraped_data_path, output_file_directory, search_term)
-    
-    elif cli_arg == "combined-bert":
-        EntryPoint = EntryPoint()
-        combined_folder_path = input("Combined folder full path: ")
-        output_file_directory = input("Output folder full path: ")
-        EntryPoint.compile_scrape_data_and_run_bertopic(combined_folder_path, output_file_directory, "test")
-
-    elif cli_arg == "only-keybert":
-        EntryPoint = EntryPoint()
-        input_file_path = input("Enter full file path for keyword extraction: ")
-        output_directory = input("Enter full file path where you would like the extracted keywords to be saved: ")
-        name_of_file = input("Enter what you'd like to name your file: ")
-        EntryPoint.keybert_only(input_file_path, output_directory, name_of_file)
+    sys.exit(main())
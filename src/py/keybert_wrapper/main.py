@@ -1,25 +1,84 @@
 from keybert import KeyBERT
-import ast
+import os
+import numpy as np
+import bertopic_wrapper.results as results
 
 class KeybertWrapper:
-    def __init__(self, docs):
+    def __init__(self, docs, embedding_cache=None):
         self.docs = docs
-        self.kw_model = KeyBERT()
+        self.embedding_cache = embedding_cache
+
+        if self.embedding_cache is not None:
+            self.kw_model = KeyBERT(model=self.embedding_cache.embedding_model)
+        else:
+            self.kw_model = KeyBERT()
 
     def find_keywords(self):
         keywords = []
-        content_dict = ast.literal_eval(str(self.docs))
 
-        for key, value in content_dict.items():
+        for key, value in self.docs.items():
             keywords.append(str(key) + ": " + str(self.run_keybert(value)))
 
         return keywords
 
+    def find_keywords_batched(self, doc_embeddings=None, top_n=10):
+        """
+        Extracts keywords for every topic in one KeyBERT call, so the candidate vectorizer is fit once
+        and all documents and candidate phrases are embedded in large batches.
+        -----------------------------------------------------------------
+        Args:
+            doc_embeddings: optional {topic_id: (n_docs, dim) array} of already computed embeddings
+                            for each topic's documents (see BertopicTraining.get_rep_doc_embeddings)
+            top_n: number of keywords kept per topic
+
+        Returns:
+            dict: {topic_id: [(phrase, score), ...]} sorted by score, highest first
+        """
+        topic_ids = []
+        docs = []
+        for topic_id, topic_docs in self.docs.items():
+            if isinstance(topic_docs, str):
+                topic_docs = [topic_docs]
+            for doc in topic_docs:
+                topic_ids.append(topic_id)
+                docs.append(doc)
+
+        if not docs:
+            return {}
+
+        if doc_embeddings is not None:
+            doc_embeddings = np.vstack([doc_embeddings[topic_id] for topic_id in self.docs.keys()])
+        elif self.embedding_cache is not None:
+            doc_embeddings = self.embedding_cache.embed(docs)
+
+        keywords_per_doc = self.kw_model.extract_keywords(docs, keyphrase_ngram_range = (1,5), top_n=top_n, stop_words='english', doc_embeddings=doc_embeddings)
+
+        # KeyBERT returns a flat list of keywords when it is only given one document
+        if len(docs) == 1:
+            keywords_per_doc = [keywords_per_doc]
+
+        # Merge the keywords of a topic's documents, keeping the best score of every phrase
+        best_scores = {topic_id: {} for topic_id in self.docs.keys()}
+        for topic_id, doc_keywords in zip(topic_ids, keywords_per_doc):
+            scores = best_scores[topic_id]
+            for phrase, score in doc_keywords:
+                if score > scores.get(phrase, float("-inf")):
+                    scores[phrase] = score
+
+        return {topic_id: sorted(scores.items(), key=lambda keyword: keyword[1], reverse=True)[:top_n]
+                for topic_id, scores in best_scores.items()}
+
     def run_keybert(self, content):
-        keywords = self.kw_model.extract_keywords(content, keyphrase_ngram_range = (1,5), top_n=10, stop_words='english')
+        doc_embeddings = None
+        if self.embedding_cache is not None:
+            # Representative docs were already embedded while training BERTopic, so these are cache hits
+            doc_embeddings = self.embedding_cache.embed([content] if isinstance(content, str) else list(content))
+
+        keywords = self.kw_model.extract_keywords(content, keyphrase_ngram_range = (1,5), top_n=10, stop_words='english', doc_embeddings=doc_embeddings)
         return keywords
 
-    def write_keywords_to_disk(self, keywords, output_file_directory):
-        output = open(output_file_directory + "keybert_keywords_results" + ".txt", "a+")
-        output.write(str(keywords))
-        output.close()
\ No newline at end of file
+    def write_keywords_to_disk(self, keywords, output_file_directory, name="keybert_keywords_results"):
+        """
+        Writes {topic_id: [(phrase, score), ...]} as JSON lines, see bertopic_wrapper.results.read_keywords
+        """
+        results.write_keywords(keywords, os.path.join(output_file_directory, name + ".jsonl"))
\ No newline at end of file
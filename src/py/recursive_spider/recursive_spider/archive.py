@@ -0,0 +1,138 @@
+import gzip
+import json
+import os
+import sqlite3
+import time
+from recursive_spider.page_state import hash_bytes
+
+COMMIT_EVERY = 100
+
+# A new segment file is started once the current one is larger than this
+SEGMENT_SIZE = 1024 * 1024 * 1024
+
+
+class ResponseArchive:
+    """
+    Local archive of raw HTML responses, so pages can be re-extracted with another css selector
+    without crawling them again.
+
+    Bodies are content-addressed by their sha1: identical pages are stored once. Each body is written
+    as its own gzip member appended to a segment file (segment-00000.gz, ... readable with zcat), and
+    an SQLite index maps every url to its body hash and every hash to its segment, offset and length.
+    """
+    def __init__(self, directory, readonly=False):
+        self.directory = directory
+        self.readonly = readonly
+        self.pending_writes = 0
+        self.segment = None
+
+        if not readonly:
+            os.makedirs(directory, exist_ok=True)
+        elif not os.path.isfile(os.path.join(directory, "index.sqlite")):
+            raise ValueError("[ERROR]: No response archive found in " + directory)
+
+        # A read-only archive may be iterated from another thread (Pool.imap pulls its batches on a thread of its own)
+        self.connection = sqlite3.connect(os.path.join(directory, "index.sqlite"), check_same_thread=not readonly)
+        if not readonly:
+            self.connection.executescript("""
+                CREATE TABLE IF NOT EXISTS bodies (
+                    body_hash TEXT PRIMARY KEY,
+                    segment INTEGER,
+                    offset INTEGER,
+                    length INTEGER
+                );
+                CREATE TABLE IF NOT EXISTS urls (
+                    url TEXT PRIMARY KEY,
+                    body_hash TEXT,
+                    status INTEGER,
+                    headers TEXT,
+                    fetched_at REAL
+                );
+            """)
+            self.connection.commit()
+
+    def __segment_path(self, segment):
+        return os.path.join(self.directory, "segment-" + format(segment, "05d") + ".gz")
+
+    def __open_segment(self):
+        if self.segment is None:
+            last = self.connection.execute("SELECT MAX(segment) FROM bodies").fetchone()[0]
+            self.segment = last or 0
+
+        if os.path.exists(self.__segment_path(self.segment)) and os.path.getsize(self.__segment_path(self.segment)) >= SEGMENT_SIZE:
+            self.segment += 1
+
+        return open(self.__segment_path(self.segment), "ab")
+
+    def put(self, url, status, headers, body):
+        """
+        Archives one response, writing its body only if the same body was not stored before.
+        -----------------------------------------------------------------
+        Args:
+            url: url of the response
+            status: http status
+            headers: {name: value} of the response headers worth keeping (Content-Type...)
+            body: raw response body (bytes)
+
+        Returns:
+            bool: True if the body was new to the archive
+        """
+        body_hash = hash_bytes(body)
+        is_new = self.connection.execute("SELECT 1 FROM bodies WHERE body_hash = ?", (body_hash,)).fetchone() is None
+
+        if is_new:
+            member = gzip.compress(body)
+            with self.__open_segment() as f:
+                offset = f.tell()
+                f.write(member)
+            self.connection.execute("INSERT INTO bodies VALUES (?, ?, ?, ?)", (body_hash, self.segment, offset, len(member)))
+
+        self.connection.execute(
+            "INSERT OR REPLACE INTO urls VALUES (?, ?, ?, ?, ?)",
+            (url, body_hash, status, json.dumps(headers), time.time())
+        )
+
+        self.pending_writes += 1
+        if self.pending_writes >= COMMIT_EVERY:
+            self.connection.commit()
+            self.pending_writes = 0
+
+        return is_new
+
+    def get_body(self, body_hash):
+        row = self.connection.execute("SELECT segment, offset, length FROM bodies WHERE body_hash = ?", (body_hash,)).fetchone()
+        if row is None:
+            return None
+
+        with open(self.__segment_path(row[0]), "rb") as f:
+            f.seek(row[1])
+            return gzip.decompress(f.read(row[2]))
+
+    def get(self, url):
+        """
+        Returns (body, headers) of the last archived response of url, or None
+        """
+        row = self.connection.execute("SELECT body_hash, headers FROM urls WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        return self.get_body(row[0]), json.loads(row[1])
+
+    def entries(self):
+        """
+        Yields (url, body_hash, headers) of every archived url, sorted by body location so bodies are read sequentially
+        """
+        cursor = self.connection.execute("""
+            SELECT urls.url, urls.body_hash, urls.headers FROM urls
+            JOIN bodies ON bodies.body_hash = urls.body_hash
+            ORDER BY bodies.segment, bodies.offset
+        """)
+        for url, body_hash, headers in cursor:
+            yield url, body_hash, json.loads(headers)
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM urls").fetchone()[0]
+
+    def close(self):
+        if not self.readonly:
+            self.connection.commit()
+        self.connection.close()
@@ -0,0 +1,98 @@
+import os
+import re
+from urllib.parse import urlparse
+
+# Extensions of files that never hold page text (the same kind of list LinkExtractor denies)
+DEFAULT_EXCLUDED_EXTENSIONS = [
+    # documents and archives
+    "pdf", "doc", "docx", "xls", "xlsx", "ppt", "pptx", "odt", "ods", "odp", "rtf", "epub",
+    "zip", "rar", "gz", "tgz", "tar", "7z", "bz2", "dmg", "exe", "msi", "apk", "iso", "bin",
+    # images
+    "jpg", "jpeg", "png", "gif", "bmp", "tif", "tiff", "svg", "webp", "ico", "psd", "eps", "ai", "heic",
+    # audio and video
+    "mp3", "wav", "ogg", "m4a", "flac", "aac", "mp4", "m4v", "mov", "avi", "wmv", "webm", "mkv", "flv",
+    # assets
+    "css", "js", "json", "xml", "rss", "woff", "woff2", "ttf", "otf", "eot",
+]
+
+DEFAULT_CONTENT_TYPES = ["text/html", "application/xhtml+xml"]
+
+
+def compile_patterns(patterns):
+    """
+    Compiles space separated regular expressions into one regex matching any of them (None if there are none)
+    """
+    if isinstance(patterns, str):
+        patterns = patterns.split()
+    patterns = [pattern for pattern in patterns or [] if pattern]
+    if not patterns:
+        return None
+    return re.compile("|".join("(?:" + pattern + ")" for pattern in patterns))
+
+
+class DownloadFilter:
+    """
+    Decides which downloads are worth their bandwidth: built once per crawl from the DOWNLOAD_FILTER_*
+    settings, so url patterns are compiled a single time.
+    -----------------------------------------------------------------
+    Args:
+        excluded_extensions: url path extensions that are never requested
+        include_patterns: space separated regexes, when set only matching urls are requested
+        exclude_patterns: space separated regexes of urls that are never requested
+        content_types: Content-Types whose bodies are downloaded, every other body is aborted
+        max_size: bodies larger than this many bytes are aborted (0 for no limit)
+    """
+    def __init__(self, excluded_extensions=None, include_patterns=None, exclude_patterns=None,
+                 content_types=None, max_size=0):
+        if excluded_extensions is None:
+            excluded_extensions = DEFAULT_EXCLUDED_EXTENSIONS
+        if content_types is None:
+            content_types = DEFAULT_CONTENT_TYPES
+
+        self.excluded_extensions = {"." + extension.lower().lstrip(".") for extension in excluded_extensions}
+        self.include_pattern = compile_patterns(include_patterns)
+        self.exclude_pattern = compile_patterns(exclude_patterns)
+        self.content_types = tuple(content_type.lower() for content_type in content_types)
+        self.max_size = max_size
+
+    @classmethod
+    def from_settings(cls, settings):
+        # Unset (or empty) extension and Content-Type lists fall back to the defaults above
+        return cls(
+            excluded_extensions=settings.getlist("DOWNLOAD_FILTER_EXCLUDED_EXTENSIONS") or None,
+            include_patterns=settings.get("DOWNLOAD_FILTER_INCLUDE_PATTERNS"),
+            exclude_patterns=settings.get("DOWNLOAD_FILTER_EXCLUDE_PATTERNS"),
+            content_types=settings.getlist("DOWNLOAD_FILTER_CONTENT_TYPES") or None,
+            max_size=settings.getint("DOWNLOAD_FILTER_MAX_SIZE"),
+        )
+
+    def url_rejection(self, url):
+        """
+        Returns why url should not be requested ("extension" or "pattern"), or None to request it
+        """
+        if os.path.splitext(urlparse(url).path)[1].lower() in self.excluded_extensions:
+            return "extension"
+        if self.exclude_pattern is not None and self.exclude_pattern.search(url):
+            return "pattern"
+        if self.include_pattern is not None and not self.include_pattern.search(url):
+            return "pattern"
+        return None
+
+    def headers_rejection(self, content_type, content_length):
+        """
+        Returns why a response should be aborted once its headers are in ("content_type" or "size"), or None
+        -----------------------------------------------------------------
+        Args:
+            content_type: Content-Type header (str or None, responses without one are kept)
+            content_length: announced body size in bytes, None when unknown
+        """
+        if content_type and self.content_types:
+            media_type = content_type.split(";")[0].strip().lower()
+            if media_type not in self.content_types:
+                return "content_type"
+        if self.max_size and content_length is not None and content_length > self.max_size:
+            return "size"
+        return None
+
+    def is_too_large(self, received):
+        return bool(self.max_size) and received > self.max_size
@@ -0,0 +1,157 @@
+import hashlib
+import logging
+import math
+import os
+import pickle
+
+from scrapy.dupefilters import BaseDupeFilter
+from scrapy.utils.job import job_dir
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """
+    Fixed size Bloom filter sized for capacity keys at the given false positive rate.
+    The k bit positions come from two 64 bit halves of one blake2b digest (h1 + i * h2).
+    """
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def __positions(self, key):
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:], "big") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.__positions(key))
+
+    def add(self, key):
+        """
+        Adds key and returns True if it was not in the filter yet
+        """
+        added = False
+        for position in self.__positions(key):
+            mask = 1 << (position & 7)
+            if not self.bits[position >> 3] & mask:
+                self.bits[position >> 3] |= mask
+                added = True
+
+        if added:
+            self.count += 1
+        return added
+
+
+class ScalableBloomFilter:
+    """
+    Chain of Bloom filters that grows as keys are added. Every new filter holds growth times more keys
+    at a tighter error rate, so the overall false positive rate stays below error_rate however many
+    keys are added, while memory grows with the number of keys instead of being reserved up front.
+    """
+    def __init__(self, initial_capacity=100000, error_rate=0.001, growth=2, tightening=0.5):
+        self.initial_capacity = initial_capacity
+        self.error_rate = error_rate
+        self.growth = growth
+        self.tightening = tightening
+        self.filters = []
+        self.__add_filter()
+
+    def __add_filter(self):
+        capacity = self.initial_capacity * self.growth ** len(self.filters)
+        error_rate = self.error_rate * (1 - self.tightening) * self.tightening ** len(self.filters)
+        self.filters.append(BloomFilter(capacity, error_rate))
+
+    def __contains__(self, key):
+        return any(key in bloom for bloom in reversed(self.filters))
+
+    def __len__(self):
+        return sum(bloom.count for bloom in self.filters)
+
+    def add(self, key):
+        if key in self:
+            return False
+
+        if self.filters[-1].count >= self.filters[-1].capacity:
+            self.__add_filter()
+        return self.filters[-1].add(key)
+
+    @property
+    def size_in_bytes(self):
+        return sum(len(bloom.bits) for bloom in self.filters)
+
+
+class BloomDupeFilter(BaseDupeFilter):
+    """
+    Request dupefilter backed by a scalable Bloom filter instead of a set of every fingerprint,
+    so memory stays around a few bytes per url on million page crawls. A small fraction of new urls
+    (BLOOM_DUPEFILTER_ERROR_RATE) may be wrongly treated as seen.
+
+    When a JOBDIR is set the filter is saved there on close so a paused crawl can resume; it is
+    removed again once the crawl finished so the next crawl of the domain starts fresh.
+    """
+    FILE_NAME = "bloom_dupefilter.bin"
+
+    def __init__(self, path=None, capacity=1000000, error_rate=0.001, fingerprinter=None, debug=False, stats=None):
+        self.file = os.path.join(path, self.FILE_NAME) if path else None
+        self.fingerprinter = fingerprinter
+        self.debug = debug
+        self.stats = stats
+        self.bloom = None
+        self.capacity = capacity
+        self.error_rate = error_rate
+
+        if self.file and os.path.isfile(self.file):
+            with open(self.file, "rb") as f:
+                self.bloom = pickle.load(f)
+            logger.info("Resumed bloom dupefilter with %d fingerprints from %s", len(self.bloom), self.file)
+        else:
+            self.bloom = ScalableBloomFilter(capacity, error_rate)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        return cls(job_dir(settings),
+                   settings.getint("BLOOM_DUPEFILTER_CAPACITY", 1000000),
+                   settings.getfloat("BLOOM_DUPEFILTER_ERROR_RATE", 0.001),
+                   getattr(crawler, "request_fingerprinter", None),
+                   settings.getbool("DUPEFILTER_DEBUG"),
+                   crawler.stats)
+
+    def request_fingerprint(self, request):
+        if self.fingerprinter is not None:
+            return self.fingerprinter.fingerprint(request)
+
+        # Scrapy < 2.7 has no request fingerprinter on the crawler
+        from scrapy.utils.request import request_fingerprint
+        return request_fingerprint(request).encode("ascii")
+
+    def request_seen(self, request):
+        return not self.bloom.add(self.request_fingerprint(request))
+
+    def close(self, reason):
+        if self.stats is not None:
+            self.stats.set_value("bloom_dupefilter/fingerprints", len(self.bloom))
+            self.stats.set_value("bloom_dupefilter/bytes", self.bloom.size_in_bytes)
+
+        if not self.file:
+            return
+
+        if reason == "finished":
+            if os.path.isfile(self.file):
+                os.remove(self.file)
+            return
+
+        with open(self.file, "wb") as f:
+            pickle.dump(self.bloom, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def log(self, request, spider):
+        if self.debug:
+            logger.debug("Filtered duplicate request: %(request)s", {"request": request}, extra={"spider": spider})
+
+        spider.crawler.stats.inc_value("dupefilter/filtered", spider=spider)
@@ -0,0 +1,36 @@
+from parsel.csstranslator import HTMLTranslator
+
+
+class TextExtractor:
+    """
+    Pulls the text matched by a css selector out of a page, joined into one string.
+
+    The css selector is translated to XPath once. With fast=True the XPath is also compiled once
+    with lxml and evaluated straight on the parsed document, which skips creating a parsel
+    Selector for every matched text node.
+    """
+    def __init__(self, css_selector, fast=False):
+        self.css_query = css_selector + "::text"
+        self.xpath_query = HTMLTranslator().css_to_xpath(self.css_query)
+        self.compiled_xpath = None
+
+        if fast:
+            from lxml import etree
+            self.compiled_xpath = etree.XPath(self.xpath_query)
+
+    def extract(self, selector):
+        """
+        Returns the matched text fragments joined by spaces ("" when nothing matched)
+        -----------------------------------------------------------------
+        Args:
+            selector: a parsel Selector (response.selector) of the page
+        """
+        if self.compiled_xpath is not None:
+            fragments = self.compiled_xpath(selector.root)
+        else:
+            fragments = selector.xpath(self.xpath_query).getall()
+
+        if not fragments:
+            return ""
+
+        return " ".join(fragments) + " "
@@ -4,10 +4,17 @@
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
 from scrapy import signals
+from scrapy.exceptions import IgnoreRequest, NotConfigured, StopDownload
+from scrapy.http import HtmlResponse
 
 # useful for handling different item types with a single interface
 from itemadapter import is_item, ItemAdapter
 
+from recursive_spider.page_state import PageStateStore
+from recursive_spider.archive import ResponseArchive
+from recursive_spider.download_filter import DownloadFilter
+from recursive_spider.throttle import SlotThrottle, ThrottleLimits, parse_retry_after
+
 
 class RecursiveSpiderSpiderMiddleware:
     # Not all methods need to be defined. If a method is not defined,
@@ -56,48 +63,266 @@ class RecursiveSpiderSpiderMiddleware:
         spider.logger.info('Spider opened: %s' % spider.name)
 
 
-class RecursiveSpiderDownloaderMiddleware:
-    # Not all methods need to be defined. If a method is not defined,
-    # scrapy acts as if the downloader middleware does not modify the
-    # passed objects.
+class DownloadFilterMiddleware:
+    # Saves bandwidth on content that can never become an item: requests for files (pdf, images...)
+    # and for urls outside DOWNLOAD_FILTER_INCLUDE_PATTERNS / inside DOWNLOAD_FILTER_EXCLUDE_PATTERNS are
+    # dropped before they are sent, and downloads are aborted as soon as their headers show a Content-Type
+    # that is not html, or their body grows past DOWNLOAD_FILTER_MAX_SIZE. Enabled with DOWNLOAD_FILTER_ENABLED.
+
+    def __init__(self, download_filter, stats):
+        self.download_filter = download_filter
+        self.stats = stats
 
     @classmethod
     def from_crawler(cls, crawler):
-        # This method is used by Scrapy to create your spiders.
-        s = cls()
+        if not crawler.settings.getbool("DOWNLOAD_FILTER_ENABLED"):
+            raise NotConfigured("DOWNLOAD_FILTER_ENABLED is disabled")
+
+        s = cls(DownloadFilter.from_settings(crawler.settings), crawler.stats)
+        crawler.signals.connect(s.headers_received, signal=signals.headers_received)
+        if s.download_filter.max_size:
+            crawler.signals.connect(s.bytes_received, signal=signals.bytes_received)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    def process_request(self, request, spider):
+        # Retries and redirects copy the meta of the request before them, so each download counts its bytes from zero
+        request.meta.pop("download_filter_received", None)
+        request.meta.pop("download_filter_stopped", None)
+
+        # Never filter the start url (depth 0) or robots.txt
+        if request.meta.get("depth", 0) == 0 or request.url.endswith("/robots.txt"):
+            return None
+
+        reason = self.download_filter.url_rejection(request.url)
+        if reason is not None:
+            self.stats.inc_value("download_filter/ignored/" + reason, spider=spider)
+            raise IgnoreRequest("Filtered by %s: %s" % (reason, request.url))
+        return None
+
+    def process_exception(self, request, exception, spider):
+        # Downloads aborted by this middleware end quietly, like any other ignored request
+        if isinstance(exception, StopDownload) and "download_filter_stopped" in request.meta:
+            raise IgnoreRequest("Aborted download (%s): %s" % (request.meta["download_filter_stopped"], request.url))
+        return None
+
+    def headers_received(self, headers, body_length, request, spider):
+        if request.url.endswith("/robots.txt"):
+            return
+
+        content_type = headers.get("Content-Type")
+        content_length = body_length if isinstance(body_length, int) and body_length >= 0 else None
+        reason = self.download_filter.headers_rejection(content_type.decode("latin-1") if content_type else None, content_length)
+        if reason is not None:
+            self.__stop(request, reason, spider)
+
+    def bytes_received(self, data, request, spider):
+        received = request.meta.get("download_filter_received", 0) + len(data)
+        request.meta["download_filter_received"] = received
+
+        if self.download_filter.is_too_large(received):
+            self.stats.inc_value("download_filter/aborted_bytes", received, spider=spider)
+            self.__stop(request, "size", spider)
+
+    def __stop(self, request, reason, spider):
+        request.meta["download_filter_stopped"] = reason
+        self.stats.inc_value("download_filter/stopped/" + reason, spider=spider)
+        raise StopDownload(fail=True)
+
+    def spider_closed(self, spider):
+        # Bandwidth spent per item written, the number this middleware is meant to bring down
+        items = self.stats.get_value("item_scraped_count", 0, spider=spider)
+        if items:
+            self.stats.set_value("download_filter/bytes_per_item",
+                                 self.stats.get_value("downloader/response_bytes", 0, spider=spider) // items,
+                                 spider=spider)
+
+
+class ConditionalRequestMiddleware:
+    # Turns every request for a url that was crawled before into a conditional request
+    # (If-None-Match / If-Modified-Since) using the page state store, and hands the store
+    # to the spider so it can skip parsing unchanged pages. Enabled with INCREMENTAL_CRAWL.
+
+    def __init__(self, store_path, stats):
+        self.store_path = store_path
+        self.stats = stats
+        self.store = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("INCREMENTAL_CRAWL"):
+            raise NotConfigured("INCREMENTAL_CRAWL is disabled")
+
+        store_path = crawler.settings.get("PAGE_STATE_DB")
+        if not store_path:
+            raise NotConfigured("PAGE_STATE_DB is not set")
+
+        s = cls(store_path, crawler.stats)
         crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
         return s
 
     def process_request(self, request, spider):
-        # Called for each request that goes through the downloader
-        # middleware.
-
-        # Must either:
-        # - return None: continue processing this request
-        # - or return a Response object
-        # - or return a Request object
-        # - or raise IgnoreRequest: process_exception() methods of
-        #   installed downloader middleware will be called
+        state = self.store.get(request.url)
+        if state is None:
+            return None
+
+        if state["etag"]:
+            request.headers.setdefault("If-None-Match", state["etag"])
+        if state["last_modified"]:
+            request.headers.setdefault("If-Modified-Since", state["last_modified"])
+
+        # Let 304 responses reach the spider instead of being filtered as http errors
+        handled = request.meta.setdefault("handle_httpstatus_list", [])
+        if 304 not in handled:
+            handled.append(304)
+
+        self.stats.inc_value("incremental/conditional_requests", spider=spider)
         return None
 
     def process_response(self, request, response, spider):
-        # Called with the response returned from the downloader.
+        if response.status == 304:
+            self.stats.inc_value("incremental/not_modified", spider=spider)
+        return response
+
+    def spider_opened(self, spider):
+        self.store = PageStateStore(self.store_path)
+        spider.page_state = self.store
+        spider.logger.info('Incremental crawl using page state store: %s' % self.store_path)
+
+    def spider_closed(self, spider):
+        self.store.close()
+
+
+class ResponseArchiveMiddleware:
+    # Stores the body of every successful html response in a content-addressed ResponseArchive,
+    # so the pages can be re-extracted offline with another css selector. Enabled with ARCHIVE_RESPONSES.
+
+    ARCHIVED_HEADERS = ["Content-Type", "ETag", "Last-Modified"]
+
+    def __init__(self, archive_directory, stats):
+        self.archive_directory = archive_directory
+        self.stats = stats
+        self.archive = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("ARCHIVE_RESPONSES"):
+            raise NotConfigured("ARCHIVE_RESPONSES is disabled")
+
+        archive_directory = crawler.settings.get("RESPONSE_ARCHIVE_DIR")
+        if not archive_directory:
+            raise NotConfigured("RESPONSE_ARCHIVE_DIR is not set")
+
+        s = cls(archive_directory, crawler.stats)
+        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    def process_response(self, request, response, spider):
+        if response.status != 200 or not isinstance(response, HtmlResponse):
+            return response
+
+        headers = {}
+        for name in self.ARCHIVED_HEADERS:
+            value = response.headers.get(name)
+            if value:
+                headers[name] = value.decode("latin-1")
+
+        if self.archive.put(response.url, response.status, headers, response.body):
+            self.stats.inc_value("archive/stored", spider=spider)
+        else:
+            self.stats.inc_value("archive/deduplicated", spider=spider)
 
-        # Must either;
-        # - return a Response object
-        # - return a Request object
-        # - or raise IgnoreRequest
+        return response
+
+    def spider_opened(self, spider):
+        self.archive = ResponseArchive(self.archive_directory)
+        spider.logger.info('Archiving responses to: %s' % self.archive_directory)
+
+    def spider_closed(self, spider):
+        self.archive.close()
+
+
+class AdaptiveThrottleMiddleware:
+    # Tunes the delay and concurrency of every download slot (domain) from the latency, error rate
+    # and 429/503 responses of its downloads, within the ADAPTIVE_THROTTLE_* limits (see SlotThrottle),
+    # and exports every decision and the current delay / concurrency of each slot as adaptive_throttle/* stats.
+    # Sits closer to the downloader than RetryMiddleware so it sees failures before they are retried.
+    # Enabled with ADAPTIVE_THROTTLE_ENABLED.
+
+    def __init__(self, crawler, limits):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.limits = limits
+        self.throttles = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("ADAPTIVE_THROTTLE_ENABLED"):
+            raise NotConfigured("ADAPTIVE_THROTTLE_ENABLED is disabled")
+        if crawler.settings.getbool("AUTOTHROTTLE_ENABLED"):
+            raise NotConfigured("AUTOTHROTTLE_ENABLED already throttles the download slots")
+
+        s = cls(crawler, ThrottleLimits.from_settings(crawler.settings))
+        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        return s
+
+    def process_response(self, request, response, spider):
+        slot_key, slot = self.__get_slot(request)
+        # Responses that did not come from the downloader (cache...) say nothing about the site
+        if slot is None or "download_latency" not in request.meta:
+            return response
+
+        throttle = self.__get_throttle(slot_key, slot)
+        decision = throttle.record_response(request.meta["download_latency"], response.status,
+                                            parse_retry_after(response.headers.get("Retry-After")))
+        if response.status >= 500 or response.status == 429:
+            self.stats.inc_value("adaptive_throttle/error_responses", spider=spider)
+
+        self.__apply(decision, slot_key, slot, throttle, spider)
         return response
 
     def process_exception(self, request, exception, spider):
-        # Called when a download handler or a process_request()
-        # (from other downloader middleware) raises an exception.
+        # Ignored requests and downloads aborted on purpose (DownloadFilterMiddleware) say nothing about the site
+        if isinstance(exception, (IgnoreRequest, StopDownload)):
+            return None
 
-        # Must either:
-        # - return None: continue processing this exception
-        # - return a Response object: stops process_exception() chain
-        # - return a Request object: stops process_exception() chain
-        pass
+        slot_key, slot = self.__get_slot(request)
+        if slot is None:
+            return None
+
+        throttle = self.__get_throttle(slot_key, slot)
+        self.stats.inc_value("adaptive_throttle/download_errors", spider=spider)
+        self.__apply(throttle.record_error(), slot_key, slot, throttle, spider)
+        return None
+
+    def __get_slot(self, request):
+        slot_key = request.meta.get("download_slot")
+        return slot_key, self.crawler.engine.downloader.slots.get(slot_key)
+
+    def __get_throttle(self, slot_key, slot):
+        throttle = self.throttles.get(slot_key)
+        if throttle is None:
+            throttle = SlotThrottle(slot.delay, slot.concurrency, self.limits)
+            self.throttles[slot_key] = throttle
+        return throttle
+
+    def __apply(self, decision, slot_key, slot, throttle, spider):
+        if decision is None:
+            return
+
+        slot.delay = throttle.delay
+        slot.concurrency = throttle.concurrency
+
+        self.stats.inc_value("adaptive_throttle/" + decision, spider=spider)
+        self.stats.set_value("adaptive_throttle/" + slot_key + "/delay", round(throttle.delay, 3), spider=spider)
+        self.stats.set_value("adaptive_throttle/" + slot_key + "/concurrency", throttle.concurrency, spider=spider)
+        self.stats.max_value("adaptive_throttle/max_concurrency", throttle.concurrency, spider=spider)
+        self.stats.max_value("adaptive_throttle/max_delay", round(throttle.delay, 3), spider=spider)
+        spider.logger.debug('Adaptive throttle %s on %s: delay %.2fs, concurrency %d, latency %s'
+                            % (decision, slot_key, throttle.delay, throttle.concurrency, throttle.latency))
 
     def spider_opened(self, spider):
-        spider.logger.info('Spider opened: %s' % spider.name)
+        spider.logger.info('Adaptive throttle: delay %.2f-%.2fs, concurrency %d-%d'
+                           % (self.limits.min_delay, self.limits.max_delay, self.limits.min_concurrency, self.limits.max_concurrency))
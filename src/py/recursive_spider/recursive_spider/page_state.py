@@ -0,0 +1,87 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+COMMIT_EVERY = 100
+
+
+def hash_bytes(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+class PageStateStore:
+    """
+    Persists what was seen for every crawled url (ETag, Last-Modified, body hash, extracted content
+    and followed links) in a local SQLite database, so the next crawl of the same domain can send
+    conditional requests and skip parsing pages that did not change.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.pending_writes = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                body_hash TEXT,
+                content TEXT,
+                links TEXT,
+                fetched_at REAL
+            )
+        """)
+        self.connection.commit()
+
+    def get(self, url):
+        """
+        Returns the stored state of url as a dict, or None if the url was never crawled
+        """
+        row = self.connection.execute(
+            "SELECT etag, last_modified, body_hash, content, links FROM pages WHERE url = ?", (url,)
+        ).fetchone()
+
+        if row is None:
+            return None
+
+        return {
+            "etag": row[0],
+            "last_modified": row[1],
+            "body_hash": row[2],
+            "content": row[3],
+            "links": json.loads(row[4]) if row[4] else [],
+        }
+
+    def put(self, url, etag, last_modified, body_hash, content, links):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO pages (url, etag, last_modified, body_hash, content, links, fetched_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (url, etag, last_modified, body_hash, content, json.dumps(links), time.time()),
+        )
+
+        # Commit in batches, a commit per page would make sqlite the bottleneck of the crawl
+        self.pending_writes += 1
+        if self.pending_writes >= COMMIT_EVERY:
+            self.connection.commit()
+            self.pending_writes = 0
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+
+class ChangedPagesFilter:
+    """
+    Feed item filter (FEEDS item_filter) that only keeps the pages an incremental crawl found new or
+    changed, for the <domain>_changes.jl feed written next to the domain's full snapshot
+    """
+    def __init__(self, feed_options=None):
+        self.feed_options = feed_options
+
+    def accepts(self, item):
+        return item.get("changed", True)
@@ -3,11 +3,111 @@
 # Don't forget to add your pipeline to the ITEM_PIPELINES setting
 # See: https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 
+import hashlib
+import re
 
 # useful for handling different item types with a single interface
 from itemadapter import ItemAdapter
+from scrapy.exceptions import DropItem, NotConfigured
+
+SIMHASH_BITS = 64
+SHINGLE_SIZE = 3
+WORD_PATTERN = re.compile(r"\w+")
 
 
 class RecursiveSpiderPipeline:
     def process_item(self, item, spider):
         return item
+
+
+class NearDuplicatePipeline:
+    """
+    Drops items whose content is nearly identical to an item that was already kept
+    (pagination, tag pages, syndicated posts...), before they are written to the feed.
+
+    Every item gets a 64 bit SimHash of its word shingles. Two items are near-duplicates when
+    1 - hamming_distance / 64 >= NEAR_DUPLICATE_THRESHOLD. The fingerprints are split into
+    max_distance + 1 bands, so any near-duplicate shares at least one band exactly with
+    the item it duplicates and only those candidates are compared.
+    """
+    def __init__(self, threshold, stats):
+        if not 0 < threshold <= 1:
+            raise ValueError("[ERROR]: NEAR_DUPLICATE_THRESHOLD must be between 0 and 1, got " + str(threshold))
+
+        self.threshold = threshold
+        self.stats = stats
+        self.max_distance = int((1 - threshold) * SIMHASH_BITS)
+        self.bands = self.__band_masks(self.max_distance + 1)
+        self.buckets = {}
+        self.dropped = 0
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        threshold = crawler.settings.getfloat("NEAR_DUPLICATE_THRESHOLD", 0)
+        if threshold <= 0:
+            raise NotConfigured("NEAR_DUPLICATE_THRESHOLD is not set")
+
+        return cls(threshold, crawler.stats)
+
+    def process_item(self, item, spider):
+        content = ItemAdapter(item).get("content")
+        if not content:
+            return item
+
+        fingerprint = simhash(content)
+        band_keys = [(index, fingerprint & mask) for index, mask in enumerate(self.bands)]
+
+        for key in band_keys:
+            for kept in self.buckets.get(key, ()):
+                if bin(fingerprint ^ kept).count("1") <= self.max_distance:
+                    self.dropped += 1
+                    self.stats.inc_value("near_duplicate/dropped", spider=spider)
+                    raise DropItem("Near-duplicate content: " + ItemAdapter(item).get("url", ""))
+
+        for key in band_keys:
+            self.buckets.setdefault(key, []).append(fingerprint)
+
+        self.stats.inc_value("near_duplicate/kept", spider=spider)
+        return item
+
+    def close_spider(self, spider):
+        spider.logger.info("[LOG]: Dropped %d near-duplicate items (threshold %.2f)", self.dropped, self.threshold)
+
+    def __band_masks(self, band_count):
+        band_count = min(band_count, SIMHASH_BITS)
+        masks = []
+        start = 0
+
+        for index in range(band_count):
+            width = SIMHASH_BITS // band_count + (1 if index < SIMHASH_BITS % band_count else 0)
+            masks.append(((1 << width) - 1) << start)
+            start += width
+
+        return masks
+
+
+def simhash(text):
+    """
+    Returns the 64 bit SimHash of the word shingles in text
+    """
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) < SHINGLE_SIZE:
+        shingles = [" ".join(words)]
+    else:
+        shingles = [" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)]
+
+    weights = [0] * SIMHASH_BITS
+    for shingle in set(shingles):
+        feature = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(SIMHASH_BITS):
+            if feature >> bit & 1:
+                weights[bit] += 1
+            else:
+                weights[bit] -= 1
+
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+
+    return fingerprint
@@ -0,0 +1,90 @@
+import itertools
+import json
+import multiprocessing
+import time
+from urllib.parse import urlparse
+from recursive_spider.archive import ResponseArchive
+from recursive_spider.extractors import TextExtractor
+
+BATCH_SIZE = 200
+
+# Set once per worker process by init_worker
+worker_archive = None
+worker_extractor = None
+
+
+def init_worker(archive_directory, css_selector, fast):
+    """
+    Runs once in every worker: opens its own read-only handle on the archive and builds the extractor
+    """
+    global worker_archive, worker_extractor
+
+    worker_archive = ResponseArchive(archive_directory, readonly=True)
+    worker_extractor = TextExtractor(css_selector, fast)
+
+
+def extract_batch(entries):
+    """
+    Re-runs the css selection on a batch of (url, body_hash, headers), returning the items the spider would have written
+    """
+    from scrapy.http import HtmlResponse
+
+    items = []
+    for url, body_hash, headers in entries:
+        body = worker_archive.get_body(body_hash)
+        if body is None:
+            continue
+
+        # HtmlResponse decodes the body the same way it was decoded during the crawl
+        response = HtmlResponse(url, body=body, headers=headers)
+        content = worker_extractor.extract(response.selector)
+        if content != "":
+            items.append({'content': content, 'url': url})
+
+    return items
+
+
+def is_on_domain(url, domain):
+    hostname = urlparse(url).hostname or ""
+    return hostname == domain or hostname.endswith("." + domain)
+
+
+def reextract(archive_directory, css_selector, output_path, workers=None, fast=False, domain=None):
+    """
+    Applies css_selector to every page of a response archive and writes the items, in the same
+    jsonlines format as a crawl, to output_path. Pages are parsed in a pool of worker processes,
+    each reading the bodies it needs straight from the archive.
+    -----------------------------------------------------------------
+    Args:
+        archive_directory: folder of a ResponseArchive written with ARCHIVE_RESPONSES
+        css_selector: selector of the page text, as in CSS_SELECTORS
+        output_path: the .jl file to write
+        workers: number of worker processes (every core by default)
+        fast: evaluate the selector with a compiled lxml XPath (see FAST_EXTRACTOR)
+        domain: only re-extract pages of this domain (and its subdomains), every page when None
+
+    Returns:
+        dict: number of archived pages and of written items, and the seconds it took
+    """
+    archive = ResponseArchive(archive_directory, readonly=True)
+    pages = len(archive)
+    entries = archive.entries()
+    if domain is not None:
+        entries = (entry for entry in entries if is_on_domain(entry[0], domain))
+    batches = iter(lambda: list(itertools.islice(entries, BATCH_SIZE)), [])
+
+    start = time.perf_counter()
+    written = 0
+
+    with multiprocessing.Pool(workers, initializer=init_worker, initargs=(archive_directory, css_selector, fast)) as pool:
+        with open(output_path, "w", encoding="utf-8") as f:
+            for items in pool.imap(extract_batch, batches):
+                for item in items:
+                    f.write(json.dumps(item) + "\n")
+                written += len(items)
+
+    archive.close()
+
+    seconds = time.perf_counter() - start
+    print("[LOG]: Re-extracted " + str(written) + " items from " + str(pages) + " archived pages in " + format(seconds, ".1f") + "s")
+    return {"pages": pages, "items": written, "seconds": round(seconds, 3)}
@@ -12,12 +12,26 @@ BOT_NAME = 'recursive_spider'
 SPIDER_MODULES = ['recursive_spider.spiders']
 NEWSPIDER_MODULE = 'recursive_spider.spiders'
 
+# Evaluate the css selector with a precompiled lxml XPath instead of parsel selectors (faster on large pages)
+FAST_EXTRACTOR = False
+
 
 SCHEDULER_PRIORITY_QUEUE = 'scrapy.pqueues.DownloaderAwarePriorityQueue'
 
-RETRY_ENABLED = False
+# Memory bounded frontier for very large domains: with a JOBDIR set, pending requests are queued on disk,
+# and BloomDupeFilter remembers seen urls in a scalable Bloom filter instead of a set of fingerprints.
+# Enable per domain with DISK_FRONTIER / BLOOM_DUPEFILTER in the config file
+#JOBDIR = 'crawls/main'
+#DUPEFILTER_CLASS = 'recursive_spider.dupefilters.BloomDupeFilter'
+BLOOM_DUPEFILTER_CAPACITY = 1000000
+BLOOM_DUPEFILTER_ERROR_RATE = 0.001
+
+# Failed downloads (timeouts, 5xx, 429) are retried instead of silently losing the page,
+# AdaptiveThrottleMiddleware backs the domain off before the retry is sent
+RETRY_ENABLED = True
+RETRY_TIMES = 3
 
-DOWNLOAD_TIMEOUT = 2
+DOWNLOAD_TIMEOUT = 15
 
 REDIRECT_ENABLED = True
 
@@ -30,7 +44,7 @@ ROBOTSTXT_OBEY = True
 # Configure maximum concurrent requests performed by Scrapy (default: 16)
 #CONCURRENT_REQUESTS = 32
 
-# Configure a delay for requests for the same website (default: 0)
+# Configure a delay for requests for the same website (default: 0), adapted per domain by AdaptiveThrottleMiddleware
 # See https://docs.scrapy.org/en/latest/topics/settings.html#download-delay
 # See also autothrottle settings and docs
 DOWNLOAD_DELAY = 0.5
@@ -58,9 +72,52 @@ COOKIES_ENABLED = False
 
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
-#DOWNLOADER_MIDDLEWARES = {
-#    'recursive_spider.middlewares.RecursiveSpiderDownloaderMiddleware': 543,
-#}
+DOWNLOADER_MIDDLEWARES = {
+    # Right after RobotsTxtMiddleware (100) so filtered urls are dropped before any other work
+    'recursive_spider.middlewares.DownloadFilterMiddleware': 110,
+    'recursive_spider.middlewares.ConditionalRequestMiddleware': 543,
+    # Below HttpCompressionMiddleware (590) so decompressed bodies are archived
+    'recursive_spider.middlewares.ResponseArchiveMiddleware': 544,
+    # Above RetryMiddleware (550) so it sees failed downloads before they are retried
+    'recursive_spider.middlewares.AdaptiveThrottleMiddleware': 560,
+}
+
+# Download filter: requests for files (DOWNLOAD_FILTER_EXCLUDED_EXTENSIONS, comma separated, default pdf, images,
+# media, archives, assets) and urls not matching DOWNLOAD_FILTER_INCLUDE_PATTERNS or matching
+# DOWNLOAD_FILTER_EXCLUDE_PATTERNS (space separated regexes) are never sent; downloads whose Content-Type is
+# not one of DOWNLOAD_FILTER_CONTENT_TYPES or whose body exceeds DOWNLOAD_FILTER_MAX_SIZE bytes are aborted
+# as soon as that is known. Set per domain in the config file
+DOWNLOAD_FILTER_ENABLED = True
+DOWNLOAD_FILTER_EXCLUDED_EXTENSIONS = None
+DOWNLOAD_FILTER_INCLUDE_PATTERNS = None
+DOWNLOAD_FILTER_EXCLUDE_PATTERNS = None
+DOWNLOAD_FILTER_CONTENT_TYPES = None
+DOWNLOAD_FILTER_MAX_SIZE = 2 * 1024 * 1024
+
+# Adaptive throttling: DOWNLOAD_DELAY and CONCURRENT_REQUESTS_PER_DOMAIN are only the starting point,
+# each domain's delay and concurrency then follow its latency, error rate and 429/503 responses
+# within these limits (judged every ADAPTIVE_THROTTLE_WINDOW downloads). Set per domain in the config file
+ADAPTIVE_THROTTLE_ENABLED = True
+ADAPTIVE_THROTTLE_MIN_DELAY = 0.05
+ADAPTIVE_THROTTLE_MAX_DELAY = 30
+ADAPTIVE_THROTTLE_MIN_CONCURRENCY = 1
+ADAPTIVE_THROTTLE_MAX_CONCURRENCY = 16
+ADAPTIVE_THROTTLE_TARGET_LATENCY = 2.0
+ADAPTIVE_THROTTLE_MAX_ERROR_RATE = 0.1
+ADAPTIVE_THROTTLE_WINDOW = 20
+
+# Incremental crawling: remember ETag/Last-Modified/body hash per url in PAGE_STATE_DB (one sqlite file per domain),
+# send conditional requests and skip parsing unchanged pages.
+# Unchanged pages are still written from their stored content, so the domain's .jl is always a full snapshot.
+# INCREMENTAL_EMIT = 'changed' also writes the new or changed pages to <domain>_changes.jl, 'snapshot' only the snapshot
+INCREMENTAL_CRAWL = False
+INCREMENTAL_EMIT = 'changed'
+PAGE_STATE_DB = None
+
+# Keep the raw html of every page in a compressed, content-addressed archive (RESPONSE_ARCHIVE_DIR)
+# so a new css selector can be applied offline with `entry.py re-extract` instead of recrawling
+ARCHIVE_RESPONSES = False
+RESPONSE_ARCHIVE_DIR = None
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
@@ -70,9 +127,13 @@ COOKIES_ENABLED = False
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
-#ITEM_PIPELINES = {
-#    'recursive_spider.pipelines.RecursiveSpiderPipeline': 300,
-#}
+ITEM_PIPELINES = {
+    'recursive_spider.pipelines.NearDuplicatePipeline': 300,
+}
+
+# Items whose content is at least this similar (0-1, SimHash) to an item already kept are dropped.
+# 0 disables the near-duplicate pipeline; set it per domain with NEAR_DUPLICATE_THRESHOLD in the config file
+NEAR_DUPLICATE_THRESHOLD = 0
 
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
@@ -1,37 +1,83 @@
+import re
 import scrapy
+from urllib.parse import urlparse
 from scrapy.spiders import Rule
 from scrapy.linkextractors import LinkExtractor
+from recursive_spider.extractors import TextExtractor
+from recursive_spider.page_state import hash_bytes
 
 class MainSpider(scrapy.Spider):
     name = "main"
 
-    def __init__(self, url, css_selector):
+    def __init__(self, url, css_selector, fast_extractor=False):
         self.allowed_domains = [determine_domain(url)]
-        self.start_urls = ["https://" + url]
+        self.start_urls = [url if "://" in url else "https://" + url]
         self.css_selector = css_selector
+        self.text_extractor = TextExtractor(css_selector, fast=fast_extractor)
+
+        # Built once per crawl: only follow links on the allowed domain that start with the start url,
+        # canonicalised so the same page is not requested under different urls
+        self.link_extractor = LinkExtractor(allow=["^" + re.escape(self.start_urls[0])],
+                                            allow_domains=self.allowed_domains,
+                                            canonicalize=True)
 
         # Print for logging information
         print(f"USING CSS SELECTOR: {css_selector}")
         print(f"SCRAPING DOMAIN: {url}")
     
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        kwargs.setdefault("fast_extractor", crawler.settings.getbool("FAST_EXTRACTOR"))
+        return super().from_crawler(crawler, *args, **kwargs)
+
     def parse(self, response):
-        whole_page_content = ""
-        
-        for content in response.css(self.css_selector + "::text"):
-            whole_page_content += str(content.get()) + " "
-        
+        page_state = getattr(self, "page_state", None)
+        state = page_state.get(response.url) if page_state is not None else None
+
+        if state is not None and (response.status == 304 or state["body_hash"] == hash_bytes(response.body)):
+            # Page did not change since the last crawl, reuse its stored content and links instead of parsing it.
+            # It is still written, so the domain's .jl stays a full snapshot that can be trained on
+            if state["content"]:
+                yield {
+                    'content': state["content"],
+                    'url': response.url,
+                    'changed': False,
+                }
+
+            for url in state["links"]:
+                yield scrapy.Request(url, callback=self.parse)
+            return
+
+        if response.status == 304:
+            return
+
+        whole_page_content = self.text_extractor.extract(response.selector)
+
         if whole_page_content != "":
-            yield {
+            item = {
                 'content': whole_page_content,
                 'url': response.url, 
             }
+            if page_state is not None:
+                item['changed'] = True
+            yield item
+
+        links = [link.url for link in self.link_extractor.extract_links(response)]
+        for url in links:
+            yield scrapy.Request(url, callback=self.parse)
 
-        le = LinkExtractor()
-        for link in le.extract_links(response):
-            if does_link_contain_base_url(str(link), self.start_urls[0]) == True:   
-                yield scrapy.Request(link.url, callback=self.parse)
+        if page_state is not None:
+            page_state.put(response.url,
+                           response.headers.get("ETag", b"").decode("latin-1") or None,
+                           response.headers.get("Last-Modified", b"").decode("latin-1") or None,
+                           hash_bytes(response.body),
+                           whole_page_content,
+                           links)
 
 def determine_domain(url):
+    if "://" in url:
+        return urlparse(url).hostname
+
     domain = ""
     
     for i in url:
@@ -41,11 +87,3 @@ def determine_domain(url):
         domain += i
 
     return domain
-
-def does_link_contain_base_url(in_link, base_url):
-    if base_url in in_link:
-        return True
-    else:
-        return False
-
-print(determine_domain("www.trustradius.com/buyer-blog"))
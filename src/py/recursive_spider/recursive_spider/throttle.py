@@ -0,0 +1,151 @@
+import time
+
+# Responses telling us to slow down: their slot backs off at once instead of at the end of a window
+BACKOFF_STATUSES = (429, 503)
+
+# Weight of the newest latency in the moving average
+LATENCY_SMOOTHING = 0.3
+
+# Smallest delay a backing off slot goes to when it was running without one
+MIN_BACKOFF_DELAY = 0.25
+
+
+class ThrottleLimits:
+    """
+    Bounds every SlotThrottle of a crawl stays within (the ADAPTIVE_THROTTLE_* settings).
+    -----------------------------------------------------------------
+    Args:
+        min_delay, max_delay: seconds between two requests of a slot
+        min_concurrency, max_concurrency: requests of a slot downloading at the same time
+        target_latency: average latency (seconds) above which a slot stops growing and shrinks
+        max_error_rate: share of failed downloads (timeouts, 5xx...) in a window above which a slot shrinks
+        window: responses a slot judges at once before changing its delay and concurrency
+    """
+    def __init__(self, min_delay=0.0, max_delay=30.0, min_concurrency=1, max_concurrency=16,
+                 target_latency=2.0, max_error_rate=0.1, window=20):
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max(min_concurrency, max_concurrency)
+        self.target_latency = target_latency
+        self.max_error_rate = max_error_rate
+        self.window = window
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(
+            min_delay=settings.getfloat("ADAPTIVE_THROTTLE_MIN_DELAY"),
+            max_delay=settings.getfloat("ADAPTIVE_THROTTLE_MAX_DELAY"),
+            min_concurrency=settings.getint("ADAPTIVE_THROTTLE_MIN_CONCURRENCY"),
+            # A slot can never use more than its crawler's share of the global request budget
+            max_concurrency=min(settings.getint("ADAPTIVE_THROTTLE_MAX_CONCURRENCY"), settings.getint("CONCURRENT_REQUESTS")),
+            target_latency=settings.getfloat("ADAPTIVE_THROTTLE_TARGET_LATENCY"),
+            max_error_rate=settings.getfloat("ADAPTIVE_THROTTLE_MAX_ERROR_RATE"),
+            window=settings.getint("ADAPTIVE_THROTTLE_WINDOW"),
+        )
+
+
+class SlotThrottle:
+    """
+    Delay and concurrency of one download slot (one domain), tuned additive increase / multiplicative
+    decrease style from what its downloads report:
+      - 429/503 halve the concurrency and at least double the delay (or wait Retry-After) right away,
+        at most once per delay so a burst of them backs off once
+      - every `window` downloads, a slot that had too many errors halves its concurrency and doubles its
+        delay, one that got slower than target_latency drops one request, and a healthy one adds one
+        request and shortens its delay by a quarter
+    Nothing here depends on scrapy, AdaptiveThrottleMiddleware copies delay and concurrency onto the slot.
+    """
+    def __init__(self, delay, concurrency, limits):
+        self.limits = limits
+        self.delay = min(max(delay, limits.min_delay), limits.max_delay)
+        self.concurrency = min(max(concurrency, limits.min_concurrency), limits.max_concurrency)
+        self.latency = None
+        self.responses = 0
+        self.errors = 0
+        self.last_backoff = None
+
+    def record_response(self, latency, status, retry_after=None, now=None):
+        """
+        Records a downloaded response.
+        -----------------------------------------------------------------
+        Args:
+            latency: seconds between sending the request and receiving the response headers
+            status: http status of the response
+            retry_after: seconds from the Retry-After header, if any
+            now: current time.monotonic(), read when not given
+
+        Returns:
+            str: "backoff", "decrease" or "increase" if delay or concurrency changed, None otherwise
+        """
+        if status in BACKOFF_STATUSES:
+            return self.__back_off(retry_after, time.monotonic() if now is None else now)
+
+        if latency is not None:
+            self.latency = latency if self.latency is None else LATENCY_SMOOTHING * latency + (1 - LATENCY_SMOOTHING) * self.latency
+
+        self.responses += 1
+        if status >= 500:
+            self.errors += 1
+        return self.__end_window()
+
+    def record_error(self):
+        """
+        Records a download that failed without a response (timeout, refused connection...), see record_response
+        """
+        self.responses += 1
+        self.errors += 1
+        return self.__end_window()
+
+    def __back_off(self, retry_after, now):
+        if self.last_backoff is not None and now - self.last_backoff < max(self.delay, 1.0):
+            return None
+
+        self.last_backoff = now
+        self.__decrease(max(self.delay * 2, MIN_BACKOFF_DELAY, retry_after or 0))
+        return "backoff"
+
+    def __end_window(self):
+        if self.responses < self.limits.window:
+            return None
+
+        error_rate = self.errors / self.responses
+        self.responses = 0
+        self.errors = 0
+
+        if error_rate > self.limits.max_error_rate:
+            self.__decrease(max(self.delay * 2, MIN_BACKOFF_DELAY))
+            return "decrease"
+
+        if self.latency is not None and self.latency > self.limits.target_latency:
+            if self.concurrency == self.limits.min_concurrency:
+                return None
+            self.concurrency -= 1
+            return "decrease"
+
+        if self.concurrency == self.limits.max_concurrency and self.delay == self.limits.min_delay:
+            return None
+
+        self.concurrency = min(self.concurrency + 1, self.limits.max_concurrency)
+        self.delay = self.delay * 0.75
+        if self.delay - self.limits.min_delay < 0.01:
+            self.delay = self.limits.min_delay
+        return "increase"
+
+    def __decrease(self, delay):
+        self.concurrency = max(self.concurrency // 2, self.limits.min_concurrency)
+        self.delay = min(delay, self.limits.max_delay)
+        self.responses = 0
+        self.errors = 0
+
+
+def parse_retry_after(value):
+    """
+    Seconds to wait from a Retry-After header given in seconds (http dates are ignored), or None
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value.decode("latin-1") if isinstance(value, bytes) else value))
+    except ValueError:
+        return None
@@ -0,0 +1,258 @@
+import os
+import shutil
+import sys
+
+# The scrapy project lives in its own folder (src/py/recursive_spider), so make it importable
+# and point scrapy at its settings module before anything from scrapy is loaded.
+SPIDER_PROJECT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "recursive_spider")
+if SPIDER_PROJECT_PATH not in sys.path:
+    sys.path.insert(0, SPIDER_PROJECT_PATH)
+os.environ.setdefault("SCRAPY_SETTINGS_MODULE", "recursive_spider.settings")
+
+from scrapy.crawler import Crawler, CrawlerProcess
+from scrapy.utils.project import get_project_settings
+from twisted.internet import defer
+
+from recursive_spider.spiders.MainSpider import MainSpider
+
+GENERAL_SECTION = "General Settings"
+
+# Values that turn a config flag on, anything else turns it off
+TRUE_VALUES = ("1", "true", "yes", "on")
+
+
+def to_bool(value):
+    return value.strip().lower() in TRUE_VALUES
+
+
+# Config keys copied from a domain section into the scrapy settings of that domain's crawler.
+# A key missing from the domain section falls back to [General Settings], and then to settings.py.
+SECTION_SETTINGS = {
+    "DEPTH_LIMIT": int,
+    "CLOSESPIDER_PAGECOUNT": int,
+    "NEAR_DUPLICATE_THRESHOLD": float,
+    "INCREMENTAL_CRAWL": to_bool,
+    "INCREMENTAL_EMIT": str,
+    "FAST_EXTRACTOR": to_bool,
+    "BLOOM_DUPEFILTER_CAPACITY": int,
+    "BLOOM_DUPEFILTER_ERROR_RATE": float,
+    "ARCHIVE_RESPONSES": to_bool,
+    "DOWNLOAD_DELAY": float,
+    "DOWNLOAD_TIMEOUT": float,
+    "RETRY_TIMES": int,
+    "ADAPTIVE_THROTTLE_ENABLED": to_bool,
+    "ADAPTIVE_THROTTLE_MIN_DELAY": float,
+    "ADAPTIVE_THROTTLE_MAX_DELAY": float,
+    "ADAPTIVE_THROTTLE_MIN_CONCURRENCY": int,
+    "ADAPTIVE_THROTTLE_MAX_CONCURRENCY": int,
+    "ADAPTIVE_THROTTLE_TARGET_LATENCY": float,
+    "ADAPTIVE_THROTTLE_MAX_ERROR_RATE": float,
+    "ADAPTIVE_THROTTLE_WINDOW": int,
+    "DOWNLOAD_FILTER_ENABLED": to_bool,
+    "DOWNLOAD_FILTER_EXCLUDED_EXTENSIONS": str,
+    "DOWNLOAD_FILTER_INCLUDE_PATTERNS": str,
+    "DOWNLOAD_FILTER_EXCLUDE_PATTERNS": str,
+    "DOWNLOAD_FILTER_CONTENT_TYPES": str,
+    "DOWNLOAD_FILTER_MAX_SIZE": int,
+}
+
+# Paths every crawler needs its own copy of (sqlite files opened by one writer, scrapy job state), with the suffix
+# of their default location next to the domain's .jl. A domain section's value is used as is, a [General Settings]
+# value is a root folder that gets one entry per domain.
+SECTION_PATHS = {
+    "PAGE_STATE_DB": "_page_state.sqlite",
+    "JOBDIR": "_jobdir",
+    "RESPONSE_ARCHIVE_DIR": "_archive",
+}
+
+# Pages an incremental crawl found new or changed are also written to <domain .jl path without extension><suffix>
+CHANGES_FEED_SUFFIX = "_changes.jl"
+
+# Fields written to the feeds, the spider's 'changed' marker only routes items to the changes feed
+FEED_FIELDS = ["content", "url"]
+
+DEFAULT_MAX_CONCURRENT_REQUESTS = 32
+
+# Close reason of a crawl paused with Ctrl-C / SIGTERM: the only one whose JOBDIR is kept to resume from
+PAUSED_REASON = "shutdown"
+
+
+class MultiDomainCrawler:
+    """
+    Runs one MainSpider per config section inside a single scrapy process (one twisted reactor),
+    so every domain downloads at the same time instead of one `scrapy crawl` process per domain.
+    """
+    def __init__(self, config):
+        self.config = config
+        self.settings = get_project_settings()
+        self.crawlers = {}
+
+        general = self.config[GENERAL_SECTION] if self.config.has_section(GENERAL_SECTION) else {}
+        self.max_concurrent_requests = int(general.get("MAX_CONCURRENT_REQUESTS", DEFAULT_MAX_CONCURRENT_REQUESTS))
+        self.max_concurrent_domains = int(general.get("MAX_CONCURRENT_DOMAINS", 0))
+
+    def crawl(self, output_paths):
+        """
+        Crawls every section in output_paths and blocks until all of them are finished.
+        -----------------------------------------------------------------
+        Args:
+            output_paths: dict of config section (domain) -> path of the .jl file to write its items to
+
+        Returns:
+            dict: config section -> scrapy stats of that section's crawl
+        """
+        if not output_paths:
+            return {}
+
+        domains_at_once = len(output_paths)
+        if self.max_concurrent_domains > 0:
+            domains_at_once = min(domains_at_once, self.max_concurrent_domains)
+
+        # The global request budget is shared evenly between the crawlers running at the same time
+        requests_per_crawler = max(1, self.max_concurrent_requests // domains_at_once)
+
+        process = CrawlerProcess(self.settings)
+        semaphore = defer.DeferredSemaphore(domains_at_once)
+        deferreds = []
+
+        for index, (section, output_path) in enumerate(output_paths.items()):
+            # Crawlers built outside CrawlerProcess.crawl have to install the reactor themselves, the first one does
+            crawler = Crawler(MainSpider, self.section_settings(section, output_path, requests_per_crawler),
+                              init_reactor=index == 0)
+            self.crawlers[section] = crawler
+
+            print("[LOG]: Queued crawl of " + section + " -> " + output_path)
+            deferreds.append(semaphore.run(process.crawl, crawler,
+                                           url=section,
+                                           css_selector=self.section_css_selector(section)))
+
+        defer.DeferredList(deferreds).addBoth(self.__stop_reactor)
+        process.start(stop_after_crawl=False)
+
+        stats = self.__collect_stats()
+        self.__clear_finished_jobdirs(stats)
+        return stats
+
+    def section_settings(self, section, output_path, concurrent_requests):
+        """
+        Builds the scrapy settings for a single domain's crawler.
+        -----------------------------------------------------------------
+        Args:
+            section: config section (domain) being crawled
+            output_path: path of the .jl file to write scraped items to
+            concurrent_requests: share of the global request budget given to this crawler
+
+        Returns:
+            Settings: a copy of the project settings with the section's overrides applied
+        """
+        settings = self.settings.copy()
+
+        for key, convert in SECTION_SETTINGS.items():
+            value = self.section_value(section, key)
+            if value is not None:
+                settings.set(key, convert(value), priority="cmdline")
+
+        # Keep each domain's page state in its own sqlite file, next to its scraped data unless the config says otherwise
+        if settings.getbool("INCREMENTAL_CRAWL"):
+            settings.set("PAGE_STATE_DB", self.section_path(section, "PAGE_STATE_DB", output_path), priority="cmdline")
+
+        # Queue pending requests on disk (scrapy does this whenever a JOBDIR is set),
+        # every crawler in its own folder so they do not share request queues or seen urls
+        resuming = False
+        if self.section_flag(section, "DISK_FRONTIER") or self.section_value(section, "JOBDIR") is not None:
+            jobdir = self.section_path(section, "JOBDIR", output_path)
+            settings.set("JOBDIR", jobdir, priority="cmdline")
+
+            # A JOBDIR left with content belongs to a paused crawl, finished ones are cleared after the crawl
+            resuming = os.path.isdir(jobdir) and len(os.listdir(jobdir)) > 0
+            if resuming:
+                print("[LOG]: Resuming paused crawl of " + section + " from " + jobdir)
+
+        # Keep each domain's response archive next to its scraped data unless the config says otherwise
+        if settings.getbool("ARCHIVE_RESPONSES"):
+            settings.set("RESPONSE_ARCHIVE_DIR", self.section_archive_directory(section, output_path), priority="cmdline")
+
+        if self.section_flag(section, "BLOOM_DUPEFILTER"):
+            settings.set("DUPEFILTER_CLASS", "recursive_spider.dupefilters.BloomDupeFilter", priority="cmdline")
+
+        settings.set("CONCURRENT_REQUESTS", concurrent_requests, priority="cmdline")
+        settings.set("CONCURRENT_REQUESTS_PER_DOMAIN",
+                     min(concurrent_requests, settings.getint("CONCURRENT_REQUESTS_PER_DOMAIN")),
+                     priority="cmdline")
+        # A resumed crawl only scrapes the pages it had not reached yet, so it adds them to the items it already wrote
+        feeds = {output_path: {"format": "jsonlines", "overwrite": not resuming, "fields": FEED_FIELDS}}
+
+        # An incremental crawl still writes every page to the domain's .jl (unchanged ones from the page state store),
+        # so training never sees only the changed pages; those also go to their own feed
+        if settings.getbool("INCREMENTAL_CRAWL") and settings.get("INCREMENTAL_EMIT") == "changed":
+            feeds[os.path.splitext(output_path)[0] + CHANGES_FEED_SUFFIX] = {
+                "format": "jsonlines",
+                "overwrite": not resuming,
+                "fields": FEED_FIELDS,
+                "item_filter": "recursive_spider.page_state.ChangedPagesFilter",
+            }
+        settings.set("FEEDS", feeds, priority="cmdline")
+
+        return settings
+
+    def section_archive_directory(self, section, output_path):
+        return self.section_path(section, "RESPONSE_ARCHIVE_DIR", output_path)
+
+    def section_path(self, section, key, output_path):
+        """
+        Returns the path of a SECTION_PATHS setting for one domain: the domain section's own value,
+        else <[General Settings] value>/<domain><suffix>, else <domain .jl path without extension><suffix>.
+        """
+        if self.config.has_option(section, key):
+            return self.config[section][key]
+
+        stem = os.path.splitext(output_path)[0]
+        if self.config.has_option(GENERAL_SECTION, key):
+            return os.path.join(self.config[GENERAL_SECTION][key], os.path.basename(stem) + SECTION_PATHS[key])
+        return stem + SECTION_PATHS[key]
+
+    def section_value(self, section, key):
+        """
+        Returns a config value for a section, falling back to [General Settings] (None if neither has it)
+        """
+        if self.config.has_option(section, key):
+            return self.config[section][key]
+        if self.config.has_option(GENERAL_SECTION, key):
+            return self.config[GENERAL_SECTION][key]
+        return None
+
+    def section_flag(self, section, key):
+        value = self.section_value(section, key)
+        return value is not None and to_bool(value)
+
+    def section_css_selector(self, section):
+        # Selectors are quoted in the config file so they survive being passed through a shell
+        return self.config[section]["CSS_SELECTORS"].strip().strip('"').strip("'")
+
+    def __collect_stats(self):
+        results = {}
+
+        for section, crawler in self.crawlers.items():
+            stats = crawler.stats.get_stats() if crawler.stats else {}
+            results[section] = stats
+            print("[LOG]: Finished crawl of " + section
+                  + " (" + str(stats.get("finish_reason")) + ")"
+                  + " items: " + str(stats.get("item_scraped_count", 0))
+                  + " pages: " + str(stats.get("response_received_count", 0)))
+
+        return results
+
+    def __clear_finished_jobdirs(self, stats):
+        # The seen urls (and bloom filter) of a crawl that ran to the end would make the next crawl of
+        # the domain skip every page, so only a paused crawl keeps its JOBDIR
+        for section, crawler in self.crawlers.items():
+            jobdir = crawler.settings.get("JOBDIR")
+            if jobdir and stats[section].get("finish_reason") != PAUSED_REASON and os.path.isdir(jobdir):
+                shutil.rmtree(jobdir)
+                print("[LOG]: Cleared job state of finished crawl of " + section + " in " + jobdir)
+
+    def __stop_reactor(self, _):
+        from twisted.internet import reactor
+
+        if reactor.running:
+            reactor.stop()
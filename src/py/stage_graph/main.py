@@ -0,0 +1,198 @@
+import hashlib
+import json
+import os
+import time
+
+CHECKPOINT_FILE_NAME = ".snb_checkpoints.json"
+
+
+def file_hash(path):
+    """
+    sha1 of a file's content, read in 1MB blocks
+    """
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class Stage:
+    """
+    One unit of work of a run, e.g. training the topic model of one domain.
+    -----------------------------------------------------------------
+    Args:
+        key: unique name of the stage, e.g. "train:learn.g2.com"
+        run: callable doing the work (not needed when the stage belongs to a batch)
+        inputs: files the stage reads, their content is part of the stage's fingerprint
+        outputs: files the stage writes, the stage is re-run when one of them is missing
+        config: settings the result depends on, also part of the fingerprint
+        after: keys of the stages that have to complete first
+        batch: stages of the same batch that are ready at the same time run in one call of the batch runner
+    """
+    def __init__(self, key, run=None, inputs=(), outputs=(), config=None, after=(), batch=None):
+        self.key = key
+        self.run = run
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.config = config or {}
+        self.after = list(after)
+        self.batch = batch
+
+
+class CheckpointStore:
+    """
+    Records, in a JSON file, the fingerprint (hash of config and input files) every completed stage
+    was run with. File hashes are remembered by size and modification time so unchanged files are
+    not read again. The file is rewritten after every completed stage, so an interrupted run loses
+    at most the stage it was in.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.state = {"stages": {}, "files": {}}
+
+        if os.path.isfile(path):
+            with open(path, encoding="utf-8") as f:
+                self.state = json.load(f)
+
+    def file_hash(self, path):
+        stat = os.stat(path)
+        known = self.state["files"].get(path)
+        if known is not None and known[0] == stat.st_size and known[1] == stat.st_mtime_ns:
+            return known[2]
+
+        digest = file_hash(path)
+        self.state["files"][path] = [stat.st_size, stat.st_mtime_ns, digest]
+        return digest
+
+    def fingerprint(self, stage):
+        """
+        Returns the fingerprint of stage, or None while one of its inputs does not exist yet
+        """
+        if not all(os.path.isfile(path) for path in stage.inputs):
+            return None
+
+        digest = hashlib.sha1()
+        digest.update(json.dumps(stage.config, sort_keys=True, default=str).encode("utf-8"))
+        for path in stage.inputs:
+            digest.update(path.encode("utf-8") + b"\0" + self.file_hash(path).encode("ascii"))
+        return digest.hexdigest()
+
+    def is_up_to_date(self, stage):
+        completed = self.state["stages"].get(stage.key)
+        return (completed is not None
+                and completed["fingerprint"] == self.fingerprint(stage)
+                and all(os.path.exists(path) for path in stage.outputs))
+
+    def complete(self, stage):
+        self.state["stages"][stage.key] = {"fingerprint": self.fingerprint(stage), "completed_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        self.save()
+
+    def save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        temporary_path = self.path + ".tmp"
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, indent=1)
+        os.replace(temporary_path, self.path)
+
+
+class StageGraph:
+    """
+    Runs stages in dependency order, skipping every stage whose config, inputs and outputs did not
+    change since it last completed. A stage re-runs when it is stale or forced, and everything
+    downstream of a re-run stage re-runs as soon as its inputs change.
+    -----------------------------------------------------------------
+    Args:
+        checkpoints: the CheckpointStore of the run
+        batch_runners: {batch: callable(list of stages) -> keys of the stages that succeeded}
+        force: stage keys, or key prefixes such as "crawl", that always re-run
+    """
+    def __init__(self, checkpoints, batch_runners=None, force=()):
+        self.checkpoints = checkpoints
+        self.batch_runners = batch_runners or {}
+        self.force = set(force)
+        self.stages = {}
+
+    def add(self, stage):
+        if stage.key in self.stages:
+            raise ValueError("[ERROR]: Stage " + stage.key + " was added twice")
+        self.stages[stage.key] = stage
+        return stage
+
+    def is_forced(self, stage):
+        return stage.key in self.force or stage.key.split(":")[0] in self.force
+
+    def run(self):
+        """
+        Runs every stale stage, in waves of stages whose dependencies are done.
+
+        Returns:
+            dict: stage key -> "skipped", "completed", "failed" or "blocked" (a dependency failed)
+        """
+        for stage in self.stages.values():
+            for key in stage.after:
+                if key not in self.stages:
+                    raise ValueError("[ERROR]: Stage " + stage.key + " depends on unknown stage " + key)
+
+        status = {}
+        while len(status) < len(self.stages):
+            ready = [stage for stage in self.stages.values()
+                     if stage.key not in status and all(key in status for key in stage.after)]
+            if not ready:
+                raise ValueError("[ERROR]: Stages " + ", ".join(key for key in self.stages if key not in status) + " depend on each other")
+
+            pending = []
+            for stage in ready:
+                if any(status[key] in ("failed", "blocked") for key in stage.after):
+                    status[stage.key] = "blocked"
+                elif not self.is_forced(stage) and self.checkpoints.is_up_to_date(stage):
+                    print("[LOG]: Skipping up to date stage " + stage.key)
+                    status[stage.key] = "skipped"
+                else:
+                    pending.append(stage)
+
+            status.update(self.__run_wave(pending))
+
+        return status
+
+    def __run_wave(self, stages):
+        status = {}
+        batches = {}
+
+        for stage in stages:
+            if stage.batch is not None:
+                batches.setdefault(stage.batch, []).append(stage)
+                continue
+
+            print("[LOG]: Running stage " + stage.key)
+            try:
+                stage.run()
+                succeeded = True
+            except Exception as e:
+                print("[ERROR]: Stage " + stage.key + " failed: " + str(e))
+                succeeded = False
+            status[stage.key] = self.__finish(stage, succeeded)
+
+        for batch, batch_stages in batches.items():
+            print("[LOG]: Running stages " + ", ".join(stage.key for stage in batch_stages))
+            try:
+                succeeded = set(self.batch_runners[batch](batch_stages))
+            except Exception as e:
+                print("[ERROR]: Stages " + ", ".join(stage.key for stage in batch_stages) + " failed: " + str(e))
+                succeeded = set()
+            for stage in batch_stages:
+                status[stage.key] = self.__finish(stage, stage.key in succeeded)
+
+        return status
+
+    def __finish(self, stage, succeeded):
+        missing = [path for path in stage.outputs if not os.path.exists(path)]
+        if succeeded and missing:
+            print("[ERROR]: Stage " + stage.key + " did not write " + ", ".join(missing))
+            succeeded = False
+
+        if not succeeded:
+            return "failed"
+
+        self.checkpoints.complete(stage)
+        return "completed"
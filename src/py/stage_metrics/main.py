@@ -0,0 +1,198 @@
+import cProfile
+import io
+import json
+import os
+import platform
+import pstats
+import resource
+import sys
+import threading
+import time
+
+# Seconds between two samples of the resident memory of a running stage
+RSS_SAMPLE_INTERVAL = 0.1
+
+
+def peak_rss_mb():
+    """
+    Peak resident memory of this process so far (its high-water mark over every stage), in MB
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes everywhere else
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def current_rss_mb():
+    """
+    Resident memory of this process right now, in MB (None where /proc is not available, e.g. macOS)
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class RssSampler:
+    """
+    Samples current_rss_mb every RSS_SAMPLE_INTERVAL seconds in a background thread and keeps the
+    highest value, the peak of one stage rather than of the whole process.
+    """
+    def __init__(self, interval=RSS_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.peak = current_rss_mb()
+        self.__stopped = threading.Event()
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+
+    def start(self):
+        if self.peak is not None:
+            self.__thread.start()
+        return self
+
+    def stop(self):
+        if self.__thread.is_alive():
+            self.__stopped.set()
+            self.__thread.join()
+        self.__sample()
+        return self.peak
+
+    def __sample(self):
+        rss = current_rss_mb()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+    def __run(self):
+        while not self.__stopped.wait(self.interval):
+            self.__sample()
+
+
+def cpu_seconds():
+    """
+    CPU time (user + system) used by this process and its finished child processes
+    """
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def rounded(megabytes):
+    return None if megabytes is None else round(megabytes, 1)
+
+
+class StageTimer:
+    """
+    Measures one stage of a run: wall time, CPU time, memory and items per second.
+    Memory is reported as the resident memory at the start and end of the stage and its sampled
+    peak during the stage, next to the process high-water mark (ru_maxrss) and how much the stage raised it.
+    Use as a context manager and set .items (and optionally .details) inside it.
+    When profile_path is set the stage also runs under cProfile and its stats are written
+    to <profile_path>.prof (pstats format, readable by snakeviz, flameprof or gprof2dot)
+    and <profile_path>.txt (the 40 most expensive functions by cumulative time).
+    """
+    def __init__(self, name, profile_path=None, report=None):
+        self.name = name
+        self.profile_path = profile_path
+        self.report = report
+        self.items = None
+        self.details = {}
+        self.metrics = None
+        self.__profiler = None
+
+    def __enter__(self):
+        if self.profile_path is not None:
+            self.__profiler = cProfile.Profile()
+            self.__profiler.enable()
+
+        self.__process_peak_start = peak_rss_mb()
+        self.__rss_start = current_rss_mb()
+        self.__rss_sampler = RssSampler().start()
+        self.__cpu_start = cpu_seconds()
+        self.__wall_start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        wall = time.perf_counter() - self.__wall_start
+        cpu = cpu_seconds() - self.__cpu_start
+        stage_peak_rss = self.__rss_sampler.stop()
+        process_peak_rss = peak_rss_mb()
+
+        if self.__profiler is not None:
+            self.__profiler.disable()
+            self.__write_profile()
+
+        self.metrics = {
+            "stage": self.name,
+            "status": "error" if exc_type is not None else "ok",
+            "wall_seconds": round(wall, 3),
+            "cpu_seconds": round(cpu, 3),
+            "rss_start_mb": rounded(self.__rss_start),
+            "rss_end_mb": rounded(current_rss_mb()),
+            "stage_peak_rss_mb": rounded(stage_peak_rss),
+            "process_peak_rss_mb": round(process_peak_rss, 1),
+            "peak_rss_growth_mb": round(process_peak_rss - self.__process_peak_start, 1),
+            "items": self.items,
+            "items_per_second": round(self.items / wall, 2) if self.items and wall > 0 else None,
+            "details": self.details,
+        }
+        if self.report is not None:
+            self.report.stages.append(self.metrics)
+
+        print("[LOG]: Stage " + self.name + " took " + format(wall, ".1f") + "s wall, " + format(cpu, ".1f") + "s CPU")
+        return False
+
+    def __write_profile(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.profile_path)), exist_ok=True)
+        self.__profiler.dump_stats(self.profile_path + ".prof")
+
+        summary = io.StringIO()
+        pstats.Stats(self.__profiler, stream=summary).sort_stats("cumulative").print_stats(40)
+        with open(self.profile_path + ".txt", "w", encoding="utf-8") as f:
+            f.write(summary.getvalue())
+
+        print("[LOG]: Profile of stage " + self.name + " written to " + self.profile_path + ".prof")
+
+
+class RunReport:
+    """
+    Collects the metrics of every stage of one run and writes them as a single JSON report.
+    -----------------------------------------------------------------
+    Args:
+        command: the entry.py command being run
+        profile_stage: name of the stage to run under cProfile, if any
+        profile_directory: folder the profile files are written to
+    """
+    def __init__(self, command, profile_stage=None, profile_directory="."):
+        self.command = command
+        self.profile_stage = profile_stage
+        self.profile_directory = profile_directory
+        self.created_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+        self.stages = []
+        # stage key -> skipped / completed / failed / blocked, for runs driven by a stage_graph.StageGraph
+        self.stage_states = {}
+
+    def stage(self, name):
+        """
+        Returns a StageTimer whose metrics are added to the report when it exits
+        """
+        profile_path = None
+        if name == self.profile_stage:
+            profile_path = os.path.join(self.profile_directory, self.command + "_" + name + "_" + time.strftime("%Y%m%d_%H%M%S"))
+
+        return StageTimer(name, profile_path, self)
+
+    def to_dict(self):
+        return {
+            "command": self.command,
+            "created_at": self.created_at,
+            "machine": {"platform": platform.platform(), "python": platform.python_version(), "cpu_count": os.cpu_count()},
+            "process_peak_rss_mb": round(peak_rss_mb(), 1),
+            "stages": self.stages,
+            "stage_states": self.stage_states,
+        }
+
+    def write(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            # Scrapy stats hold datetimes, write those as strings
+            json.dump(self.to_dict(), f, indent=2, default=str)
+        print("[LOG]: Run report written to " + path)
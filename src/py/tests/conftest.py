@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The packages live in src/py and are imported the way entry.py imports them
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "recursive_spider"))
@@ -0,0 +1,61 @@
+import gzip
+import json
+import pytest
+from corpus_reader.main import CorpusReader
+
+
+def write_jl(path, records, tail=""):
+    lines = "".join(json.dumps(record) + "\n" for record in records) + tail
+    if path.endswith(".gz"):
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            f.write(lines)
+    elif path.endswith(".zst"):
+        zstandard = pytest.importorskip("zstandard")
+        with open(path, "wb") as f:
+            f.write(zstandard.ZstdCompressor().compress(lines.encode("utf-8")))
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(lines)
+    return path
+
+
+def page(i, content=None):
+    return {"content": content if content is not None else "page " + str(i), "url": "https://learn.g2.com/" + str(i)}
+
+
+def test_duplicate_content_is_read_once_across_files(tmp_path):
+    first = write_jl(str(tmp_path / "a.jl"), [page(1), page(2, "same text")])
+    second = write_jl(str(tmp_path / "b.jl"), [page(3, "same text"), page(4, ""), page(5)])
+    corpus = CorpusReader([first, second])
+
+    assert [record["url"] for record in corpus] == ["https://learn.g2.com/1", "https://learn.g2.com/2", "https://learn.g2.com/5"]
+    assert corpus.records_read == 4
+    assert corpus.duplicates_dropped == 1
+
+    assert len(list(CorpusReader([first, second], deduplicate=False))) == 4
+
+
+@pytest.mark.parametrize("name", ["pages.jl", "pages.jl.gz", "pages.jl.zst"])
+def test_compressed_files_are_read(tmp_path, name):
+    path = write_jl(str(tmp_path / name), [page(1), page(2)])
+
+    assert list(CorpusReader(path).documents()) == ["page 1", "page 2"]
+
+
+@pytest.mark.parametrize("count, sizes", [(0, []), (3, [3]), (6, [3, 3]), (7, [3, 3, 1])])
+def test_chunks_hold_at_most_chunk_size_records(tmp_path, count, sizes):
+    path = write_jl(str(tmp_path / "pages.jl"), [page(i) for i in range(count)])
+
+    chunks = list(CorpusReader(path).chunks(3))
+
+    assert [len(chunk) for chunk in chunks] == sizes
+    assert [record["content"] for chunk in chunks for record in chunk] == ["page " + str(i) for i in range(count)]
+
+
+def test_truncated_and_malformed_lines_are_skipped(tmp_path):
+    # A crawl killed while writing leaves half a record on the last line
+    path = write_jl(str(tmp_path / "pages.jl"), [page(1), ["not", "a", "record"], page(2)], tail='{"content": "page 3", "ur')
+    corpus = CorpusReader(path)
+
+    assert list(corpus.documents()) == ["page 1", "page 2"]
+    assert corpus.malformed_lines == 2
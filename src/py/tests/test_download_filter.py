@@ -0,0 +1,101 @@
+import pytest
+from recursive_spider.download_filter import DownloadFilter, compile_patterns
+
+
+def test_file_extensions_are_rejected():
+    download_filter = DownloadFilter()
+
+    assert download_filter.url_rejection("https://learn.g2.com/report.PDF") == "extension"
+    assert download_filter.url_rejection("https://learn.g2.com/logo.png?v=2") == "extension"
+    assert download_filter.url_rejection("https://learn.g2.com/post?file=a.png") is None
+    assert download_filter.url_rejection("https://learn.g2.com/crm-software") is None
+
+
+def test_include_and_exclude_patterns():
+    download_filter = DownloadFilter(include_patterns=r"^https://learn\.g2\.com/", exclude_patterns=r"/tag/ /page/\d+")
+
+    assert download_filter.url_rejection("https://learn.g2.com/tag/crm") == "pattern"
+    assert download_filter.url_rejection("https://learn.g2.com/page/3") == "pattern"
+    assert download_filter.url_rejection("https://www.g2.com/crm") == "pattern"
+    assert download_filter.url_rejection("https://learn.g2.com/crm") is None
+
+
+def test_patterns_are_compiled_into_one_regex():
+    assert compile_patterns("") is None
+    assert compile_patterns(None) is None
+    assert compile_patterns(r"/a/ /b/\d{1,3}").pattern == r"(?:/a/)|(?:/b/\d{1,3})"
+
+
+def test_headers_rejection():
+    download_filter = DownloadFilter(max_size=100)
+
+    assert download_filter.headers_rejection("text/html; charset=utf-8", 50) is None
+    assert download_filter.headers_rejection("application/pdf", None) == "content_type"
+    # Responses without a Content-Type (redirects, 304s...) are kept
+    assert download_filter.headers_rejection(None, None) is None
+    assert download_filter.headers_rejection("text/html", 101) == "size"
+
+
+def test_size_cap():
+    assert not DownloadFilter(max_size=0).is_too_large(10 ** 9)
+    assert not DownloadFilter(max_size=100).is_too_large(100)
+    assert DownloadFilter(max_size=100).is_too_large(101)
+
+
+class TestDownloadFilterMiddleware:
+    @pytest.fixture
+    def middleware(self):
+        pytest.importorskip("scrapy")
+        from scrapy import Spider
+        from scrapy.statscollectors import MemoryStatsCollector
+        from scrapy.utils.test import get_crawler
+        from recursive_spider.middlewares import DownloadFilterMiddleware
+
+        crawler = get_crawler(Spider, {"DOWNLOAD_FILTER_ENABLED": True, "DOWNLOAD_FILTER_MAX_SIZE": 10})
+        crawler.spider = Spider("test")
+        # Newer scrapy versions only create the stats collector when the crawl starts
+        if crawler.stats is None:
+            crawler.stats = MemoryStatsCollector(crawler)
+        return DownloadFilterMiddleware.from_crawler(crawler), crawler
+
+    def test_large_body_is_stopped_and_ignored(self, middleware):
+        from scrapy import Request
+        from scrapy.exceptions import IgnoreRequest, StopDownload
+
+        middleware, crawler = middleware
+        request = Request("https://learn.g2.com/big", meta={"depth": 1})
+        middleware.process_request(request, crawler.spider)
+
+        middleware.bytes_received(b"x" * 6, request, crawler.spider)
+        with pytest.raises(StopDownload):
+            middleware.bytes_received(b"x" * 6, request, crawler.spider)
+        assert crawler.stats.get_value("download_filter/stopped/size") == 1
+
+        with pytest.raises(IgnoreRequest):
+            middleware.process_exception(request, StopDownload(fail=True), crawler.spider)
+
+    def test_retried_request_counts_from_zero(self, middleware):
+        from scrapy import Request
+
+        middleware, crawler = middleware
+        request = Request("https://learn.g2.com/page", meta={"depth": 1})
+        middleware.process_request(request, crawler.spider)
+        middleware.bytes_received(b"x" * 8, request, crawler.spider)
+
+        # RetryMiddleware and RedirectMiddleware copy the meta into the new request
+        retry = request.replace(dont_filter=True)
+        middleware.process_request(retry, crawler.spider)
+        middleware.bytes_received(b"x" * 8, retry, crawler.spider)
+
+        assert retry.meta["download_filter_received"] == 8
+
+    def test_non_html_response_is_stopped(self, middleware):
+        from scrapy import Request
+        from scrapy.exceptions import StopDownload
+        from scrapy.http import Headers
+
+        middleware, crawler = middleware
+        request = Request("https://learn.g2.com/file", meta={"depth": 1})
+        with pytest.raises(StopDownload):
+            middleware.headers_received(Headers({"Content-Type": "application/pdf"}), -1, request, crawler.spider)
+        assert request.meta["download_filter_stopped"] == "content_type"
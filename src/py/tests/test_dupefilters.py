@@ -0,0 +1,83 @@
+import os
+import pytest
+
+pytest.importorskip("scrapy")
+
+from scrapy import Request
+from scrapy.utils.request import RequestFingerprinter
+from recursive_spider.dupefilters import BloomDupeFilter, BloomFilter, ScalableBloomFilter
+
+
+def keys(prefix, count):
+    return [(prefix + str(i)).encode("ascii") for i in range(count)]
+
+
+def false_positive_rate(bloom, count=20000):
+    return sum(key in bloom for key in keys("absent-", count)) / count
+
+
+def test_bloom_filter_stays_near_its_error_rate_at_capacity():
+    bloom = BloomFilter(10000, 0.01)
+    for key in keys("url-", 10000):
+        bloom.add(key)
+
+    assert all(key in bloom for key in keys("url-", 10000))
+    assert false_positive_rate(bloom) < 0.02
+
+
+def test_scalable_bloom_filter_grows_past_its_initial_capacity():
+    bloom = ScalableBloomFilter(initial_capacity=1000, error_rate=0.01)
+    added = sum(bloom.add(key) for key in keys("url-", 10000))
+
+    # 1000 + 2000 + 4000 + 8000 keys fit in four filters
+    assert len(bloom.filters) == 4
+    assert all(key in bloom for key in keys("url-", 10000))
+    # A key wrongly seen as present is not added, which stays within the error rate
+    assert len(bloom) == added > 10000 * (1 - 0.01)
+    assert false_positive_rate(bloom) < 0.01
+
+
+def test_scalable_bloom_filter_add_reports_new_keys_only():
+    bloom = ScalableBloomFilter(initial_capacity=10)
+
+    assert bloom.add(b"a") is True
+    assert bloom.add(b"a") is False
+    assert len(bloom) == 1
+
+
+def dupefilter(path=None):
+    return BloomDupeFilter(path, capacity=1000, error_rate=0.001, fingerprinter=RequestFingerprinter())
+
+
+def test_request_seen_after_the_first_request_of_a_url():
+    dupes = dupefilter()
+
+    assert not dupes.request_seen(Request("https://learn.g2.com/a"))
+    assert dupes.request_seen(Request("https://learn.g2.com/a"))
+    # Fingerprints canonicalize the url, query argument order does not matter
+    assert not dupes.request_seen(Request("https://learn.g2.com/b?x=1&y=2"))
+    assert dupes.request_seen(Request("https://learn.g2.com/b?y=2&x=1"))
+
+
+def test_paused_crawl_resumes_with_its_seen_urls(tmp_path):
+    dupes = dupefilter(str(tmp_path))
+    dupes.request_seen(Request("https://learn.g2.com/a"))
+    dupes.close("shutdown")
+
+    assert os.path.isfile(str(tmp_path / BloomDupeFilter.FILE_NAME))
+
+    resumed = dupefilter(str(tmp_path))
+    assert resumed.request_seen(Request("https://learn.g2.com/a"))
+    assert not resumed.request_seen(Request("https://learn.g2.com/b"))
+
+
+def test_finished_crawl_removes_its_seen_urls(tmp_path):
+    dupes = dupefilter(str(tmp_path))
+    dupes.request_seen(Request("https://learn.g2.com/a"))
+    dupes.close("shutdown")
+
+    resumed = dupefilter(str(tmp_path))
+    resumed.close("finished")
+
+    assert not os.path.exists(str(tmp_path / BloomDupeFilter.FILE_NAME))
+    assert not dupefilter(str(tmp_path)).request_seen(Request("https://learn.g2.com/a"))
@@ -0,0 +1,48 @@
+import os
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from embedding_cache.main import EmbeddingCache
+
+
+class CountingModel:
+    """
+    Stands in for the sentence-transformer: one vector per document from its length, counting what is encoded
+    """
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, docs, **kwargs):
+        self.encoded.extend(docs)
+        return np.array([[len(doc), 1.0] for doc in docs], dtype=np.float32)
+
+
+def cache_with_model(directory):
+    cache = EmbeddingCache(directory, model_name="counting")
+    cache._embedding_model = CountingModel()
+    return cache
+
+
+def test_cached_documents_are_not_encoded_again(tmp_path):
+    cache = cache_with_model(str(tmp_path))
+    cache.embed(["a", "bb"])
+
+    reopened = cache_with_model(str(tmp_path))
+    embeddings = reopened.embed(["bb", "a"])
+
+    assert reopened.embedding_model.encoded == []
+    assert embeddings.tolist() == [[2.0, 1.0], [1.0, 1.0]]
+
+
+def test_documents_embedded_without_store_are_not_cached(tmp_path):
+    cache = cache_with_model(str(tmp_path))
+    cache.embed(["a"])
+    index_mtime = os.path.getmtime(cache.index_path)
+
+    embeddings = cache.embed(["ccc", "a", "ccc"], store=False)
+
+    assert embeddings.tolist() == [[3.0, 1.0], [1.0, 1.0], [3.0, 1.0]]
+    assert cache.embedding_model.encoded == ["a", "ccc"]
+    assert list(cache.index) == [cache.key("a")]
+    assert os.path.getmtime(cache.index_path) == index_mtime
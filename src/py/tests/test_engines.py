@@ -0,0 +1,78 @@
+import time
+import types
+import pytest
+
+pytest.importorskip("numpy")
+
+from bertopic_wrapper.engines import TimedComponent, component_timings, step_timings
+
+
+class SlowModel:
+    def fit(self, X, y=None):
+        time.sleep(0.02)
+        return self
+
+    def transform(self, X):
+        time.sleep(0.01)
+        return X
+
+
+def test_timed_component_times_calls_and_hands_back_itself():
+    component = TimedComponent("reduction_model", SlowModel())
+
+    assert component.fit([1]) is component
+    assert component.transform([1]) == [1]
+    assert component.timings["fit"] >= 0.02
+    assert component.timings["transform"] >= 0.01
+
+
+def test_step_timings_split_fit_transform():
+    reduction = TimedComponent("reduction_model", SlowModel())
+    clustering = TimedComponent("clustering_model", SlowModel())
+    reduction.fit([1])
+    clustering.fit([1])
+    topic_model = types.SimpleNamespace(umap_model=reduction, hdbscan_model=clustering)
+
+    steps = step_timings(topic_model, 1.0)
+
+    assert set(steps) == {"reduction", "clustering", "other"}
+    assert steps["other"] == pytest.approx(1.0 - steps["reduction"] - steps["clustering"], abs=0.002)
+    assert set(component_timings(topic_model)) == {"reduction_model", "clustering_model"}
+
+
+def test_untimed_components_report_no_steps():
+    topic_model = types.SimpleNamespace(umap_model=SlowModel(), hdbscan_model=SlowModel())
+
+    assert step_timings(topic_model, 1.0) == {}
+
+
+def test_default_components_are_timed_and_stay_umap_and_hdbscan():
+    pytest.importorskip("umap")
+    hdbscan = pytest.importorskip("hdbscan")
+    import numpy as np
+    from umap import UMAP
+    from bertopic_wrapper.engines import build_default_components
+
+    umap_model, hdbscan_model = build_default_components(min_topic_size=5)
+    embeddings = np.random.default_rng(0).normal(size=(200, 16))
+
+    hdbscan_model.fit(umap_model.fit(embeddings).transform(embeddings))
+
+    # BERTopic only computes HDBSCAN probabilities for HDBSCAN instances
+    assert isinstance(umap_model, UMAP) and isinstance(hdbscan_model, hdbscan.HDBSCAN)
+    topic_model = types.SimpleNamespace(umap_model=umap_model, hdbscan_model=hdbscan_model)
+    assert set(step_timings(topic_model, 100.0)) == {"reduction", "clustering", "other"}
+    assert set(component_timings(topic_model)) == {"reduction_model", "clustering_model"}
+    assert set(umap_model.timings) == {"fit", "transform"}
+
+
+def test_nested_timed_calls_are_counted_once():
+    pytest.importorskip("hdbscan")
+    import numpy as np
+    from bertopic_wrapper.engines import build_default_components
+
+    _, hdbscan_model = build_default_components(min_topic_size=5)
+    hdbscan_model.fit_predict(np.random.default_rng(0).normal(size=(100, 2)))
+
+    # fit_predict calls fit, its seconds are only counted under fit_predict
+    assert set(hdbscan_model.timings) == {"fit_predict"}
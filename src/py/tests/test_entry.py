@@ -0,0 +1,13 @@
+import entry
+
+
+def test_visualize_runs_without_a_config_option(tmp_path):
+    args = entry.build_parser().parse_args(["visualize", "-m", "model.bin", "-o", str(tmp_path)])
+
+    assert not hasattr(args, "config")
+    assert entry.default_report_path(args).startswith(str(tmp_path / "reports" / "visualize_"))
+
+
+def test_missing_config_file_is_reported(tmp_path, capsys):
+    assert entry.main(["only-scrape", "-c", str(tmp_path / "missing.ini")]) == 1
+    assert "Could not find given file" in capsys.readouterr().out
@@ -0,0 +1,24 @@
+import pytest
+
+pytest.importorskip("scrapy")
+
+from scrapy.utils.test import get_crawler
+import recursive_spider.spiders.MainSpider as main_spider
+
+
+@pytest.mark.parametrize("fast", [True, False])
+def test_text_extractor_is_built_once_from_the_setting(monkeypatch, fast):
+    built = []
+
+    class CountingExtractor(main_spider.TextExtractor):
+        def __init__(self, css_selector, fast=False):
+            built.append(fast)
+            super().__init__(css_selector, fast)
+
+    monkeypatch.setattr(main_spider, "TextExtractor", CountingExtractor)
+    crawler = get_crawler(main_spider.MainSpider, {"FAST_EXTRACTOR": fast})
+
+    spider = main_spider.MainSpider.from_crawler(crawler, url="learn.g2.com", css_selector="p")
+
+    assert built == [fast]
+    assert (spider.text_extractor.compiled_xpath is not None) is fast
@@ -0,0 +1,81 @@
+import pytest
+
+pytest.importorskip("scrapy")
+
+from scrapy import Request
+from scrapy.http import HtmlResponse
+from recursive_spider.page_state import ChangedPagesFilter, PageStateStore, hash_bytes
+from recursive_spider.spiders.MainSpider import MainSpider
+
+PAGE = b'<html><body><p>page a</p><a href="https://learn.g2.com/b">b</a></body></html>'
+
+
+def test_page_state_is_kept_across_crawls(tmp_path):
+    path = str(tmp_path / "state" / "learn_g2_com_page_state.sqlite")
+    store = PageStateStore(path)
+    store.put("https://learn.g2.com/a", '"v1"', None, "hash", "page a", ["https://learn.g2.com/b"])
+    store.close()
+
+    store = PageStateStore(path)
+    assert store.get("https://learn.g2.com/a") == {
+        "etag": '"v1"',
+        "last_modified": None,
+        "body_hash": "hash",
+        "content": "page a",
+        "links": ["https://learn.g2.com/b"],
+    }
+    assert store.get("https://learn.g2.com/never-crawled") is None
+    store.close()
+
+
+def test_changed_pages_filter_drops_unchanged_pages_only():
+    changed = ChangedPagesFilter()
+
+    assert changed.accepts({"content": "a", "url": "u", "changed": True})
+    assert not changed.accepts({"content": "a", "url": "u", "changed": False})
+    # Items of a crawl that is not incremental have no marker
+    assert changed.accepts({"content": "a", "url": "u"})
+
+
+def crawl_page(spider, status=200, body=PAGE):
+    url = "https://learn.g2.com/a"
+    response = HtmlResponse(url, status=status, body=body, request=Request(url), encoding="utf-8")
+    items = [output for output in spider.parse(response) if isinstance(output, dict)]
+    links = [output.url for output in spider.parse(response) if isinstance(output, Request)]
+    return items, links
+
+
+@pytest.fixture
+def spider(tmp_path):
+    spider = MainSpider("https://learn.g2.com/", "p")
+    spider.page_state = PageStateStore(str(tmp_path / "state.sqlite"))
+    yield spider
+    spider.page_state.close()
+
+
+def test_new_page_is_parsed_and_remembered(spider):
+    items, links = crawl_page(spider)
+
+    assert [(item["content"].strip(), item["changed"]) for item in items] == [("page a", True)]
+    assert links == ["https://learn.g2.com/b"]
+    assert spider.page_state.get("https://learn.g2.com/a")["body_hash"] == hash_bytes(PAGE)
+
+
+@pytest.mark.parametrize("status, body", [(304, b""), (200, PAGE)])
+def test_unchanged_page_reuses_its_stored_content_and_links(spider, status, body):
+    spider.page_state.put("https://learn.g2.com/a", '"v1"', None, hash_bytes(PAGE), "stored page a", ["https://learn.g2.com/stored"])
+
+    items, links = crawl_page(spider, status, body)
+
+    # Still written to the domain's snapshot, but marked so it stays out of the changes feed
+    assert items == [{"content": "stored page a", "url": "https://learn.g2.com/a", "changed": False}]
+    assert links == ["https://learn.g2.com/stored"]
+
+
+def test_changed_page_is_parsed_again(spider):
+    spider.page_state.put("https://learn.g2.com/a", None, None, "old hash", "old page a", [])
+
+    items, links = crawl_page(spider)
+
+    assert [(item["content"].strip(), item["changed"]) for item in items] == [("page a", True)]
+    assert links == ["https://learn.g2.com/b"]
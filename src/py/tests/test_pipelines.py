@@ -0,0 +1,70 @@
+import pytest
+
+pytest.importorskip("scrapy")
+
+from scrapy import Spider
+from scrapy.exceptions import DropItem, NotConfigured
+from scrapy.statscollectors import MemoryStatsCollector
+from scrapy.utils.test import get_crawler
+import recursive_spider.pipelines as pipelines
+from recursive_spider.pipelines import NearDuplicatePipeline, simhash
+
+WORDS = ("topic model pages are crawled from every domain and their text is clustered into topics that "
+         "describe what the domain writes about so marketing teams can compare their content with the "
+         "content of other domains and find the subjects they never covered before while keybert adds "
+         "the keywords of each topic from its most representative pages").split()
+
+
+def near_duplicate_pipeline(threshold):
+    crawler = get_crawler(Spider, {"NEAR_DUPLICATE_THRESHOLD": threshold})
+    crawler.spider = Spider("test")
+    # Newer scrapy versions only create the stats collector when the crawl starts
+    if crawler.stats is None:
+        crawler.stats = MemoryStatsCollector(crawler)
+    return NearDuplicatePipeline.from_crawler(crawler), crawler
+
+
+def kept(pipeline, crawler, contents):
+    result = []
+    for url, content in enumerate(contents):
+        try:
+            result.append(pipeline.process_item({"content": content, "url": str(url)}, crawler.spider)["url"])
+        except DropItem:
+            pass
+    return result
+
+
+def test_exact_and_near_duplicates_are_dropped():
+    pipeline, crawler = near_duplicate_pipeline(0.9)
+    text = " ".join(WORDS)
+    one_word_changed = " ".join(WORDS[:30] + ["websites"] + WORDS[31:])
+    other = "a completely different page about pricing plans enterprise support and the yearly discount"
+
+    assert kept(pipeline, crawler, [text, text, one_word_changed, other]) == ["0", "3"]
+    assert crawler.stats.get_value("near_duplicate/dropped") == 2
+    assert crawler.stats.get_value("near_duplicate/kept") == 2
+    assert pipeline.dropped == 2
+
+
+@pytest.mark.parametrize("distance, dropped", [(5, True), (6, True), (7, False), (12, False)])
+def test_threshold_is_a_hamming_distance(monkeypatch, distance, dropped):
+    # 0.9 of 64 bits allows 6 differing bits; the differing bits span several bands, so banding must still find the pair
+    fingerprints = {"first": 0, "second": sum(1 << (bit * 5) for bit in range(distance))}
+    monkeypatch.setattr(pipelines, "simhash", fingerprints.get)
+    pipeline, crawler = near_duplicate_pipeline(0.9)
+
+    assert pipeline.max_distance == 6
+    assert kept(pipeline, crawler, ["first", "second"]) == (["0"] if dropped else ["0", "1"])
+
+
+def test_zero_threshold_disables_the_pipeline():
+    with pytest.raises(NotConfigured):
+        near_duplicate_pipeline(0)
+
+
+def test_simhash_of_similar_texts_is_close():
+    text = " ".join(WORDS)
+    distance = bin(simhash(text) ^ simhash(" ".join(WORDS[:30] + ["websites"] + WORDS[31:]))).count("1")
+
+    assert simhash(text) == simhash(text.upper())
+    assert distance <= 6
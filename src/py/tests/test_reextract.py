@@ -0,0 +1,30 @@
+import json
+import pytest
+
+pytest.importorskip("scrapy")
+
+from recursive_spider.archive import ResponseArchive
+from recursive_spider.reextract import is_on_domain, reextract
+
+
+def test_is_on_domain_accepts_subdomains_only():
+    assert is_on_domain("https://learn.g2.com/a", "learn.g2.com")
+    assert is_on_domain("https://blog.learn.g2.com/a", "learn.g2.com")
+    assert not is_on_domain("https://notlearn.g2.com/a", "learn.g2.com")
+    assert not is_on_domain("https://www.hubspot.com/a", "learn.g2.com")
+
+
+def test_shared_archive_is_re_extracted_per_domain(tmp_path):
+    archive = ResponseArchive(str(tmp_path / "archive"))
+    headers = {"Content-Type": "text/html; charset=utf-8"}
+    archive.put("https://learn.g2.com/a", 200, headers, b"<html><body><p>g2 page</p></body></html>")
+    archive.put("https://www.hubspot.com/b", 200, headers, b"<html><body><p>hubspot page</p></body></html>")
+    archive.close()
+
+    output_path = str(tmp_path / "learn_g2_com.jl")
+    result = reextract(str(tmp_path / "archive"), "p", output_path, workers=1, domain="learn.g2.com")
+
+    with open(output_path, encoding="utf-8") as f:
+        items = [json.loads(line) for line in f]
+    assert result["items"] == 1
+    assert [item["url"] for item in items] == ["https://learn.g2.com/a"]
@@ -0,0 +1,48 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+import bertopic_wrapper.scheduler as scheduler
+from bertopic_wrapper.scheduler import THREAD_LIMIT_ENV_VARS, thread_limited_environment
+
+
+def startup_environment():
+    return {env_var: os.environ.get(env_var) for env_var in THREAD_LIMIT_ENV_VARS}
+
+
+def test_caps_are_restored_after_the_block(monkeypatch):
+    monkeypatch.setenv("OMP_NUM_THREADS", "8")
+    monkeypatch.delenv("MKL_NUM_THREADS", raising=False)
+
+    with thread_limited_environment(2):
+        assert os.environ["OMP_NUM_THREADS"] == "2"
+        assert os.environ["MKL_NUM_THREADS"] == "2"
+
+    assert os.environ["OMP_NUM_THREADS"] == "8"
+    assert "MKL_NUM_THREADS" not in os.environ
+
+
+def test_spawned_workers_start_with_the_caps():
+    with thread_limited_environment(3), \
+         ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        environment = pool.submit(startup_environment).result()
+
+    assert set(environment.values()) == {"3"}
+
+
+def test_failed_domain_is_reported_with_its_traceback(monkeypatch):
+    def train_domain(task, embedding_cache=None, training_settings=None):
+        if task.section == "broken.com":
+            raise ValueError("no documents")
+        return task.section, ["doc"], None, {"items": 1}
+
+    monkeypatch.setattr(scheduler, "train_domain", train_domain)
+    tasks = [scheduler.TrainingTask(section, section + ".jl", "out", "individual_domain", "")
+             for section in ["learn.g2.com", "broken.com"]]
+    training_scheduler = scheduler.TrainingScheduler(None, {}, workers=1, threads_per_worker=1)
+
+    finished = training_scheduler.run(tasks)
+
+    assert list(finished) == ["learn.g2.com"]
+    assert list(training_scheduler.failed) == ["broken.com"]
+    assert "Traceback" in training_scheduler.failed["broken.com"]
+    assert "ValueError: no documents" in training_scheduler.failed["broken.com"]
@@ -0,0 +1,204 @@
+import configparser
+import http.server
+import json
+import os
+import subprocess
+import sys
+import threading
+import pytest
+from urllib.parse import urlparse
+
+pytest.importorskip("scrapy")
+
+import scrapy_wrapper.main as spider
+
+
+def crawler(general="", domain=""):
+    config = configparser.ConfigParser()
+    config.optionxform = str
+    config.read_string("[General Settings]\n" + general + "\n[learn.g2.com]\nCSS_SELECTORS=\"p\"\n" + domain
+                       + "\n[www.hubspot.com]\nCSS_SELECTORS=\"p\"\n")
+    return spider.MultiDomainCrawler(config)
+
+
+def output_path(tmp_path, name):
+    return str(tmp_path / name / (name + ".jl"))
+
+
+def test_archive_defaults_next_to_the_domain_data(tmp_path):
+    path = output_path(tmp_path, "learn_g2_com")
+
+    assert crawler().section_archive_directory("learn.g2.com", path) == os.path.splitext(path)[0] + "_archive"
+
+
+def test_general_archive_directory_is_split_per_domain(tmp_path):
+    multi = crawler(general="RESPONSE_ARCHIVE_DIR=" + str(tmp_path / "archives"))
+
+    first = multi.section_archive_directory("learn.g2.com", output_path(tmp_path, "learn_g2_com"))
+    second = multi.section_archive_directory("www.hubspot.com", output_path(tmp_path, "www_hubspot_com"))
+
+    assert first != second
+    assert os.path.dirname(first) == os.path.dirname(second) == str(tmp_path / "archives")
+
+
+def test_domain_archive_directory_is_used_as_is(tmp_path):
+    multi = crawler(domain="RESPONSE_ARCHIVE_DIR=" + str(tmp_path / "mine"))
+
+    assert multi.section_archive_directory("learn.g2.com", output_path(tmp_path, "learn_g2_com")) == str(tmp_path / "mine")
+
+
+def test_general_jobdir_is_split_per_domain(tmp_path):
+    multi = crawler(general="JOBDIR=" + str(tmp_path / "jobs"))
+
+    first = multi.section_settings("learn.g2.com", output_path(tmp_path, "learn_g2_com"), 16).get("JOBDIR")
+    second = multi.section_settings("www.hubspot.com", output_path(tmp_path, "www_hubspot_com"), 16).get("JOBDIR")
+
+    assert first != second
+    assert first.startswith(str(tmp_path / "jobs"))
+
+
+def test_disk_frontier_keeps_the_jobdir_next_to_the_domain_data(tmp_path):
+    path = output_path(tmp_path, "learn_g2_com")
+
+    settings = crawler(general="DISK_FRONTIER=True").section_settings("learn.g2.com", path, 16)
+
+    assert settings.get("JOBDIR") == os.path.splitext(path)[0] + "_jobdir"
+
+
+def test_general_page_state_db_is_split_per_domain(tmp_path):
+    multi = crawler(general="INCREMENTAL_CRAWL=True\nPAGE_STATE_DB=" + str(tmp_path / "state"))
+
+    first = multi.section_settings("learn.g2.com", output_path(tmp_path, "learn_g2_com"), 16).get("PAGE_STATE_DB")
+    second = multi.section_settings("www.hubspot.com", output_path(tmp_path, "www_hubspot_com"), 16).get("PAGE_STATE_DB")
+
+    assert first == str(tmp_path / "state" / "learn_g2_com_page_state.sqlite")
+    assert second == str(tmp_path / "state" / "www_hubspot_com_page_state.sqlite")
+
+
+def test_paused_crawl_appends_to_its_items(tmp_path):
+    path = output_path(tmp_path, "learn_g2_com")
+    multi = crawler(general="DISK_FRONTIER=True")
+
+    assert multi.section_settings("learn.g2.com", path, 16).get("FEEDS")[path]["overwrite"] is True
+
+    jobdir = os.path.splitext(path)[0] + "_jobdir"
+    os.makedirs(jobdir)
+    with open(os.path.join(jobdir, "requests.seen"), "w") as f:
+        f.write("fingerprint\n")
+
+    assert multi.section_settings("learn.g2.com", path, 16).get("FEEDS")[path]["overwrite"] is False
+
+
+@pytest.mark.parametrize("value, enabled", [("True", True), ("yes", True), ("on", True), ("1", True),
+                                            ("False", False), ("no", False), ("off", False)])
+def test_every_flag_accepts_the_same_values(tmp_path, value, enabled):
+    flags = ["INCREMENTAL_CRAWL", "FAST_EXTRACTOR", "ARCHIVE_RESPONSES", "ADAPTIVE_THROTTLE_ENABLED", "DOWNLOAD_FILTER_ENABLED"]
+    multi = crawler(general="\n".join(flag + "=" + value for flag in flags + ["DISK_FRONTIER"]))
+
+    settings = multi.section_settings("learn.g2.com", output_path(tmp_path, "learn_g2_com"), 16)
+
+    assert [settings.getbool(flag) for flag in flags] == [enabled] * len(flags)
+    assert multi.section_flag("learn.g2.com", "DISK_FRONTIER") is enabled
+
+
+def test_incremental_crawl_writes_changed_pages_to_their_own_feed(tmp_path):
+    path = output_path(tmp_path, "learn_g2_com")
+    changes_path = os.path.splitext(path)[0] + "_changes.jl"
+
+    feeds = crawler(general="INCREMENTAL_CRAWL=True").section_settings("learn.g2.com", path, 16).get("FEEDS")
+    assert set(feeds) == {path, changes_path}
+    assert "item_filter" not in feeds[path]
+    assert feeds[changes_path]["item_filter"] == "recursive_spider.page_state.ChangedPagesFilter"
+
+    feeds = crawler(general="INCREMENTAL_CRAWL=True\nINCREMENTAL_EMIT=snapshot").section_settings("learn.g2.com", path, 16).get("FEEDS")
+    assert set(feeds) == {path}
+
+
+PAGES = {
+    "/": '<a href="/a">a</a><a href="/b">b</a><p>home</p>',
+    "/a": '<a href="/b">b</a><p>page a</p>',
+    "/b": '<p>page b</p>',
+}
+
+
+class SiteHandler(http.server.BaseHTTPRequestHandler):
+    # Answers as the http proxy of a site without a port in its urls (allowed_domains does not match ports)
+    def do_GET(self):
+        page = PAGES.get(urlparse(self.path).path)
+        body = ("<html><body>" + page + "</body></html>").encode("utf-8") if page is not None else b""
+        self.send_response(200 if page is not None else 404)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def site_proxy():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), SiteHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield "http://127.0.0.1:" + str(server.server_address[1])
+    server.shutdown()
+    server.server_close()
+
+
+CRAWL_SCRIPT = """
+import configparser, sys
+import scrapy_wrapper.main as spider
+config = configparser.ConfigParser()
+config.read(sys.argv[1])
+spider.MultiDomainCrawler(config).crawl({sys.argv[2]: sys.argv[3]})
+"""
+
+
+def read_contents(path):
+    with open(path, encoding="utf-8") as f:
+        return sorted(json.loads(line)["content"].strip() for line in f)
+
+
+def crawl_in_subprocess(config_path, section, path, proxy):
+    # A twisted reactor cannot be started twice, so every crawl gets its own process
+    subprocess.run([sys.executable, "-c", CRAWL_SCRIPT, config_path, section, path],
+                   cwd=os.path.dirname(os.path.dirname(spider.__file__)), check=True, timeout=60,
+                   env=dict(os.environ, http_proxy=proxy, no_proxy=""),
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return read_contents(path)
+
+
+def write_site_config(tmp_path, site, settings):
+    config_path = str(tmp_path / "config.ini")
+    with open(config_path, "w", encoding="utf-8") as f:
+        f.write("[General Settings]\n" + settings + "DOWNLOAD_DELAY=0\nADAPTIVE_THROTTLE_MIN_DELAY=0\n"
+                "[" + site + "]\nCSS_SELECTORS=\"p\"\n")
+    return config_path
+
+
+def test_disk_frontier_crawls_everything_again_on_the_next_run(tmp_path, site_proxy):
+    site = "http://site.test/"
+    config_path = write_site_config(tmp_path, site, "DISK_FRONTIER=True\n")
+    path = output_path(tmp_path, "site")
+    os.makedirs(os.path.dirname(path))
+
+    assert crawl_in_subprocess(config_path, site, path, site_proxy) == ["home", "page a", "page b"]
+    assert not os.path.exists(os.path.splitext(path)[0] + "_jobdir")
+
+    # The second crawl neither finds its links already seen nor loses the first crawl's pages
+    assert crawl_in_subprocess(config_path, site, path, site_proxy) == ["home", "page a", "page b"]
+
+
+def test_incremental_recrawl_keeps_the_full_snapshot(tmp_path, site_proxy):
+    site = "http://site.test/"
+    config_path = write_site_config(tmp_path, site, "INCREMENTAL_CRAWL=True\n")
+    path = output_path(tmp_path, "site")
+    os.makedirs(os.path.dirname(path))
+    changes_path = os.path.splitext(path)[0] + "_changes.jl"
+
+    assert crawl_in_subprocess(config_path, site, path, site_proxy) == ["home", "page a", "page b"]
+    assert read_contents(changes_path) == ["home", "page a", "page b"]
+
+    # Nothing changed: the pages come from the page state store, the snapshot stays complete
+    assert crawl_in_subprocess(config_path, site, path, site_proxy) == ["home", "page a", "page b"]
+    assert read_contents(changes_path) == []
@@ -0,0 +1,150 @@
+import json
+import os
+from stage_graph.main import CheckpointStore, Stage, StageGraph
+
+
+def write(path, text="x"):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+class Pipeline:
+    """
+    crawl (batch) -> train -> keybert over files in a temporary folder, counting how often each stage runs
+    """
+    def __init__(self, directory, fail=()):
+        self.directory = directory
+        self.fail = set(fail)
+        self.pages = "pages"
+        self.runs = []
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def crawl(self, stages):
+        self.runs.extend(stage.key for stage in stages)
+        for stage in stages:
+            write(stage.outputs[0], self.pages)
+        return [stage.key for stage in stages if stage.key not in self.fail]
+
+    def stage(self, key, output):
+        def run():
+            self.runs.append(key)
+            if key in self.fail:
+                raise RuntimeError("boom")
+            write(self.path(output))
+        return run
+
+    def graph(self, force=(), config=None):
+        graph = StageGraph(CheckpointStore(self.path("checkpoints.json")), {"crawl": self.crawl}, force)
+        graph.add(Stage("crawl:a", outputs=[self.path("a.jl")], config=config, batch="crawl"))
+        graph.add(Stage("train:a", run=self.stage("train:a", "a.docs"), inputs=[self.path("a.jl")],
+                        outputs=[self.path("a.docs")], after=["crawl:a"]))
+        graph.add(Stage("keybert:a", run=self.stage("keybert:a", "a.keywords"), inputs=[self.path("a.docs")],
+                        outputs=[self.path("a.keywords")], after=["train:a"]))
+        return graph
+
+
+def test_first_run_completes_every_stage(tmp_path):
+    pipeline = Pipeline(str(tmp_path))
+
+    status = pipeline.graph().run()
+
+    assert status == {"crawl:a": "completed", "train:a": "completed", "keybert:a": "completed"}
+    assert pipeline.runs == ["crawl:a", "train:a", "keybert:a"]
+    with open(pipeline.path("checkpoints.json"), encoding="utf-8") as f:
+        assert set(json.load(f)["stages"]) == {"crawl:a", "train:a", "keybert:a"}
+
+
+def test_up_to_date_stages_are_skipped(tmp_path):
+    pipeline = Pipeline(str(tmp_path))
+    pipeline.graph().run()
+    pipeline.runs.clear()
+
+    status = pipeline.graph().run()
+
+    assert set(status.values()) == {"skipped"}
+    assert pipeline.runs == []
+
+
+def test_changed_config_reruns_the_stage(tmp_path):
+    pipeline = Pipeline(str(tmp_path))
+    pipeline.graph(config={"DEPTH_LIMIT": 50}).run()
+    pipeline.runs.clear()
+
+    status = pipeline.graph(config={"DEPTH_LIMIT": 10}).run()
+
+    # The crawl rewrites a.jl with the same content, so nothing downstream has to re-run
+    assert status == {"crawl:a": "completed", "train:a": "skipped", "keybert:a": "skipped"}
+
+
+def test_forced_stage_reruns_and_changed_output_reruns_downstream(tmp_path):
+    pipeline = Pipeline(str(tmp_path))
+    pipeline.graph().run()
+    pipeline.runs.clear()
+
+    status = pipeline.graph(force=["train"]).run()
+    assert status == {"crawl:a": "skipped", "train:a": "completed", "keybert:a": "skipped"}
+    assert pipeline.runs == ["train:a"]
+
+    pipeline.pages = "other pages"
+    pipeline.runs.clear()
+    status = pipeline.graph(force=["crawl:a"]).run()
+    assert pipeline.runs == ["crawl:a", "train:a"]
+    assert status["keybert:a"] == "skipped"
+
+
+def test_failed_stage_blocks_downstream_and_resumes(tmp_path):
+    pipeline = Pipeline(str(tmp_path), fail=["train:a"])
+
+    status = pipeline.graph().run()
+    assert status == {"crawl:a": "completed", "train:a": "failed", "keybert:a": "blocked"}
+
+    pipeline.fail.clear()
+    pipeline.runs.clear()
+    status = pipeline.graph().run()
+
+    # The completed crawl is not repeated, the run picks up at the failed stage
+    assert status == {"crawl:a": "skipped", "train:a": "completed", "keybert:a": "completed"}
+    assert pipeline.runs == ["train:a", "keybert:a"]
+
+
+def test_failed_batch_member_is_not_recorded(tmp_path):
+    pipeline = Pipeline(str(tmp_path), fail=["crawl:a"])
+
+    status = pipeline.graph().run()
+
+    assert status == {"crawl:a": "failed", "train:a": "blocked", "keybert:a": "blocked"}
+    assert not os.path.exists(pipeline.path("checkpoints.json"))
+
+
+def test_missing_output_reruns_the_stage(tmp_path):
+    pipeline = Pipeline(str(tmp_path))
+    pipeline.graph().run()
+    os.remove(pipeline.path("a.keywords"))
+    pipeline.runs.clear()
+
+    status = pipeline.graph().run()
+
+    assert status == {"crawl:a": "skipped", "train:a": "skipped", "keybert:a": "completed"}
+
+
+def test_stage_that_does_not_write_its_output_fails(tmp_path):
+    pipeline = Pipeline(str(tmp_path))
+    graph = StageGraph(CheckpointStore(pipeline.path("checkpoints.json")))
+    graph.add(Stage("noop", run=lambda: None, outputs=[pipeline.path("never_written")]))
+
+    assert graph.run() == {"noop": "failed"}
+
+
+def test_file_hashes_are_memoized_by_size_and_mtime(tmp_path):
+    path = str(tmp_path / "input.jl")
+    write(path, "abc")
+    store = CheckpointStore(str(tmp_path / "checkpoints.json"))
+
+    first = store.file_hash(path)
+    store.state["files"][path][2] = "remembered"
+    assert store.file_hash(path) == "remembered"
+
+    write(path, "abcd")
+    assert store.file_hash(path) not in (first, "remembered")
@@ -0,0 +1,51 @@
+import json
+import time
+from stage_metrics.main import RssSampler, RunReport, StageTimer, current_rss_mb
+
+
+def test_stage_reports_its_own_memory_next_to_the_process_peak():
+    with StageTimer("big") as stage:
+        data = bytearray(64 * 1024 * 1024)
+        data[::4096] = b"x" * len(data[::4096])
+        # Long enough for the sampler to see it
+        time.sleep(0.3)
+        stage.items = 1
+        del data
+
+    with StageTimer("small") as small:
+        small.items = 1
+
+    assert "peak_rss_mb" not in stage.metrics
+    assert stage.metrics["process_peak_rss_mb"] > 0
+
+    if current_rss_mb() is not None:
+        for metrics in [stage.metrics, small.metrics]:
+            # ru_maxrss and /proc/self/statm are read at slightly different moments
+            assert metrics["process_peak_rss_mb"] >= metrics["stage_peak_rss_mb"] - 1
+        assert stage.metrics["stage_peak_rss_mb"] - stage.metrics["rss_start_mb"] > 32
+        # The small stage does not inherit the high-water mark of the big one
+        assert small.metrics["stage_peak_rss_mb"] < stage.metrics["stage_peak_rss_mb"] - 32
+        assert small.metrics["peak_rss_growth_mb"] <= 1
+
+
+def test_sampler_keeps_the_highest_sample():
+    sampler = RssSampler(interval=0.01).start()
+    peak = sampler.stop()
+
+    assert peak is None or peak >= current_rss_mb() - 1
+
+
+def test_report_collects_every_stage(tmp_path):
+    report = RunReport("test", profile_directory=str(tmp_path))
+    with report.stage("crawl") as stage:
+        stage.items = 3
+    with report.stage("bertopic"):
+        pass
+
+    report.write(str(tmp_path / "report.json"))
+    with open(tmp_path / "report.json", encoding="utf-8") as f:
+        written = json.load(f)
+
+    assert [stage["stage"] for stage in written["stages"]] == ["crawl", "bertopic"]
+    assert written["stages"][0]["items"] == 3
+    assert "process_peak_rss_mb" in written
@@ -0,0 +1,111 @@
+import pytest
+from recursive_spider.throttle import SlotThrottle, ThrottleLimits, parse_retry_after
+
+
+def throttle(delay=0.5, concurrency=4, **limits):
+    limits.setdefault("window", 10)
+    return SlotThrottle(delay, concurrency, ThrottleLimits(**limits))
+
+
+def fill_window(slot, latency=0.2, status=200):
+    decisions = [slot.record_response(latency, status) for _ in range(slot.limits.window)]
+    assert decisions[:-1] == [None] * (len(decisions) - 1)
+    return decisions[-1]
+
+
+def test_healthy_window_adds_one_request_and_shortens_the_delay():
+    slot = throttle()
+
+    assert fill_window(slot) == "increase"
+    assert slot.concurrency == 5
+    assert slot.delay == pytest.approx(0.375)
+
+
+def test_slow_window_drops_one_request():
+    slot = throttle(target_latency=1.0)
+
+    assert fill_window(slot, latency=3.0) == "decrease"
+    assert slot.concurrency == 3
+    assert slot.delay == 0.5
+
+
+def test_failing_window_halves_concurrency_and_doubles_the_delay():
+    slot = throttle(concurrency=8)
+
+    for _ in range(slot.limits.window - 1):
+        slot.record_error()
+    assert slot.record_error() == "decrease"
+    assert slot.concurrency == 4
+    assert slot.delay == 1.0
+
+
+def test_server_errors_count_towards_the_error_rate():
+    slot = throttle(concurrency=8, max_error_rate=0.1)
+
+    for _ in range(8):
+        slot.record_response(0.2, 200)
+    slot.record_response(0.2, 500)
+
+    assert slot.record_response(0.2, 502) == "decrease"
+
+
+def test_a_burst_of_429_backs_off_once():
+    slot = throttle(concurrency=8)
+
+    assert slot.record_response(0.2, 429, now=100.0) == "backoff"
+    assert slot.record_response(0.2, 429, now=100.1) is None
+    assert slot.record_response(0.2, 503, now=100.5) is None
+    assert (slot.concurrency, slot.delay) == (4, 1.0)
+
+    # Once the slot waited its new delay, another 429 backs off again
+    assert slot.record_response(0.2, 429, now=101.5) == "backoff"
+    assert (slot.concurrency, slot.delay) == (2, 2.0)
+
+
+def test_backoff_waits_retry_after():
+    slot = throttle()
+
+    slot.record_response(0.2, 429, retry_after=7, now=0.0)
+
+    assert slot.delay == 7
+
+
+def test_limits_are_never_crossed():
+    slot = throttle(delay=0.5, concurrency=2, min_delay=0.1, max_delay=3.0, min_concurrency=2, max_concurrency=3)
+
+    for _ in range(20):
+        fill_window(slot)
+    assert (slot.concurrency, slot.delay) == (3, 0.1)
+    # At both limits a healthy window changes nothing
+    assert fill_window(slot) is None
+
+    for now in range(0, 200, 10):
+        slot.record_response(0.2, 429, retry_after=60, now=float(now))
+    assert (slot.concurrency, slot.delay) == (2, 3.0)
+
+
+def test_starting_values_are_clamped_to_the_limits():
+    slot = throttle(delay=60, concurrency=100, max_delay=30, max_concurrency=16)
+
+    assert (slot.delay, slot.concurrency) == (30, 16)
+
+
+def test_delay_reaches_zero():
+    slot = throttle(delay=0.5, min_delay=0.0, max_concurrency=4)
+
+    for _ in range(30):
+        fill_window(slot)
+
+    assert slot.delay == 0.0
+
+
+@pytest.mark.parametrize("value, expected", [
+    (None, None),
+    (b"", None),
+    (b"120", 120.0),
+    ("2.5", 2.5),
+    (b"-3", 0.0),
+    (b"Wed, 21 Oct 2015 07:28:00 GMT", None),
+])
+def test_parse_retry_after(value, expected):
+    assert parse_retry_after(value) == expected
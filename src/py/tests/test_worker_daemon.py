@@ -0,0 +1,45 @@
+import http.client
+import json
+import threading
+import pytest
+import worker_daemon.main as daemon
+from http.server import ThreadingHTTPServer
+
+
+class NoModelCache:
+    model_name = "none"
+
+
+def test_finished_jobs_expire_and_are_capped(monkeypatch):
+    monkeypatch.setattr(daemon, "MAX_FINISHED_JOBS", 2)
+    worker = daemon.WarmWorker(NoModelCache())
+    jobs = [worker.submit("keybert_only", {}) for _ in range(4)]
+    for job in jobs[:3]:
+        job.add_event("done")
+
+    worker.evict_finished_jobs()
+
+    # The oldest finished job goes, the running one stays
+    assert sorted(worker.jobs) == [2, 3, 4]
+
+    worker.evict_finished_jobs(now=jobs[2].finished_at + daemon.FINISHED_JOB_TTL + 1)
+    assert sorted(worker.jobs) == [4]
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), daemon.make_handler(daemon.WarmWorker(NoModelCache())))
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield httpd.server_address
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.mark.parametrize("body", [b"[1, 2]", b"\"text\"", b"not json"])
+def test_job_that_is_not_an_object_is_rejected(server, body):
+    connection = http.client.HTTPConnection(*server, timeout=5)
+    connection.request("POST", "/jobs?stream=0", body=body, headers={"Content-Type": "application/json"})
+    response = connection.getresponse()
+
+    assert response.status == 400
+    assert "error" in json.loads(response.read())
@@ -0,0 +1,293 @@
+import http.client
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+JOB_TYPES = ["keybert_only", "bertopic_only", "transform"]
+
+# Finished jobs stay readable through GET /jobs/<id> for this many seconds, and at most this many of them are kept
+FINISHED_JOB_TTL = 3600
+MAX_FINISHED_JOBS = 1000
+
+
+class Job:
+    """
+    A queued unit of work. Handlers wait on its condition to stream every new event back to the client.
+    """
+    def __init__(self, job_id, job_type, params):
+        self.job_id = job_id
+        self.job_type = job_type
+        self.params = params
+        self.events = []
+        self.done = False
+        self.finished_at = None
+        self.condition = threading.Condition()
+
+    def add_event(self, status, **fields):
+        event = {"job_id": self.job_id, "status": status, "time": round(time.time(), 3)}
+        event.update(fields)
+
+        with self.condition:
+            self.events.append(event)
+            self.done = status in ("done", "error")
+            if self.done:
+                self.finished_at = time.monotonic()
+            self.condition.notify_all()
+
+    def iter_events(self):
+        """
+        Yields every event of the job, blocking until the next one arrives, until the job is finished
+        """
+        sent = 0
+        while True:
+            with self.condition:
+                while sent == len(self.events) and not self.done:
+                    self.condition.wait()
+                new_events = self.events[sent:]
+                finished = self.done
+
+            for event in new_events:
+                yield event
+            sent += len(new_events)
+
+            if finished and sent == len(self.events):
+                return
+
+
+class WarmWorker:
+    """
+    Keeps the sentence-transformer, KeyBERT and any loaded BERTopic models resident in one process and
+    runs queued jobs one at a time on a background thread, so short jobs skip the model loading that
+    dominates a fresh `scrapenbert.sh` run.
+    """
+    def __init__(self, embedding_cache):
+        self.embedding_cache = embedding_cache
+        self.topic_models = {}
+        self.jobs = {}
+        self.queue = queue.Queue()
+        self.job_ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+        self.handlers = {
+            "keybert_only": self.run_keybert_only,
+            "bertopic_only": self.run_bertopic_only,
+            "transform": self.run_transform,
+        }
+
+    def warm_up(self):
+        start = time.perf_counter()
+        self.embedding_cache.embedding_model.encode(["warm up"])
+        print("[LOG]: Embedding model " + self.embedding_cache.model_name + " loaded in " + format(time.perf_counter() - start, ".1f") + "s")
+
+    def start(self):
+        threading.Thread(target=self.__work_loop, daemon=True).start()
+
+    def submit(self, job_type, params):
+        if job_type not in self.handlers:
+            raise ValueError("Unknown job type " + str(job_type) + ", expected one of " + ", ".join(JOB_TYPES))
+
+        with self.lock:
+            self.evict_finished_jobs()
+            job = Job(next(self.job_ids), job_type, params)
+            self.jobs[job.job_id] = job
+
+        job.add_event("queued", type=job_type, position=self.queue.qsize())
+        self.queue.put(job)
+        return job
+
+    def evict_finished_jobs(self, now=None):
+        """
+        Forgets finished jobs older than FINISHED_JOB_TTL, and the oldest ones beyond MAX_FINISHED_JOBS,
+        so a long running daemon does not keep every job it ever ran (call with self.lock held)
+        """
+        now = time.monotonic() if now is None else now
+        finished = [job for job in self.jobs.values() if job.finished_at is not None]
+
+        expired = [job for job in finished if now - job.finished_at > FINISHED_JOB_TTL]
+        expired += [job for job in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)] if job not in expired]
+        for job in expired:
+            del self.jobs[job.job_id]
+
+    def __work_loop(self):
+        while True:
+            job = self.queue.get()
+            job.add_event("running")
+            start = time.perf_counter()
+
+            try:
+                result = self.handlers[job.job_type](job, **job.params)
+                job.add_event("done", result=result, seconds=round(time.perf_counter() - start, 3))
+            except Exception as e:
+                traceback.print_exc()
+                job.add_event("error", error=str(e), seconds=round(time.perf_counter() - start, 3))
+
+    def run_keybert_only(self, job, docs=None, text=None, top_n=10):
+        """
+        docs: {topic_id: [documents]} like representative docs, or text: a single string
+        """
+        import keybert_wrapper.main as kb
+
+        if docs is None:
+            docs = {"0": [text or ""]}
+
+        kw = kb.KeybertWrapper(docs, self.embedding_cache)
+        keywords = kw.find_keywords_batched(top_n=top_n)
+        return {str(topic_id): [[phrase, score] for phrase, score in phrases] for topic_id, phrases in keywords.items()}
+
+    def run_bertopic_only(self, job, input, output, search_term="", name="bertopic_only"):
+        import bertopic_wrapper.main as bert
+
+        bt = bert.BertopicTraining(input, output, name, search_term, self.embedding_cache)
+        bt.train()
+        job.add_event("progress", message="model trained")
+
+        topic_info = bt.query.topic_info
+        return {
+            "documents": len(bt.data),
+            "topics": int(len(topic_info)),
+            "topic_model_path": bt.get_topic_model_path(),
+        }
+
+    def run_transform(self, job, model_path, docs, cache_embeddings=False):
+        """
+        Assigns topics to new documents with a saved _TOPIC_MODEL.bin (kept loaded for the next job),
+        their embeddings are only kept in the embedding cache when cache_embeddings is set
+        """
+        from bertopic_wrapper.inference import TopicAssigner
+
+        assigner = TopicAssigner(self.__get_topic_model(model_path), self.embedding_cache, cache_new=cache_embeddings)
+        topics, probabilities = assigner.assign_documents(docs)
+        return [{"topic": topic, "probability": probability} for topic, probability in zip(topics, probabilities)]
+
+    def __get_topic_model(self, model_path):
+        model_path = os.path.abspath(model_path)
+
+        if model_path not in self.topic_models:
+            from bertopic_wrapper.inference import load_topic_model
+            self.topic_models[model_path] = load_topic_model(model_path, self.embedding_cache)
+            print("[LOG]: Loaded topic model " + model_path)
+
+        return self.topic_models[model_path]
+
+
+def make_handler(worker):
+    class Handler(BaseHTTPRequestHandler):
+        # HTTP/1.1 so job events can be streamed back with chunked transfer encoding
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            if self.path == "/health":
+                self.__send_json(200, {"status": "ok", "model": worker.embedding_cache.model_name, "queued": worker.queue.qsize()})
+                return
+
+            if self.path.startswith("/jobs/"):
+                job = worker.jobs.get(int(self.path.rsplit("/", 1)[1])) if self.path.rsplit("/", 1)[1].isdigit() else None
+                if job is None:
+                    self.__send_json(404, {"error": "unknown job"})
+                else:
+                    self.__send_json(200, {"job_id": job.job_id, "type": job.job_type, "events": job.events})
+                return
+
+            self.__send_json(404, {"error": "unknown path"})
+
+        def do_POST(self):
+            if self.path.split("?")[0] != "/jobs":
+                self.__send_json(404, {"error": "unknown path"})
+                return
+
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if not isinstance(body, dict):
+                    raise ValueError("A job must be a JSON object")
+                job = worker.submit(body.pop("type", None), body)
+            except (ValueError, TypeError) as e:
+                self.__send_json(400, {"error": str(e)})
+                return
+
+            if "stream=0" in self.path:
+                self.__send_json(202, {"job_id": job.job_id})
+                return
+
+            # Stream every event as one JSON line until the job is finished
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            for event in job.iter_events():
+                line = (json.dumps(event) + "\n").encode("utf-8")
+                self.wfile.write(format(len(line), "x").encode("ascii") + b"\r\n" + line + b"\r\n")
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+
+        def __send_json(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(embedding_cache, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    """
+    Loads the models and serves the job API until interrupted.
+    -----------------------------------------------------------------
+    Args:
+        embedding_cache: EmbeddingCache whose model stays loaded for every job
+        host: interface to bind, localhost only by default
+        port: port to listen on
+
+    API:
+        POST /jobs            {"type": "keybert_only" | "bertopic_only" | "transform", ...job arguments}
+                              streams newline delimited JSON events (queued, running, progress, done/error);
+                              add ?stream=0 to only get the job id back
+        GET  /jobs/<job_id>   every event of a job so far
+        GET  /health          status of the worker
+    """
+    worker = WarmWorker(embedding_cache)
+    worker.warm_up()
+    worker.start()
+
+    server = ThreadingHTTPServer((host, port), make_handler(worker))
+    print("[LOG]: scrape-n-bert worker listening on http://" + host + ":" + str(port))
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("[LOG]: Stopping worker")
+    finally:
+        server.server_close()
+
+
+def submit_job(job, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    """
+    Sends a job to a running worker and yields its events as they arrive
+    """
+    connection = http.client.HTTPConnection(host, port)
+    connection.request("POST", "/jobs", body=json.dumps(job), headers={"Content-Type": "application/json"})
+    response = connection.getresponse()
+
+    try:
+        if response.status != 200:
+            yield json.loads(response.read() or b"{}")
+            return
+
+        for line in response:
+            if line.strip():
+                yield json.loads(line)
+    finally:
+        connection.close()